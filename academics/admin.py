@@ -1,15 +1,30 @@
+import tempfile
+
 from django import forms
 from django.contrib import admin
-from .models import Class, Subject, Exam, Grade, Attendance, Timetable
+from django.http import FileResponse
+from .models import Class, Subject, Exam, Grade, Attendance, AttendanceArchive, Timetable, TeacherUnavailability
 
 @admin.register(Class)
 class ClassAdmin(admin.ModelAdmin):
     list_display = ('name', 'section', 'teacher')
     list_filter = ('name',)
+    actions = ['download_report_cards']
+
+    @admin.action(description="Download PDF report cards (ZIP)")
+    def download_report_cards(self, request, queryset):
+        from students.report_card_export import export_report_cards
+
+        # Rendered in this process: a worker pool has no place inside a web
+        # request. Whole-school exports belong to the export_report_cards command.
+        archive = tempfile.TemporaryFile(suffix='.zip')
+        export_report_cards(queryset.order_by('name', 'section'), archive, workers=1)
+        archive.seek(0)
+        return FileResponse(archive, as_attachment=True, filename='report_cards.zip')
 
 @admin.register(Subject)
 class SubjectAdmin(admin.ModelAdmin):
-    list_display = ('name', 'code', 'teacher')
+    list_display = ('name', 'code', 'teacher', 'periods_per_week')
     search_fields = ('name', 'code')
 
 class ExamForm(forms.ModelForm):
@@ -45,10 +60,28 @@ class AttendanceAdmin(admin.ModelAdmin):
     form = AttendanceForm
     list_display = ('student', 'date', 'status')
     list_filter = ('date', 'status', 'student__current_class')
+    list_select_related = ('student__user',)
     search_fields = ('student__user__username',)
 
+@admin.register(AttendanceArchive)
+class AttendanceArchiveAdmin(admin.ModelAdmin):
+    list_display = ('student', 'academic_year', 'present_count', 'absent_count', 'late_count', 'excused_count', 'archived_at')
+    list_filter = ('academic_year',)
+    list_select_related = ('student__user',)
+    search_fields = ('student__user__username', 'student__admission_number')
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
 @admin.register(Timetable)
 class TimetableAdmin(admin.ModelAdmin):
     list_display = ('class_group', 'day', 'start_time', 'end_time', 'subject', 'teacher')
     list_filter = ('class_group', 'day', 'teacher')
 
+@admin.register(TeacherUnavailability)
+class TeacherUnavailabilityAdmin(admin.ModelAdmin):
+    list_display = ('teacher', 'day', 'period')
+    list_filter = ('day', 'teacher')
@@ -0,0 +1,101 @@
+"""
+Archiving of closed academic years out of the Attendance table.
+
+Each (student, academic year) becomes one AttendanceArchive row with a
+day-per-character status string, so Attendance only keeps open years and
+stays small however much history accumulates. Students are processed in
+batches, each batch in its own transaction: archive rows are written (or
+merged into an existing archive) and the originals deleted together.
+"""
+from django.db import connection, transaction
+from django.db.models import Max, Min
+
+from core.utils import academic_year_bounds, academic_year_for
+from students.summary import ATTENDANCE, STATUS_FIELDS, refresh_summaries
+from .models import Attendance, AttendanceArchive
+
+
+def closed_years(before=None):
+    """Academic years with live attendance rows that ended before ``before`` (default: the current year)."""
+    before = before or academic_year_for()
+    first_open_day = academic_year_bounds(before)[0]
+    bounds = Attendance.objects.filter(date__lt=first_open_day).aggregate(first=Min('date'), last=Max('date'))
+    if bounds['first'] is None:
+        return []
+    years = []
+    year = academic_year_for(bounds['first'])
+    while academic_year_bounds(year)[0] <= bounds['last']:
+        years.append(year)
+        start = int(year.split('-')[0]) + 1
+        year = f"{start}-{start + 1}"
+    return years
+
+
+def _pack(archive, rows):
+    """Merge ``(date, status, remarks)`` rows into ``archive``'s status string and counts."""
+    codes = list(archive.statuses)
+    for day, status, remarks in rows:
+        offset = (day - archive.start_date).days
+        if offset >= len(codes):
+            codes.extend(AttendanceArchive.NO_RECORD * (offset + 1 - len(codes)))
+        codes[offset] = AttendanceArchive.STATUS_CODES[status]
+        if remarks:
+            archive.remarks[day.isoformat()] = remarks
+        else:
+            archive.remarks.pop(day.isoformat(), None)
+    archive.statuses = ''.join(codes).rstrip(AttendanceArchive.NO_RECORD)
+    counts = {code: archive.statuses.count(code) for code in AttendanceArchive.STATUS_CODES.values()}
+    for status, field in STATUS_FIELDS.items():
+        setattr(archive, field, counts[AttendanceArchive.STATUS_CODES[status]])
+
+
+def archive_year(year, batch_size=500):
+    """Move one academic year's attendance into AttendanceArchive. Returns ``(students, rows)``."""
+    first_day, last_day = academic_year_bounds(year)
+    in_year = Attendance.objects.filter(date__range=(first_day, last_day))
+    student_ids = sorted(set(in_year.values_list('student_id', flat=True)))
+    students = rows_moved = 0
+    for start in range(0, len(student_ids), batch_size):
+        batch = student_ids[start:start + batch_size]
+        with transaction.atomic():
+            rows = {}
+            for student_id, day, status, remarks in (in_year.filter(student_id__in=batch)
+                                                     .values_list('student_id', 'date', 'status', 'remarks')):
+                rows.setdefault(student_id, []).append((day, status, remarks))
+            existing = {archive.student_id: archive for archive in
+                        AttendanceArchive.objects.select_for_update().filter(academic_year=year, student_id__in=batch)}
+            to_create, to_update = [], []
+            for student_id, student_rows in rows.items():
+                archive = existing.get(student_id)
+                if archive is None:
+                    archive = AttendanceArchive(student_id=student_id, academic_year=year, start_date=first_day,
+                                                statuses='', remarks={})
+                    to_create.append(archive)
+                else:
+                    to_update.append(archive)
+                _pack(archive, student_rows)
+            AttendanceArchive.objects.bulk_create(to_create)
+            AttendanceArchive.objects.bulk_update(
+                to_update, ['statuses', 'remarks', *STATUS_FIELDS.values()])
+            deleted = _delete_rows(batch, first_day, last_day)
+        students += len(rows)
+        rows_moved += deleted
+        # The summaries count live and archived days together, so this only
+        # re-reads the same totals from their new place.
+        refresh_summaries(batch, parts=(ATTENDANCE,))
+    return students, rows_moved
+
+
+def _delete_rows(student_ids, first_day, last_day):
+    # A plain DELETE: QuerySet.delete() would load every row and fire the
+    # per-row post_delete signals that keep the student summaries current.
+    table = connection.ops.quote_name(Attendance._meta.db_table)
+    student = connection.ops.quote_name(Attendance._meta.get_field('student').column)
+    date = connection.ops.quote_name(Attendance._meta.get_field('date').column)
+    placeholders = ', '.join(['%s'] * len(student_ids))
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"DELETE FROM {table} WHERE {date} BETWEEN %s AND %s AND {student} IN ({placeholders})",
+            [first_day, last_day, *student_ids],
+        )
+        return cursor.rowcount
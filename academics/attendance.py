@@ -0,0 +1,94 @@
+"""
+Batched attendance writes.
+
+A roll call for one class is a single transaction: one SELECT for the rows
+already recorded on that date, then one bulk_create and one bulk_update.
+Resubmitting the same roll call updates the existing rows instead of adding
+duplicates, which the (student, date) uniqueness constraint also enforces.
+"""
+import time
+
+from django.db import transaction
+from django.utils.dateparse import parse_date
+
+from .attendance_calendar import record_days
+from .models import Attendance
+
+VALID_STATUSES = set(Attendance.Status.values)
+
+
+def parse_attendance_date(value):
+    """Accept a date or an ISO ``YYYY-MM-DD`` string; raise ValueError otherwise."""
+    if hasattr(value, 'year'):
+        return value
+    parsed = parse_date(value or '')
+    if parsed is None:
+        raise ValueError(f"Invalid attendance date: {value!r}")
+    return parsed
+
+
+def record_attendance(date, records):
+    """
+    Upsert attendance for one date.
+
+    ``records`` maps student id to a ``(status, remarks)`` pair. Returns a
+    ``(created, updated)`` tuple; unchanged rows are not written again.
+    """
+    date = parse_attendance_date(date)
+    for student_id, (status, _remarks) in records.items():
+        if status not in VALID_STATUSES:
+            raise ValueError(f"Invalid status {status!r} for student {student_id}")
+
+    with transaction.atomic():
+        existing = {row.student_id: row for row in Attendance.objects.filter(date=date, student_id__in=list(records))}
+        to_create, to_update = [], []
+        for student_id, (status, remarks) in records.items():
+            remarks = remarks or ''
+            row = existing.get(student_id)
+            if row is None:
+                to_create.append(Attendance(student_id=student_id, date=date, status=status, remarks=remarks))
+            elif row.status != status or row.remarks != remarks:
+                row.status = status
+                row.remarks = remarks
+                to_update.append(row)
+        Attendance.objects.bulk_create(to_create)
+        Attendance.objects.bulk_update(to_update, ['status', 'remarks'])
+
+    # Bulk writes bypass the model signals, so refresh the derived data here.
+    from students.summary import ATTENDANCE, refresh_summaries
+    refresh_summaries([row.student_id for row in to_create + to_update], parts=(ATTENDANCE,))
+    record_days((row.student_id, date, row.status) for row in to_create + to_update)
+    return len(to_create), len(to_update)
+
+
+def record_roll_call(date, classes):
+    """
+    Record attendance for many classes at once.
+
+    ``classes`` maps class id to a list of ``{'student_id', 'status', 'remarks'}``
+    dicts. Students that are not in the class are rejected. Each class is
+    committed on its own so a bad entry only fails that class. Returns one
+    result dict per class with the counts and the time spent on it.
+    """
+    from students.models import Student
+
+    date = parse_attendance_date(date)
+    class_of = dict(Student.objects.filter(current_class_id__in=list(classes)).values_list('pk', 'current_class_id'))
+    results = []
+    for class_id, entries in classes.items():
+        started = time.perf_counter()
+        result = {'class_id': class_id}
+        try:
+            records = {}
+            for entry in entries:
+                student_id = int(entry['student_id'])
+                if class_of.get(student_id) != class_id:
+                    raise ValueError(f"Student {student_id} is not in class {class_id}")
+                records[student_id] = (entry.get('status'), entry.get('remarks', ''))
+            created, updated = record_attendance(date, records)
+            result.update(status='ok', created=created, updated=updated)
+        except (KeyError, TypeError, ValueError) as e:
+            result.update(status='error', error=str(e))
+        result['elapsed_ms'] = round((time.perf_counter() - started) * 1000, 2)
+        results.append(result)
+    return results
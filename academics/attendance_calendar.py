@@ -0,0 +1,257 @@
+"""
+Bit-packed attendance calendar.
+
+AttendanceMonth keeps a student's month in three 31-bit integers. Bit
+``day - 1`` of ``marked`` is set when the day was recorded, and the status
+is the 2-bit code ``high:low`` at the same bit:
+
+    PRESENT = 00, ABSENT = 01, LATE = 10, EXCUSED = 11
+
+so each status is a bitwise expression over the planes (see
+``status_plane``) and counting it is a popcount. A whole class's month is
+a handful of integer operations per student, with no row scans.
+
+record_attendance updates the months of the students it writes; the
+Attendance signals recompute the month of a single edited row; and
+rebuild_months regenerates everything from the Attendance rows and the
+yearly archives.
+"""
+import calendar
+import datetime
+
+from django.db import transaction
+
+from .models import Attendance, AttendanceArchive, AttendanceMonth
+
+STATUS_CODES = {
+    Attendance.Status.PRESENT: 0,
+    Attendance.Status.ABSENT: 1,
+    Attendance.Status.LATE: 2,
+    Attendance.Status.EXCUSED: 3,
+}
+CODE_STATUSES = {code: status for status, code in STATUS_CODES.items()}
+# Days that count as attended, here and in StudentSummary.attendance_percentage.
+ATTENDED = (Attendance.Status.PRESENT, Attendance.Status.LATE)
+
+
+def attendance_percentage(counts):
+    """Days attended as a percentage of the days recorded in ``{status: days}``, or None when none are."""
+    total = sum(counts.values())
+    return round(sum(counts.get(status, 0) for status in ATTENDED) / total * 100, 1) if total else None
+
+
+def set_day(month, day, status):
+    """Record ``status`` on ``day`` (1-based) of an AttendanceMonth in place."""
+    bit = 1 << (day - 1)
+    code = STATUS_CODES[status]
+    month.marked |= bit
+    month.low = month.low | bit if code & 1 else month.low & ~bit
+    month.high = month.high | bit if code & 2 else month.high & ~bit
+
+
+def clear_day(month, day):
+    bit = ~(1 << (day - 1))
+    month.marked &= bit
+    month.low &= bit
+    month.high &= bit
+
+
+def status_plane(month, status):
+    """Bitmask of the days in ``month`` recorded with ``status``."""
+    code = STATUS_CODES[status]
+    low = month.low if code & 1 else ~month.low
+    high = month.high if code & 2 else ~month.high
+    return month.marked & low & high
+
+
+def day_status(month, day):
+    bit = 1 << (day - 1)
+    if not month.marked & bit:
+        return None
+    return CODE_STATUSES[(1 if month.low & bit else 0) | (2 if month.high & bit else 0)]
+
+
+def _days_mask(first_day=1, last_day=31):
+    return ((1 << last_day) - 1) & ~((1 << (first_day - 1)) - 1)
+
+
+def month_counts(month, mask=-1):
+    """``{status: days}`` for the days of ``month`` selected by ``mask``."""
+    return {status: (status_plane(month, status) & mask).bit_count() for status in STATUS_CODES}
+
+
+# Maintenance
+
+def _month_rows(keys):
+    """Existing AttendanceMonth rows for ``(student_id, year, month)`` keys, creating blanks for the rest."""
+    keys = set(keys)
+    student_ids = {key[0] for key in keys}
+    periods = {(key[1], key[2]) for key in keys}
+    rows = {}
+    for row in AttendanceMonth.objects.filter(student_id__in=student_ids,
+                                              year__in={year for year, _month in periods},
+                                              month__in={month for _year, month in periods}):
+        key = (row.student_id, row.year, row.month)
+        if key in keys:
+            rows[key] = row
+    for key in keys - set(rows):
+        rows[key] = AttendanceMonth(student_id=key[0], year=key[1], month=key[2])
+    return rows
+
+
+def _save(rows):
+    rows = list(rows)
+    AttendanceMonth.objects.bulk_create([row for row in rows if row.pk is None], batch_size=1000)
+    AttendanceMonth.objects.bulk_update([row for row in rows if row.pk is not None],
+                                        ['marked', 'low', 'high'], batch_size=1000)
+
+
+def record_days(entries):
+    """Apply ``(student_id, date, status)`` entries to the calendar (used by record_attendance)."""
+    entries = list(entries)
+    if not entries:
+        return
+    with transaction.atomic():
+        rows = _month_rows((student_id, date.year, date.month) for student_id, date, _status in entries)
+        for student_id, date, status in entries:
+            set_day(rows[(student_id, date.year, date.month)], date.day, status)
+        _save(rows.values())
+
+
+def refresh_month(student_id, year, month, create=True):
+    """
+    Recompute one student-month from the student's yearly archives and
+    Attendance rows. With ``create``
+    False (the delete path, where the student may be going away in the same
+    cascade) a missing month is left missing and an emptied one is deleted.
+    """
+    first, last = datetime.date(year, month, 1), datetime.date(year, month, calendar.monthrange(year, month)[1])
+    with transaction.atomic():
+        row = _month_rows([(student_id, year, month)])[(student_id, year, month)]
+        if row.pk is None and not create:
+            return
+        row.marked = row.low = row.high = 0
+        for archive in AttendanceArchive.objects.filter(student_id=student_id, start_date__lte=last):
+            for date, status, _remarks in archive.records():
+                if first <= date <= last:
+                    set_day(row, date.day, status)
+        for date, status in Attendance.objects.filter(student_id=student_id, date__range=(first, last)).values_list('date', 'status'):
+            set_day(row, date.day, status)
+        if not row.marked and not create:
+            row.delete()
+            return
+        _save([row])
+
+
+def rebuild_months(batch_size=500):
+    """Regenerate every AttendanceMonth from the live rows and the yearly archives. Returns rows written."""
+    from students.models import Student
+
+    written = 0
+    student_ids = list(Student.objects.order_by('pk').values_list('pk', flat=True))
+    for start in range(0, len(student_ids), batch_size):
+        batch = student_ids[start:start + batch_size]
+        rows = {}
+
+        def month_for(student_id, date):
+            key = (student_id, date.year, date.month)
+            if key not in rows:
+                rows[key] = AttendanceMonth(student_id=student_id, year=date.year, month=date.month)
+            return rows[key]
+
+        for archive in AttendanceArchive.objects.filter(student_id__in=batch):
+            for date, status, _remarks in archive.records():
+                set_day(month_for(archive.student_id, date), date.day, status)
+        for student_id, date, status in Attendance.objects.filter(student_id__in=batch).values_list('student_id', 'date', 'status'):
+            set_day(month_for(student_id, date), date.day, status)
+        with transaction.atomic():
+            AttendanceMonth.objects.filter(student_id__in=batch).delete()
+            AttendanceMonth.objects.bulk_create(rows.values(), batch_size=1000)
+        written += len(rows)
+    return written
+
+
+# Queries
+
+def _months_between(start, end):
+    year, month = start.year, start.month
+    while (year, month) <= (end.year, end.month):
+        yield year, month
+        year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+
+
+def _load(student_ids, start, end):
+    months = list(_months_between(start, end))
+    rows = AttendanceMonth.objects.filter(student_id__in=student_ids,
+                                          year__range=(start.year, end.year))
+    loaded = {}
+    for row in rows:
+        if (row.year, row.month) in months:
+            loaded[(row.student_id, row.year, row.month)] = row
+    return months, loaded
+
+
+def _range_mask(year, month, start, end):
+    first = start.day if (year, month) == (start.year, start.month) else 1
+    last = end.day if (year, month) == (end.year, end.month) else calendar.monthrange(year, month)[1]
+    return _days_mask(first, last)
+
+
+def attendance_report(student_ids, start, end):
+    """
+    Per-student attendance between ``start`` and ``end`` (inclusive), from one query:
+    ``{student_id: {'counts', 'percentage', 'current_streak', 'longest_streak'}}``.
+    A streak counts consecutive recorded days attended (present or late).
+    """
+    months, loaded = _load(student_ids, start, end)
+    report = {}
+    for student_id in student_ids:
+        counts = dict.fromkeys(STATUS_CODES, 0)
+        current = longest = 0
+        for year, month in months:
+            row = loaded.get((student_id, year, month))
+            if row is None:
+                continue
+            mask = _range_mask(year, month, start, end)
+            for status, days in month_counts(row, mask).items():
+                counts[status] += days
+            attended = status_plane(row, Attendance.Status.PRESENT) | status_plane(row, Attendance.Status.LATE)
+            marked = row.marked & mask
+            while marked:
+                bit = marked & -marked
+                current = current + 1 if attended & bit else 0
+                longest = max(longest, current)
+                marked ^= bit
+        report[student_id] = {
+            'counts': counts,
+            'percentage': attendance_percentage(counts),
+            'current_streak': current,
+            'longest_streak': longest,
+        }
+    return report
+
+
+def class_heatmap(student_ids, year, month):
+    """
+    Day-by-day attendance for a class month: ``{'days': [...], 'students': {...}}``.
+    ``days`` holds per-day counts of each status; ``students`` maps each
+    student to a list of statuses (``None`` for unrecorded days).
+    """
+    days_in_month = calendar.monthrange(year, month)[1]
+    rows = {row.student_id: row for row in
+            AttendanceMonth.objects.filter(student_id__in=student_ids, year=year, month=month)}
+    planes = {status: [] for status in STATUS_CODES}
+    students = {}
+    for student_id in student_ids:
+        row = rows.get(student_id) or AttendanceMonth(student_id=student_id, year=year, month=month)
+        for status in STATUS_CODES:
+            planes[status].append(status_plane(row, status))
+        students[student_id] = [day_status(row, day) for day in range(1, days_in_month + 1)]
+    days = []
+    for day in range(1, days_in_month + 1):
+        bit = 1 << (day - 1)
+        days.append({
+            'day': day,
+            **{status.lower(): sum(1 for plane in planes[status] if plane & bit) for status in STATUS_CODES},
+        })
+    return {'year': year, 'month': month, 'days': days, 'students': students}
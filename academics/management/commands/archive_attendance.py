@@ -0,0 +1,34 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from academics.archive import archive_year, closed_years
+from core.utils import academic_year_for
+
+
+class Command(BaseCommand):
+    help = 'Moves attendance of closed academic years into the compact AttendanceArchive table'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--before', help='Archive years ending before this academic year, e.g. 2025-2026 '
+                                             '(default: the current year)')
+        parser.add_argument('--batch-size', type=int, default=500, help='Students archived per transaction')
+        parser.add_argument('--dry-run', action='store_true', help='Only list the years that would be archived')
+
+    def handle(self, *args, **options):
+        before = options['before'] or academic_year_for()
+        if before > academic_year_for():
+            raise CommandError(f"{before} has not started yet; only closed years can be archived")
+        years = closed_years(before)
+        if not years:
+            self.stdout.write("No closed academic years to archive")
+            return
+        for year in years:
+            if options['dry_run']:
+                self.stdout.write(f"Would archive {year}")
+                continue
+            started = time.perf_counter()
+            students, rows = archive_year(year, batch_size=options['batch_size'])
+            elapsed = time.perf_counter() - started
+            self.stdout.write(self.style.SUCCESS(
+                f"Archived {year}: {rows} rows for {students} students in {elapsed:.2f}s"))
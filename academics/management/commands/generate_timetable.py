@@ -0,0 +1,55 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from academics.scheduler import diff_timetable, generate_timetable, write_timetable
+
+
+class Command(BaseCommand):
+    help = 'Generates a clash-free weekly timetable; previews the changes unless --write is given'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--class', dest='class_ids', type=int, action='append',
+                            help='Only regenerate this class id (repeatable); defaults to every class')
+        parser.add_argument('--rooms', help='Comma-separated rooms to allocate (defaults to TIMETABLE_ROOMS)')
+        parser.add_argument('--seed', type=int, help='Random seed for reproducible results')
+        parser.add_argument('--attempts', type=int, default=5, help='Randomised restarts to try')
+        parser.add_argument('--write', action='store_true', help='Replace the current timetable with the result')
+        parser.add_argument('--allow-partial', action='store_true',
+                            help='Write even if some lessons could not be placed')
+
+    def handle(self, *args, **options):
+        rooms = [room.strip() for room in options['rooms'].split(',') if room.strip()] if options['rooms'] else None
+        try:
+            result = generate_timetable(
+                class_ids=options['class_ids'], rooms=rooms, seed=options['seed'], attempts=options['attempts'])
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        for error in result['errors']:
+            self.stderr.write(self.style.ERROR(error))
+        if result['errors']:
+            raise CommandError("The requested timetable is infeasible.")
+
+        placed = len(result['entries'])
+        self.stdout.write(
+            f"Placed {placed}/{result['lesson_count']} lessons for {len(result['class_ids'])} classes "
+            f"in {result['elapsed']:.2f}s")
+        for lesson in result['unplaced']:
+            self.stdout.write(self.style.WARNING(
+                f"Unplaced: class {lesson.class_id}, subject {lesson.subject_id}, teacher {lesson.teacher_id or '-'}"))
+
+        diff = diff_timetable(result['class_ids'], result['entries'])
+        self.stdout.write(
+            f"Diff against current timetable: {len(diff['added'])} added, {len(diff['removed'])} removed, "
+            f"{len(diff['changed'])} changed, {diff['unchanged']} unchanged")
+        if options['verbosity'] > 1:
+            for label in ('added', 'removed', 'changed'):
+                for class_id, day, start in diff[label]:
+                    self.stdout.write(f"  {label}: class {class_id} {day.title()} {start:%H:%M}")
+
+        if not options['write']:
+            self.stdout.write("Preview only; re-run with --write to apply.")
+            return
+        if result['unplaced'] and not options['allow_partial']:
+            raise CommandError("Not writing a partial timetable; use --allow-partial to override.")
+        written = write_timetable(result['class_ids'], result['entries'])
+        self.stdout.write(self.style.SUCCESS(f"Wrote {written} timetable entries."))
@@ -0,0 +1,18 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from academics.attendance_calendar import rebuild_months
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds the bit-packed AttendanceMonth calendar from attendance rows and yearly archives'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help='Students processed per batch')
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        written = rebuild_months(batch_size=options['batch_size'])
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {written} student-months in {elapsed:.2f}s"))
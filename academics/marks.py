@@ -0,0 +1,114 @@
+"""
+Batched marks entry for an exam.
+
+Existing grades are loaded once and keyed by student id, then all changes
+are written with one bulk_update and one bulk_create inside a single
+transaction. The same path serves the marks form and CSV/XLSX uploads.
+"""
+import csv
+import io
+from decimal import Decimal, InvalidOperation
+
+from django.db import transaction
+
+from .models import Grade
+from .rankings import invalidate_rankings
+
+UPLOAD_COLUMNS = ('admission_number', 'marks', 'remarks')
+
+
+def _parse_marks(exam, student_label, value):
+    try:
+        marks = Decimal(str(value).strip())
+    except InvalidOperation:
+        raise ValueError(f"Invalid marks {value!r} for {student_label}")
+    if not marks.is_finite():
+        # NaN and Infinity parse, but NaN cannot even be compared with the range.
+        raise ValueError(f"Invalid marks {value!r} for {student_label}")
+    if marks < 0 or marks > exam.total_marks:
+        raise ValueError(f"Marks {marks} for {student_label} must be between 0 and {exam.total_marks}")
+    return marks.quantize(Decimal('0.01'))
+
+
+def record_marks(exam, records):
+    """
+    Upsert grades for ``exam``.
+
+    ``records`` maps student id to a ``(marks, remarks)`` pair. Returns a
+    ``(created, updated)`` tuple; unchanged grades are not written again.
+    """
+    parsed = {
+        student_id: (_parse_marks(exam, f"student {student_id}", marks), remarks or '')
+        for student_id, (marks, remarks) in records.items()
+    }
+    with transaction.atomic():
+        existing = {grade.student_id: grade for grade in Grade.objects.filter(exam=exam, student_id__in=list(parsed))}
+        to_create, to_update = [], []
+        for student_id, (marks, remarks) in parsed.items():
+            grade = existing.get(student_id)
+            if grade is None:
+                to_create.append(Grade(student_id=student_id, exam=exam, marks_obtained=marks, remarks=remarks))
+            elif grade.marks_obtained != marks or grade.remarks != remarks:
+                grade.marks_obtained = marks
+                grade.remarks = remarks
+                to_update.append(grade)
+        Grade.objects.bulk_update(to_update, ['marks_obtained', 'remarks'], batch_size=500)
+        Grade.objects.bulk_create(to_create, batch_size=500)
+
+    # Bulk writes bypass the model signals, so refresh the derived data here.
+    from students.summary import GRADES, refresh_summaries
+    refresh_summaries([grade.student_id for grade in to_create + to_update], parts=(GRADES,))
+    if to_create or to_update:
+        invalidate_rankings([exam.pk], class_ids=[exam.class_group_id])
+    return len(to_create), len(to_update)
+
+
+def _csv_rows(upload):
+    try:
+        yield from csv.reader(io.TextIOWrapper(upload, encoding='utf-8-sig'))
+    except UnicodeDecodeError:
+        raise ValueError("The file is not UTF-8 text; save it as a UTF-8 CSV or an XLSX file.")
+
+
+def read_marks_file(upload):
+    """
+    Yield ``{'admission_number', 'marks', 'remarks'}`` dicts from an uploaded
+    CSV or XLSX file. The first row must be a header naming those columns.
+    """
+    name = (getattr(upload, 'name', '') or '').lower()
+    if name.endswith('.xlsx'):
+        try:
+            from openpyxl import load_workbook
+        except ImportError:
+            raise ValueError("XLSX uploads need the openpyxl package; upload a CSV file instead.")
+        sheet = load_workbook(upload, read_only=True, data_only=True).active
+        rows = sheet.iter_rows(values_only=True)
+    else:
+        rows = _csv_rows(upload)
+
+    header = [str(cell or '').strip().lower() for cell in next(rows, [])]
+    missing = [column for column in UPLOAD_COLUMNS[:2] if column not in header]
+    if missing:
+        raise ValueError(f"Missing column(s): {', '.join(missing)}")
+    for row in rows:
+        values = dict(zip(header, row))
+        if not any(values.values()):
+            continue
+        yield {column: values.get(column) for column in UPLOAD_COLUMNS}
+
+
+def import_marks(exam, upload):
+    """Record marks for ``exam`` from an uploaded file. Returns ``(created, updated)``."""
+    from students.models import Student
+
+    admissions = dict(Student.objects.filter(current_class=exam.class_group).values_list('admission_number', 'pk'))
+    records = {}
+    for line, row in enumerate(read_marks_file(upload), start=2):
+        admission_number = str(row['admission_number'] or '').strip()
+        student_id = admissions.get(admission_number)
+        if student_id is None:
+            raise ValueError(f"Row {line}: no student {admission_number!r} in {exam.class_group}")
+        if row['marks'] in (None, ''):
+            continue
+        records[student_id] = (row['marks'], str(row['remarks'] or '').strip())
+    return record_marks(exam, records)
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.18 on 2026-10-17 21:40
+
+from django.db import migrations
+from django.db.models import Count, Max
+
+
+def remove_duplicate_attendance(apps, schema_editor):
+    """Keep the most recently written row for every (student, date) pair."""
+    Attendance = apps.get_model('academics', 'Attendance')
+    duplicates = (Attendance.objects.values('student_id', 'date')
+                  .annotate(n=Count('id'), keep=Max('id')).filter(n__gt=1))
+    for dup in duplicates:
+        (Attendance.objects.filter(student_id=dup['student_id'], date=dup['date'])
+         .exclude(id=dup['keep']).delete())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('academics', '0004_homework'),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicate_attendance, migrations.RunPython.noop),
+        migrations.AlterUniqueTogether(
+            name='attendance',
+            unique_together={('student', 'date')},
+        ),
+    ]
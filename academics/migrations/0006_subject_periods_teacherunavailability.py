@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-17 21:31
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('academics', '0005_attendance_unique_student_date'),
+        ('staff', '0003_staff_photo_alter_leave_id_alter_payslip_id_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='subject',
+            name='periods_per_week',
+            field=models.PositiveSmallIntegerField(default=5, help_text='Weekly periods for each class taking this subject'),
+        ),
+        migrations.CreateModel(
+            name='TeacherUnavailability',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.CharField(choices=[('MONDAY', 'Monday'), ('TUESDAY', 'Tuesday'), ('WEDNESDAY', 'Wednesday'), ('THURSDAY', 'Thursday'), ('FRIDAY', 'Friday'), ('SATURDAY', 'Saturday'), ('SUNDAY', 'Sunday')], max_length=10)),
+                ('period', models.PositiveSmallIntegerField(help_text='1-based period number in the school day')),
+                ('teacher', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='unavailable_periods', to='staff.staff')),
+            ],
+            options={
+                'verbose_name_plural': 'Teacher unavailability',
+                'unique_together': {('teacher', 'day', 'period')},
+            },
+        ),
+    ]
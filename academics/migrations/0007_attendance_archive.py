@@ -0,0 +1,43 @@
+# Generated by Django 5.2.18 on 2026-10-17 22:11
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('academics', '0006_subject_periods_teacherunavailability'),
+        ('students', '0003_studentsummary'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AttendanceArchive',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('academic_year', models.CharField(help_text='e.g. 2024-2025', max_length=9)),
+                ('start_date', models.DateField()),
+                ('statuses', models.TextField()),
+                ('remarks', models.JSONField(blank=True, default=dict, help_text='Non-empty remarks keyed by ISO date')),
+                ('present_count', models.PositiveIntegerField(default=0)),
+                ('absent_count', models.PositiveIntegerField(default=0)),
+                ('late_count', models.PositiveIntegerField(default=0)),
+                ('excused_count', models.PositiveIntegerField(default=0)),
+                ('archived_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='attendance',
+            index=models.Index(fields=['date', 'status'], name='academics_a_date_87768e_idx'),
+        ),
+        migrations.AddField(
+            model_name='attendancearchive',
+            name='student',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='attendance_archives', to='students.student'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='attendancearchive',
+            unique_together={('student', 'academic_year')},
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.2.18 on 2026-10-17 22:13
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('academics', '0007_attendance_archive'),
+        ('students', '0003_studentsummary'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AttendanceMonth',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('year', models.PositiveSmallIntegerField()),
+                ('month', models.PositiveSmallIntegerField()),
+                ('marked', models.IntegerField(default=0)),
+                ('low', models.IntegerField(default=0)),
+                ('high', models.IntegerField(default=0)),
+                ('student', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='attendance_months', to='students.student')),
+            ],
+            options={
+                'unique_together': {('student', 'year', 'month')},
+            },
+        ),
+    ]
@@ -1,3 +1,5 @@
+import datetime
+
 from django.conf import settings
 from django.db import models
 
@@ -18,6 +20,7 @@ class Subject(models.Model):
     code = models.CharField(max_length=20, unique=True)
     classes = models.ManyToManyField(Class, related_name='subjects')
     teacher = models.ForeignKey('staff.Staff', on_delete=models.SET_NULL, null=True, blank=True, related_name='subjects_taught')
+    periods_per_week = models.PositiveSmallIntegerField(default=5, help_text="Weekly periods for each class taking this subject")
     
     def __str__(self):
         return f"{self.name} ({self.code})"
@@ -56,9 +59,72 @@ class Attendance(models.Model):
     status = models.CharField(max_length=10, choices=Status.choices)
     remarks = models.TextField(blank=True)
 
+    class Meta:
+        unique_together = ('student', 'date')
+        indexes = [models.Index(fields=['date', 'status'])]
+
     def __str__(self):
         return f"{self.student} - {self.date} ({self.status})"
 
+class AttendanceArchive(models.Model):
+    """
+    One student's attendance for a closed academic year, moved out of
+    Attendance by the archive_attendance command. ``statuses`` holds one
+    character per calendar day from ``start_date`` (see STATUS_CODES).
+    """
+    STATUS_CODES = {
+        Attendance.Status.PRESENT: 'P',
+        Attendance.Status.ABSENT: 'A',
+        Attendance.Status.LATE: 'L',
+        Attendance.Status.EXCUSED: 'E',
+    }
+    NO_RECORD = '-'
+
+    student = models.ForeignKey('students.Student', on_delete=models.CASCADE, related_name='attendance_archives')
+    academic_year = models.CharField(max_length=9, help_text="e.g. 2024-2025")
+    start_date = models.DateField()
+    statuses = models.TextField()
+    remarks = models.JSONField(default=dict, blank=True, help_text="Non-empty remarks keyed by ISO date")
+    present_count = models.PositiveIntegerField(default=0)
+    absent_count = models.PositiveIntegerField(default=0)
+    late_count = models.PositiveIntegerField(default=0)
+    excused_count = models.PositiveIntegerField(default=0)
+    archived_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ('student', 'academic_year')
+
+    def records(self):
+        """Yield ``(date, status, remarks)`` for every archived day."""
+        statuses = {code: status for status, code in self.STATUS_CODES.items()}
+        for offset, code in enumerate(self.statuses):
+            if code != self.NO_RECORD:
+                day = self.start_date + datetime.timedelta(days=offset)
+                yield day, statuses[code], self.remarks.get(day.isoformat(), '')
+
+    def __str__(self):
+        return f"{self.student} - {self.academic_year}"
+
+class AttendanceMonth(models.Model):
+    """
+    One student's attendance for one calendar month as bit planes: bit
+    ``day - 1`` of ``marked`` says whether the day was recorded, and the same
+    bit of ``low``/``high`` holds the 2-bit status code (see
+    academics.attendance_calendar). Maintained alongside Attendance.
+    """
+    student = models.ForeignKey('students.Student', on_delete=models.CASCADE, related_name='attendance_months')
+    year = models.PositiveSmallIntegerField()
+    month = models.PositiveSmallIntegerField()
+    marked = models.IntegerField(default=0)
+    low = models.IntegerField(default=0)
+    high = models.IntegerField(default=0)
+
+    class Meta:
+        unique_together = ('student', 'year', 'month')
+
+    def __str__(self):
+        return f"{self.student} - {self.year}-{self.month:02d}"
+
 class Timetable(models.Model):
     class DayOfWeek(models.TextChoices):
         MONDAY = 'MONDAY', 'Monday'
@@ -83,6 +149,18 @@ class Timetable(models.Model):
     def __str__(self):
         return f"{self.class_group} - {self.day} {self.start_time} ({self.subject})"
 
+class TeacherUnavailability(models.Model):
+    teacher = models.ForeignKey('staff.Staff', on_delete=models.CASCADE, related_name='unavailable_periods')
+    day = models.CharField(max_length=10, choices=Timetable.DayOfWeek.choices)
+    period = models.PositiveSmallIntegerField(help_text="1-based period number in the school day")
+
+    class Meta:
+        unique_together = ('teacher', 'day', 'period')
+        verbose_name_plural = "Teacher unavailability"
+
+    def __str__(self):
+        return f"{self.teacher} unavailable {self.day} period {self.period}"
+
 class Homework(models.Model):
     subject = models.ForeignKey(Subject, on_delete=models.CASCADE, related_name='homeworks')
     class_group = models.ForeignKey(Class, on_delete=models.CASCADE, related_name='homeworks')
@@ -0,0 +1,166 @@
+"""
+Ranks, percentiles and score statistics per exam and per class.
+
+Each ranking is computed from one grouped query, sorted once in Python and
+cached. Grade writes drop the affected exam and class entries (see
+academics.signals and academics.marks), so pages can show ranks straight
+from the cache without touching the grades table. Report cards read their
+overall and per-subject class ranks from :func:`class_rankings`.
+
+Ranks are dense (1, 2, 2, 3). A percentile is the share of the cohort
+scoring below the student, counting ties as half, so the top student of a
+large class approaches 100 and a student alone in a cohort gets 50.
+"""
+import statistics
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Sum
+
+from .models import Exam, Grade
+
+EXAM_KEY = 'academics:rankings:exam:{}'
+CLASS_KEY = 'academics:rankings:class:{}'
+
+
+def rank_scores(scores):
+    """
+    ``scores`` maps student id to a number. Returns ``(students, stats)`` where
+    ``students`` maps student id to ``{'score', 'rank', 'percentile'}``.
+    """
+    n = len(scores)
+    ordered = sorted(scores.items(), key=lambda item: item[1], reverse=True)
+    students = {}
+    rank = 0
+    i = 0
+    while i < n:
+        score = ordered[i][1]
+        j = i
+        while j < n and ordered[j][1] == score:
+            j += 1
+        rank += 1
+        below = n - j
+        percentile = round((below + (j - i) / 2) / n * 100, 1)
+        for student_id, _score in ordered[i:j]:
+            students[student_id] = {'score': score, 'rank': rank, 'percentile': percentile}
+        i = j
+
+    values = [float(score) for _student_id, score in ordered]
+    stats = {
+        'count': n,
+        'mean': round(statistics.fmean(values), 2) if values else None,
+        'median': round(statistics.median(values), 2) if values else None,
+        'stdev': round(statistics.pstdev(values), 2) if values else None,
+        'highest': values[0] if values else None,
+        'lowest': values[-1] if values else None,
+    }
+    return students, stats
+
+
+def _compute_exams(exam_ids):
+    marks = {exam_id: {} for exam_id in exam_ids}
+    for exam_id, student_id, value in Grade.objects.filter(exam_id__in=exam_ids).values_list('exam_id', 'student_id', 'marks_obtained'):
+        marks[exam_id][student_id] = value
+    rankings = {}
+    for exam_id, scores in marks.items():
+        students, stats = rank_scores(scores)
+        rankings[exam_id] = {'students': students, 'stats': stats}
+    return rankings
+
+
+def exam_rankings_many(exam_ids):
+    """Rankings for several exams: one cache round trip plus one query for any misses."""
+    exam_ids = set(exam_ids)
+    keys = {EXAM_KEY.format(exam_id): exam_id for exam_id in exam_ids}
+    cached = cache.get_many(list(keys))
+    rankings = {keys[key]: value for key, value in cached.items()}
+    missing = exam_ids - set(rankings)
+    if missing:
+        computed = _compute_exams(missing)
+        cache.set_many({EXAM_KEY.format(exam_id): value for exam_id, value in computed.items()},
+                       timeout=settings.RANKINGS_CACHE_TTL)
+        rankings.update(computed)
+    return rankings
+
+
+def exam_rankings(exam_id):
+    """``{'students': {student_id: {'score', 'rank', 'percentile'}}, 'stats': {...}}`` for one exam."""
+    return exam_rankings_many([exam_id])[exam_id]
+
+
+def annotate_grades(grades):
+    """Set ``exam_rank``, ``exam_percentile`` and ``exam_cohort`` on each grade from the cached rankings."""
+    rankings = exam_rankings_many({grade.exam_id for grade in grades})
+    for grade in grades:
+        exam = rankings[grade.exam_id]
+        entry = exam['students'].get(grade.student_id, {})
+        grade.exam_rank = entry.get('rank')
+        grade.exam_percentile = entry.get('percentile')
+        grade.exam_cohort = exam['stats']['count']
+    return grades
+
+
+def _percentage(obtained, total):
+    return (Decimal(str(obtained)) / total * 100).quantize(Decimal('0.01'))
+
+
+def _compute_classes(class_ids):
+    obtained = {class_id: {} for class_id in class_ids}
+    totals = {class_id: {} for class_id in class_ids}
+    by_subject = {class_id: {} for class_id in class_ids}
+    rows = (Grade.objects.filter(exam__class_group_id__in=class_ids)
+            .values_list('exam__class_group_id', 'exam__subject_id', 'student_id')
+            .annotate(obtained=Sum('marks_obtained'), total=Sum('exam__total_marks'))
+            .order_by())
+    for class_id, subject_id, student_id, marks, total in rows:
+        if not total:
+            continue
+        by_subject[class_id].setdefault(subject_id, {})[student_id] = _percentage(marks, total)
+        obtained[class_id][student_id] = obtained[class_id].get(student_id, 0) + marks
+        totals[class_id][student_id] = totals[class_id].get(student_id, 0) + total
+    rankings = {}
+    for class_id in class_ids:
+        scores = {student_id: _percentage(marks, totals[class_id][student_id])
+                  for student_id, marks in obtained[class_id].items()}
+        students, stats = rank_scores(scores)
+        subjects = {}
+        for subject_id, subject_scores in by_subject[class_id].items():
+            subject_students, subject_stats = rank_scores(subject_scores)
+            subjects[subject_id] = {'students': subject_students, 'stats': subject_stats}
+        rankings[class_id] = {'students': students, 'stats': stats, 'subjects': subjects}
+    return rankings
+
+
+def class_rankings_many(class_ids):
+    """Rankings for several classes: one cache round trip plus one query for any misses."""
+    class_ids = set(class_ids)
+    keys = {CLASS_KEY.format(class_id): class_id for class_id in class_ids}
+    cached = cache.get_many(list(keys))
+    rankings = {keys[key]: value for key, value in cached.items()}
+    missing = class_ids - set(rankings)
+    if missing:
+        computed = _compute_classes(missing)
+        cache.set_many({CLASS_KEY.format(class_id): value for class_id, value in computed.items()},
+                       timeout=settings.RANKINGS_CACHE_TTL)
+        rankings.update(computed)
+    return rankings
+
+
+def class_rankings(class_group_id):
+    """
+    Overall standing across every exam of a class: the score is the
+    percentage of total marks obtained over the exams the student sat.
+    ``{'students', 'stats', 'subjects': {subject_id: {'students', 'stats'}}}``,
+    where the subject entries rank the same percentage per subject.
+    """
+    return class_rankings_many([class_group_id])[class_group_id]
+
+
+def invalidate_rankings(exam_ids, class_ids=None):
+    """Drop cached rankings for ``exam_ids`` and their classes (looked up unless given)."""
+    exam_ids = list(exam_ids)
+    if class_ids is None:
+        class_ids = set(Exam.objects.filter(pk__in=exam_ids).values_list('class_group_id', flat=True))
+    cache.delete_many([EXAM_KEY.format(exam_id) for exam_id in exam_ids] +
+                      [CLASS_KEY.format(class_id) for class_id in class_ids])
@@ -0,0 +1,445 @@
+"""
+Automatic weekly timetable generation.
+
+The week is a grid of TIMETABLE_SCHOOL_DAYS x TIMETABLE_PERIOD_TIMES slots.
+Every (class, subject) pair from Subject.classes needs
+``subject.periods_per_week`` lessons taught by ``subject.teacher``. Hard
+constraints: a class, a teacher and a room hold at most one lesson per slot,
+and teachers are never booked in their TeacherUnavailability periods.
+
+Lessons are placed most-constrained first (busiest teachers, then largest
+groups) into the cheapest feasible slot, where the cost spreads a subject
+across the week. A lesson with no feasible slot is placed by an
+alternating-chain slot swap (the classic bipartite edge-colouring step) or,
+failing that, by moving the lessons that block a slot elsewhere. Anything
+still unplaced goes through a tabu ejection search, and a few randomised
+restarts keep the best attempt.
+"""
+import datetime
+import random
+import time
+
+from django.conf import settings
+from django.db import transaction
+
+from .models import Class, Subject, TeacherUnavailability, Timetable
+
+
+class Lesson:
+    __slots__ = ('class_id', 'subject_id', 'teacher_id', 'slot')
+
+    def __init__(self, class_id, subject_id, teacher_id):
+        self.class_id = class_id
+        self.subject_id = subject_id
+        self.teacher_id = teacher_id
+        self.slot = None
+
+
+def period_grid():
+    """Return ``(days, periods)`` where periods is a list of ``(start, end)`` times."""
+    periods = [
+        (datetime.time.fromisoformat(start), datetime.time.fromisoformat(end))
+        for start, end in settings.TIMETABLE_PERIOD_TIMES
+    ]
+    return list(settings.TIMETABLE_SCHOOL_DAYS), periods
+
+
+class TimetableProblem:
+    """Everything the solver needs, loaded with a handful of queries."""
+
+    def __init__(self, class_ids=None, rooms=None):
+        self.days, self.periods = period_grid()
+        self.slot_count = len(self.days) * len(self.periods)
+        self.rooms = list(settings.TIMETABLE_ROOMS if rooms is None else rooms)
+
+        classes = Class.objects.all()
+        if class_ids:
+            classes = classes.filter(pk__in=class_ids)
+        self.class_ids = list(classes.values_list('pk', flat=True))
+
+        subjects = {row['pk']: row for row in Subject.objects.values('pk', 'teacher_id', 'periods_per_week')}
+        pairs = (Subject.classes.through.objects.filter(class_id__in=self.class_ids)
+                 .values_list('class_id', 'subject_id'))
+        self.lessons = []
+        for class_id, subject_id in pairs:
+            subject = subjects[subject_id]
+            for _ in range(subject['periods_per_week']):
+                self.lessons.append(Lesson(class_id, subject_id, subject['teacher_id']))
+
+        # Slots teachers cannot teach in: declared unavailability plus lessons
+        # they already give to classes outside the regenerated set. Those
+        # lessons also keep their rooms, which are taken out of the pool.
+        self.blocked = {}
+        self.booked_rooms = {}
+        for teacher_id, day, period in TeacherUnavailability.objects.values_list('teacher_id', 'day', 'period'):
+            if day in self.days and 1 <= period <= len(self.periods):
+                self.blocked.setdefault(teacher_id, set()).add(self.slot_of(day, period - 1))
+        pool = set(self.rooms)
+        fixed = (Timetable.objects.exclude(class_group_id__in=self.class_ids)
+                 .values_list('teacher_id', 'day', 'start_time', 'end_time', 'room_number'))
+        for teacher_id, day, start, end, room in fixed:
+            if day not in self.days:
+                continue
+            for index, (period_start, period_end) in enumerate(self.periods):
+                if start < period_end and period_start < end:
+                    slot = self.slot_of(day, index)
+                    if teacher_id:
+                        self.blocked.setdefault(teacher_id, set()).add(slot)
+                    if room in pool:
+                        self.booked_rooms.setdefault(slot, set()).add(room)
+        self.fixed_room_load = [len(self.booked_rooms.get(slot, ())) for slot in range(self.slot_count)]
+
+    def free_rooms(self, slot):
+        """Rooms of the pool not held by a lesson outside the regenerated classes in ``slot``."""
+        booked = self.booked_rooms.get(slot, ())
+        return [room for room in self.rooms if room not in booked]
+
+    def slot_of(self, day, period_index):
+        return self.days.index(day) * len(self.periods) + period_index
+
+    def day_of(self, slot):
+        return slot // len(self.periods)
+
+    def feasibility_errors(self):
+        """Cheap counting checks that rule out a solution before searching."""
+        errors = []
+        per_class, per_teacher = {}, {}
+        for lesson in self.lessons:
+            per_class[lesson.class_id] = per_class.get(lesson.class_id, 0) + 1
+            if lesson.teacher_id:
+                per_teacher[lesson.teacher_id] = per_teacher.get(lesson.teacher_id, 0) + 1
+        for class_id, needed in per_class.items():
+            if needed > self.slot_count:
+                errors.append(f"Class {class_id} needs {needed} periods but the week has {self.slot_count}")
+        for teacher_id, needed in per_teacher.items():
+            available = self.slot_count - len(self.blocked.get(teacher_id, ()))
+            if needed > available:
+                errors.append(f"Teacher {teacher_id} needs {needed} periods but is available for {available}")
+        room_slots = len(self.rooms) * self.slot_count - sum(self.fixed_room_load)
+        if self.rooms and len(self.lessons) > room_slots:
+            errors.append(f"{len(self.lessons)} lessons do not fit in the {room_slots} free room periods")
+        return errors
+
+
+class _State:
+    def __init__(self, problem):
+        self.problem = problem
+        self.class_slots = {class_id: {} for class_id in problem.class_ids}
+        self.teacher_slots = {}
+        # Rooms held by the classes that are not being regenerated count as used.
+        self.room_load = list(problem.fixed_room_load)
+        # (class_id, subject_id, day) -> lessons of that subject on that day
+        self.daily = {}
+
+    def teacher_free(self, lesson, slot):
+        if not lesson.teacher_id:
+            return True
+        if slot in self.problem.blocked.get(lesson.teacher_id, ()):
+            return False
+        return slot not in self.teacher_slots.get(lesson.teacher_id, {})
+
+    def can_place(self, lesson, slot):
+        if slot in self.class_slots[lesson.class_id]:
+            return False
+        if self.problem.rooms and self.room_load[slot] >= len(self.problem.rooms):
+            return False
+        return self.teacher_free(lesson, slot)
+
+    def place(self, lesson, slot):
+        lesson.slot = slot
+        self.class_slots[lesson.class_id][slot] = lesson
+        if lesson.teacher_id:
+            self.teacher_slots.setdefault(lesson.teacher_id, {})[slot] = lesson
+        self.room_load[slot] += 1
+        key = (lesson.class_id, lesson.subject_id, self.problem.day_of(slot))
+        self.daily[key] = self.daily.get(key, 0) + 1
+
+    def remove(self, lesson):
+        slot = lesson.slot
+        del self.class_slots[lesson.class_id][slot]
+        if lesson.teacher_id:
+            del self.teacher_slots[lesson.teacher_id][slot]
+        self.room_load[slot] -= 1
+        self.daily[(lesson.class_id, lesson.subject_id, self.problem.day_of(slot))] -= 1
+        lesson.slot = None
+
+    def cost(self, lesson, slot):
+        # Prefer days where the class does not have this subject yet, then
+        # earlier periods so the day's timetable stays compact.
+        same_day = self.daily.get((lesson.class_id, lesson.subject_id, self.problem.day_of(slot)), 0)
+        return same_day * 100 + slot % len(self.problem.periods)
+
+    def best_slot(self, lesson, slots, exclude=None):
+        best, best_cost = None, None
+        for slot in slots:
+            if slot == exclude or not self.can_place(lesson, slot):
+                continue
+            cost = self.cost(lesson, slot)
+            if best_cost is None or cost < best_cost:
+                best, best_cost = slot, cost
+        return best
+
+    def repair(self, lesson, slots):
+        """Free a slot for ``lesson`` by relocating the lessons that block it."""
+        for slot in slots:
+            if lesson.teacher_id and slot in self.problem.blocked.get(lesson.teacher_id, ()):
+                continue
+            blockers = {self.class_slots[lesson.class_id].get(slot)}
+            if lesson.teacher_id:
+                blockers.add(self.teacher_slots.get(lesson.teacher_id, {}).get(slot))
+            blockers.discard(None)
+            if not blockers or (self.problem.rooms and self.room_load[slot] - len(blockers) >= len(self.problem.rooms)):
+                continue
+            moved = []
+            for blocker in blockers:
+                self.remove(blocker)
+                moved.append((blocker, slot))
+            ok = True
+            for blocker, _old in moved:
+                target = self.best_slot(blocker, slots, exclude=slot)
+                if target is None:
+                    ok = False
+                    break
+                self.place(blocker, target)
+            if ok and self.can_place(lesson, slot):
+                self.place(lesson, slot)
+                return True
+            # Undo the partial move.
+            for blocker, old in moved:
+                if blocker.slot is not None:
+                    self.remove(blocker)
+                self.place(blocker, old)
+        return False
+
+    def kempe(self, lesson):
+        """
+        Place ``lesson`` by swapping two slots along an alternating chain.
+
+        With slot ``a`` free for the class and ``b`` free for the teacher, the
+        chain starts at the teacher's lesson in ``a``, continues with that
+        class's lesson in ``b``, then that teacher's lesson in ``a`` and so on.
+        Swapping ``a`` and ``b`` along the chain frees ``a`` for the teacher
+        without touching the class, as in bipartite edge colouring.
+        """
+        teacher_id = lesson.teacher_id
+        if not teacher_id:
+            return False
+        slot_range = range(self.problem.slot_count)
+        blocked = self.problem.blocked.get(teacher_id, ())
+        class_busy = self.class_slots[lesson.class_id]
+        teacher_busy = self.teacher_slots.get(teacher_id, {})
+        free_for_class = [slot for slot in slot_range if slot not in class_busy and slot not in blocked]
+        free_for_teacher = [slot for slot in slot_range if slot not in teacher_busy and slot not in blocked]
+        for a in free_for_class:
+            for b in free_for_teacher:
+                chain = self._chain(teacher_id, a, b)
+                if chain is None:
+                    continue
+                if self._swap(chain, a, b):
+                    if self.can_place(lesson, a):
+                        self.place(lesson, a)
+                        return True
+                    self._swap(chain, a, b)
+        return False
+
+    def _chain(self, teacher_id, a, b):
+        chain = []
+        current = self.teacher_slots.get(teacher_id, {}).get(a)
+        colour, other = a, b
+        while current is not None:
+            if len(chain) > len(self.problem.lessons):
+                return None
+            chain.append(current)
+            colour, other = other, colour
+            if colour == b:
+                current = self.class_slots[current.class_id].get(b)
+            elif current.teacher_id:
+                current = self.teacher_slots.get(current.teacher_id, {}).get(a)
+            else:
+                current = None
+        return chain
+
+    def _swap(self, chain, a, b):
+        """Exchange slots ``a`` and ``b`` for every lesson in ``chain``; False (and no change) if invalid."""
+        targets = [(lesson, b if lesson.slot == a else a) for lesson in chain]
+        for lesson, _target in targets:
+            self.remove(lesson)
+        valid = all(target not in self.problem.blocked.get(lesson.teacher_id, ()) for lesson, target in targets)
+        moved = targets if valid else [(lesson, a if target == b else b) for lesson, target in targets]
+        for lesson, target in moved:
+            self.place(lesson, target)
+        if valid and self.problem.rooms and max(self.room_load[a], self.room_load[b]) > len(self.problem.rooms):
+            self._swap(chain, a, b)
+            return False
+        return valid
+
+
+def _solve_once(problem, rng, deadline):
+    state = _State(problem)
+    for lesson in problem.lessons:
+        lesson.slot = None
+
+    teacher_load = {}
+    group_size = {}
+    for lesson in problem.lessons:
+        if lesson.teacher_id:
+            teacher_load[lesson.teacher_id] = teacher_load.get(lesson.teacher_id, 0) + 1
+        key = (lesson.class_id, lesson.subject_id)
+        group_size[key] = group_size.get(key, 0) + 1
+
+    def difficulty(lesson):
+        blocked = len(problem.blocked.get(lesson.teacher_id, ()))
+        return (-(teacher_load.get(lesson.teacher_id, 0) + blocked),
+                -group_size[(lesson.class_id, lesson.subject_id)],
+                rng.random())
+
+    order = sorted(problem.lessons, key=difficulty)
+    slots = list(range(problem.slot_count))
+    unplaced = []
+    for lesson in order:
+        rng.shuffle(slots)
+        slot = state.best_slot(lesson, slots)
+        if slot is not None:
+            state.place(lesson, slot)
+        elif not state.kempe(lesson) and not state.repair(lesson, slots):
+            unplaced.append(lesson)
+    if unplaced:
+        unplaced = _ejection_search(state, unplaced, rng, deadline)
+    return unplaced
+
+
+def _ejection_search(state, unplaced, rng, deadline, max_steps=50000, tabu_tenure=10):
+    """
+    Tabu local search over the lessons left unplaced: put a lesson into the
+    slot that evicts the fewest others, requeue the evicted lessons, and keep
+    the best assignment seen.
+    """
+    problem = state.problem
+    queue = list(unplaced)
+    best_count, best_slots = len(queue), [lesson.slot for lesson in problem.lessons]
+    all_slots = range(problem.slot_count)
+    tabu = {}
+    for step in range(max_steps):
+        if not queue or time.perf_counter() > deadline:
+            break
+        lesson = queue.pop(rng.randrange(len(queue)))
+        blocked = problem.blocked.get(lesson.teacher_id, ())
+        candidates = []
+        for slot in all_slots:
+            if slot in blocked or tabu.get((lesson, slot), -1) >= step:
+                continue
+            evict = {state.class_slots[lesson.class_id].get(slot)}
+            if lesson.teacher_id:
+                evict.add(state.teacher_slots.get(lesson.teacher_id, {}).get(slot))
+            evict.discard(None)
+            if problem.rooms and state.room_load[slot] - len(evict) >= len(problem.rooms):
+                continue
+            candidates.append((len(evict), rng.random(), slot, evict))
+        if not candidates:
+            queue.append(lesson)
+            continue
+        _count, _tie, slot, evict = min(candidates, key=lambda c: (c[0], c[1]))
+        for other in evict:
+            tabu[(other, other.slot)] = step + tabu_tenure
+            state.remove(other)
+        state.place(lesson, slot)
+        for other in evict:
+            target = state.best_slot(other, all_slots)
+            if target is not None:
+                state.place(other, target)
+            else:
+                queue.append(other)
+        if len(queue) < best_count:
+            best_count, best_slots = len(queue), [lesson.slot for lesson in problem.lessons]
+
+    if len(queue) > best_count:
+        for lesson, slot in zip(problem.lessons, best_slots):
+            lesson.slot = slot
+    return [lesson for lesson in problem.lessons if lesson.slot is None]
+
+
+def generate_timetable(class_ids=None, rooms=None, seed=None, attempts=5, time_limit=50):
+    """
+    Solve the timetable for ``class_ids`` (default: every class).
+
+    Returns a dict with ``entries`` (Timetable field dicts), ``unplaced``
+    (lessons that could not be scheduled), ``errors`` and ``elapsed``.
+    """
+    if attempts < 1:
+        raise ValueError(f"attempts must be at least 1, not {attempts}")
+    started = time.perf_counter()
+    problem = TimetableProblem(class_ids=class_ids, rooms=rooms)
+    errors = problem.feasibility_errors()
+    rng = random.Random(seed)
+
+    best_slots, best_unplaced = None, None
+    if not errors:
+        for _attempt in range(attempts):
+            unplaced = _solve_once(problem, rng, started + time_limit)
+            if best_unplaced is None or len(unplaced) < len(best_unplaced):
+                best_slots = [lesson.slot for lesson in problem.lessons]
+                best_unplaced = list(unplaced)
+            if not unplaced or time.perf_counter() - started > time_limit:
+                break
+        for lesson, slot in zip(problem.lessons, best_slots):
+            lesson.slot = slot
+
+    entries = []
+    rooms_free = {}
+    for lesson in problem.lessons:
+        if lesson.slot is None:
+            continue
+        day = problem.days[problem.day_of(lesson.slot)]
+        start, end = problem.periods[lesson.slot % len(problem.periods)]
+        room = ''
+        if problem.rooms:
+            if lesson.slot not in rooms_free:
+                rooms_free[lesson.slot] = problem.free_rooms(lesson.slot)
+            room = rooms_free[lesson.slot].pop(0)
+        entries.append({
+            'class_group_id': lesson.class_id,
+            'subject_id': lesson.subject_id,
+            'teacher_id': lesson.teacher_id,
+            'day': day,
+            'start_time': start,
+            'end_time': end,
+            'room_number': room,
+        })
+
+    return {
+        'class_ids': problem.class_ids,
+        'entries': entries,
+        'unplaced': [lesson for lesson in problem.lessons if lesson.slot is None],
+        'errors': errors,
+        'lesson_count': len(problem.lessons),
+        'elapsed': time.perf_counter() - started,
+    }
+
+
+def diff_timetable(class_ids, entries):
+    """Compare proposed entries with the current timetable of ``class_ids``."""
+    def key(row):
+        return (row['class_group_id'], row['day'], row['start_time'])
+
+    def value(row):
+        return (row['subject_id'], row['teacher_id'], row['end_time'], row['room_number'])
+
+    current = {
+        key(row): value(row)
+        for row in Timetable.objects.filter(class_group_id__in=class_ids).values(
+            'class_group_id', 'subject_id', 'teacher_id', 'day', 'start_time', 'end_time', 'room_number')
+    }
+    proposed = {key(row): value(row) for row in entries}
+    added = [k for k in proposed if k not in current]
+    removed = [k for k in current if k not in proposed]
+    changed = [k for k in proposed if k in current and current[k] != proposed[k]]
+    unchanged = len(proposed) - len(added) - len(changed)
+    return {'added': added, 'removed': removed, 'changed': changed, 'unchanged': unchanged}
+
+
+def write_timetable(class_ids, entries):
+    """Replace the timetable of ``class_ids`` with ``entries`` in one transaction."""
+    with transaction.atomic():
+        Timetable.objects.filter(class_group_id__in=class_ids).delete()
+        Timetable.objects.bulk_create([Timetable(**entry) for entry in entries], batch_size=1000)
+    return len(entries)
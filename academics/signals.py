@@ -0,0 +1,54 @@
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from core.models import User
+from core.utils import cascades_from
+from students.models import Student
+from .attendance_calendar import refresh_month
+from .models import Attendance, Exam, Grade
+from .rankings import invalidate_rankings
+
+
+@receiver(post_save, sender=Grade)
+@receiver(post_delete, sender=Grade)
+def grade_changed(sender, instance, **kwargs):
+    invalidate_rankings([instance.exam_id])
+
+
+@receiver(pre_save, sender=Exam)
+def exam_saving(sender, instance, **kwargs):
+    # Drops the class the exam belonged to before this save, in case it moves.
+    if instance.pk:
+        invalidate_rankings([instance.pk])
+
+
+@receiver(post_save, sender=Exam)
+@receiver(post_delete, sender=Exam)
+def exam_changed(sender, instance, **kwargs):
+    invalidate_rankings([instance.pk], class_ids=[instance.class_group_id])
+
+
+@receiver(pre_save, sender=Attendance)
+def attendance_saving(sender, instance, **kwargs):
+    # Remember the stored day so moving a record also clears its old month.
+    instance._previous_day = (Attendance.objects.filter(pk=instance.pk).values_list('student_id', 'date').first()
+                              if instance.pk else None)
+
+
+@receiver(post_save, sender=Attendance)
+def attendance_saved(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    months = {(instance.student_id, instance.date.year, instance.date.month)}
+    previous = getattr(instance, '_previous_day', None)
+    if previous:
+        months.add((previous[0], previous[1].year, previous[1].month))
+    for student_id, year, month in months:
+        refresh_month(student_id, year, month)
+
+
+@receiver(post_delete, sender=Attendance)
+def attendance_deleted(sender, instance, origin=None, **kwargs):
+    # The months go with the student; never recreate one during the cascade.
+    if not cascades_from(origin, Student, User):
+        refresh_month(instance.student_id, instance.date.year, instance.date.month, create=False)
@@ -1,3 +1,207 @@
-from django.test import TestCase
+import datetime
+from decimal import Decimal
 
-# Create your tests here.
+from django.contrib.messages import get_messages
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from core.models import User
+from core.utils import academic_year_for
+from students.models import Student
+from students.summary import get_summary
+from .archive import archive_year
+from .attendance import record_attendance
+from .attendance_calendar import attendance_report, rebuild_months
+from .marks import import_marks, record_marks
+from .models import Attendance, AttendanceMonth, Class, Exam, Grade, Subject, Timetable
+from .rankings import class_rankings, exam_rankings
+from .scheduler import generate_timetable, write_timetable
+from .timetable import find_clashes
+
+PRESENT, ABSENT, LATE = Attendance.Status.PRESENT, Attendance.Status.ABSENT, Attendance.Status.LATE
+
+
+def make_student(number, school_class=None):
+    user = User.objects.create_user(f'student{number}', password='x', role=User.Role.STUDENT,
+                                    first_name=f'Student{number}', last_name='Test')
+    return Student.objects.create(user=user, admission_number=f'ADM{number:04d}',
+                                  date_of_birth=datetime.date(2015, 1, 1), address='Somewhere',
+                                  current_class=school_class)
+
+
+class AttendanceCalendarTests(TestCase):
+    def setUp(self):
+        self.school_class = Class.objects.create(name='Class 1', section='A')
+        self.student = make_student(1, self.school_class)
+        self.other = make_student(2, self.school_class)
+
+    def _month(self, student, year=2026, month=3):
+        return AttendanceMonth.objects.filter(student=student, year=year, month=month).first()
+
+    def test_record_attendance_fills_calendar(self):
+        record_attendance(datetime.date(2026, 3, 2), {self.student.pk: (PRESENT, ''), self.other.pk: (ABSENT, '')})
+        record_attendance(datetime.date(2026, 3, 3), {self.student.pk: (LATE, ''), self.other.pk: (PRESENT, '')})
+        record_attendance(datetime.date(2026, 3, 4), {self.student.pk: (ABSENT, '')})
+        report = attendance_report([self.student.pk, self.other.pk],
+                                   datetime.date(2026, 3, 1), datetime.date(2026, 3, 31))
+        self.assertEqual(report[self.student.pk]['counts'][PRESENT], 1)
+        self.assertEqual(report[self.student.pk]['counts'][LATE], 1)
+        self.assertEqual(report[self.student.pk]['longest_streak'], 2)
+        self.assertEqual(report[self.student.pk]['current_streak'], 0)
+        self.assertEqual(report[self.other.pk]['percentage'], 50.0)
+
+    def test_signals_match_rebuild(self):
+        record = Attendance.objects.create(student=self.student, date=datetime.date(2026, 3, 2), status=PRESENT)
+        Attendance.objects.create(student=self.student, date=datetime.date(2026, 3, 9), status=ABSENT)
+        record.date = datetime.date(2026, 4, 1)
+        record.save()
+        before = {(row.student_id, row.year, row.month): (row.marked, row.low, row.high)
+                  for row in AttendanceMonth.objects.all()}
+        self.assertEqual(before[(self.student.pk, 2026, 3)][0], 1 << 8)
+        rebuild_months()
+        after = {(row.student_id, row.year, row.month): (row.marked, row.low, row.high)
+                 for row in AttendanceMonth.objects.all()}
+        self.assertEqual(after, before)
+
+    def test_deleting_last_record_drops_month(self):
+        record = Attendance.objects.create(student=self.student, date=datetime.date(2026, 3, 2), status=PRESENT)
+        self.assertIsNotNone(self._month(self.student))
+        record.delete()
+        self.assertIsNone(self._month(self.student))
+
+    def test_delete_does_not_recreate_month(self):
+        Attendance.objects.create(student=self.student, date=datetime.date(2026, 3, 2), status=PRESENT)
+        Attendance.objects.create(student=self.student, date=datetime.date(2026, 3, 3), status=PRESENT)
+        AttendanceMonth.objects.all().delete()
+        Attendance.objects.filter(date=datetime.date(2026, 3, 3)).get().delete()
+        self.assertIsNone(self._month(self.student))
+
+    def test_delete_student_with_attendance(self):
+        record_attendance(datetime.date(2026, 3, 2), {self.student.pk: (PRESENT, ''), self.other.pk: (PRESENT, '')})
+        Attendance.objects.create(student=self.student, date=datetime.date(2026, 4, 1), status=ABSENT)
+        self.student.delete()
+        connection.check_constraints()
+        self.assertFalse(AttendanceMonth.objects.filter(student_id=self.student.pk).exists())
+        self.assertIsNotNone(self._month(self.other))
+
+    def test_summary_and_calendar_agree_on_percentage(self):
+        for day, status in enumerate((PRESENT, LATE, ABSENT, Attendance.Status.EXCUSED), start=2):
+            Attendance.objects.create(student=self.student, date=datetime.date(2026, 3, day), status=status)
+        report = attendance_report([self.student.pk], datetime.date(2026, 3, 1), datetime.date(2026, 3, 31))
+        self.assertEqual(report[self.student.pk]['percentage'], 50.0)
+        self.assertEqual(get_summary(self.student).attendance_percentage, 50.0)
+
+    def test_refresh_month_keeps_archived_days(self):
+        Attendance.objects.create(student=self.student, date=datetime.date(2025, 3, 2), status=PRESENT)
+        Attendance.objects.create(student=self.student, date=datetime.date(2025, 3, 3), status=ABSENT)
+        archive_year(academic_year_for(datetime.date(2025, 3, 2)))
+        self.assertEqual(self._month(self.student, 2025).marked, 0b110)
+
+        late = Attendance.objects.create(student=self.student, date=datetime.date(2025, 3, 10), status=LATE)
+        report = attendance_report([self.student.pk], datetime.date(2025, 3, 1), datetime.date(2025, 3, 31))
+        self.assertEqual(report[self.student.pk]['counts'], {PRESENT: 1, ABSENT: 1, LATE: 1,
+                                                             Attendance.Status.EXCUSED: 0})
+        late.delete()
+        self.assertEqual(self._month(self.student, 2025).marked, 0b110)
+
+    def test_delete_attendance_queryset_of_class(self):
+        record_attendance(datetime.date(2026, 3, 2), {self.student.pk: (PRESENT, ''), self.other.pk: (ABSENT, '')})
+        Attendance.objects.filter(student=self.other).delete()
+        self.assertIsNone(self._month(self.other))
+        self.assertIsNotNone(self._month(self.student))
+
+
+class RankingServiceTests(TestCase):
+    def setUp(self):
+        self.school_class = Class.objects.create(name='Class 1', section='A')
+        self.maths = Subject.objects.create(name='Maths', code='M1')
+        self.science = Subject.objects.create(name='Science', code='S1')
+        self.maths_exam = Exam.objects.create(name='Mid term', date=datetime.date(2026, 3, 1), subject=self.maths,
+                                              class_group=self.school_class, total_marks=100)
+        self.science_exam = Exam.objects.create(name='Mid term', date=datetime.date(2026, 3, 2),
+                                                subject=self.science, class_group=self.school_class, total_marks=50)
+        self.students = [make_student(number, self.school_class) for number in range(1, 5)]
+        for student, maths, science in zip(self.students, (90, 80, 80, 60), (45, 40, 40, 30)):
+            Grade.objects.create(student=student, exam=self.maths_exam, marks_obtained=maths)
+            Grade.objects.create(student=student, exam=self.science_exam, marks_obtained=science)
+
+    def _ranks(self, entries):
+        return [entries[student.pk]['rank'] for student in self.students]
+
+    def test_dense_ranks_and_statistics(self):
+        rankings = class_rankings(self.school_class.pk)
+        self.assertEqual(self._ranks(rankings['students']), [1, 2, 2, 3])
+        self.assertEqual(self._ranks(rankings['subjects'][self.science.pk]['students']), [1, 2, 2, 3])
+        self.assertEqual(rankings['students'][self.students[0].pk]['score'], Decimal('90.00'))
+        self.assertEqual(rankings['students'][self.students[0].pk]['percentile'], 87.5)
+        self.assertEqual(rankings['stats']['count'], 4)
+        self.assertEqual(rankings['stats']['median'], 80.0)
+        self.assertEqual(self._ranks(exam_rankings(self.maths_exam.pk)['students']), [1, 2, 2, 3])
+
+    def test_grade_writes_invalidate_class_rankings(self):
+        self.assertEqual(self._ranks(class_rankings(self.school_class.pk)['students']), [1, 2, 2, 3])
+        with self.assertNumQueries(0):
+            class_rankings(self.school_class.pk)
+        Grade.objects.filter(student=self.students[3], exam=self.maths_exam).update(marks_obtained=100)
+        Grade.objects.get(student=self.students[3], exam=self.science_exam).save()
+        self.assertEqual(self._ranks(class_rankings(self.school_class.pk)['students']), [1, 3, 3, 2])
+
+
+class MarksEntryTests(TestCase):
+    def setUp(self):
+        self.school_class = Class.objects.create(name='Class 1', section='A')
+        self.exam = Exam.objects.create(name='Mid term', date=datetime.date(2026, 3, 1),
+                                        subject=Subject.objects.create(name='Maths', code='M1'),
+                                        class_group=self.school_class, total_marks=100)
+        self.student = make_student(1, self.school_class)
+
+    def test_rejects_non_finite_marks(self):
+        for value in ('NaN', 'sNaN', 'Infinity', '-inf'):
+            with self.subTest(value=value), self.assertRaisesMessage(ValueError, f"Invalid marks {value!r}"):
+                record_marks(self.exam, {self.student.pk: (value, '')})
+        self.assertFalse(Grade.objects.exists())
+
+    def test_upload_errors(self):
+        nan = SimpleUploadedFile('marks.csv', b'admission_number,marks\nADM0001,NaN\n')
+        with self.assertRaisesMessage(ValueError, "Invalid marks 'NaN'"):
+            import_marks(self.exam, nan)
+        latin1 = SimpleUploadedFile('marks.csv', 'admission_number,marks,remarks\nADM0001,80,Très bien\n'
+                                    .encode('latin-1'))
+        self.client.force_login(User.objects.create_user('teacher', password='x', role=User.Role.TEACHER))
+        response = self.client.post(reverse('staff:enter_marks', args=[self.exam.pk]), {'marks_file': latin1})
+        self.assertRedirects(response, reverse('staff:enter_marks', args=[self.exam.pk]), fetch_redirect_response=False)
+        self.assertEqual([str(message) for message in get_messages(response.wsgi_request)],
+                         ["The file is not UTF-8 text; save it as a UTF-8 CSV or an XLSX file."])
+        self.assertFalse(Grade.objects.exists())
+
+@override_settings(TIMETABLE_SCHOOL_DAYS=['MONDAY'], TIMETABLE_PERIOD_TIMES=[('08:00', '08:45'), ('08:45', '09:30')])
+class TimetableGeneratorTests(TestCase):
+    ROOMS = ['R1', 'R2', 'R3']
+
+    def setUp(self):
+        self.classes = [Class.objects.create(name=f'Class {n}', section='A') for n in range(1, 4)]
+        for school_class in self.classes:
+            subject = Subject.objects.create(name=f'Maths {school_class.name}', code=f'M{school_class.pk}',
+                                             periods_per_week=2)
+            subject.classes.add(school_class)
+        self.first_two = [school_class.pk for school_class in self.classes[:2]]
+        result = generate_timetable(self.first_two, rooms=self.ROOMS, seed=1)
+        write_timetable(result['class_ids'], result['entries'])
+
+    def test_partial_regenerate_keeps_other_classes_rooms(self):
+        last = self.classes[2].pk
+        result = generate_timetable([last], rooms=self.ROOMS, seed=1)
+        self.assertEqual((result['errors'], result['unplaced']), ([], []))
+        write_timetable(result['class_ids'], result['entries'])
+        self.assertEqual(Timetable.objects.count(), 6)
+        self.assertEqual(find_clashes(), [])
+
+    def test_attempts_must_be_positive(self):
+        with self.assertRaisesMessage(ValueError, "attempts must be at least 1, not 0"):
+            generate_timetable([self.classes[2].pk], rooms=self.ROOMS, attempts=0)
+
+    def test_partial_regenerate_without_free_rooms(self):
+        result = generate_timetable([self.classes[2].pk], rooms=self.ROOMS[:2], seed=1)
+        self.assertTrue(result['errors'])
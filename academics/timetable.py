@@ -0,0 +1,201 @@
+"""
+Timetable statistics and clash detection shared by the admin timetable
+pages, management commands and reporting jobs.
+
+Statistics are computed from a fixed number of grouped queries, and clash
+checks run against an in-memory interval index built from one query.
+"""
+from bisect import bisect_left
+
+from django.conf import settings
+from django.db.models import Count
+
+from staff.models import Staff
+from .models import Class, Timetable
+
+
+def school_days():
+    return list(settings.TIMETABLE_SCHOOL_DAYS)
+
+
+def _per_day_counts(field):
+    counts = {}
+    rows = (Timetable.objects.exclude(**{f'{field}__isnull': True})
+            .values(field, 'day').annotate(n=Count('id')).order_by())
+    for row in rows:
+        counts.setdefault(row[field], {})[row['day']] = row['n']
+    return counts
+
+
+def timetable_statistics():
+    """
+    Return ``{'classes': [...], 'teachers': [...], 'days': [...], 'periods_per_day': n}``.
+
+    Each class carries ``entry_count`` and ``periods_per_day`` (day -> slots).
+    Each teacher additionally carries ``free_periods`` (day -> free slots out of
+    TIMETABLE_PERIODS_PER_DAY) and ``free_periods_total`` for the week.
+    """
+    days = school_days()
+    periods_per_day = settings.TIMETABLE_PERIODS_PER_DAY
+
+    classes = list(Class.objects.select_related('teacher__user')
+                   .annotate(entry_count=Count('timetable')).order_by('name', 'section'))
+    teachers = list(Staff.objects.select_related('user')
+                    .annotate(entry_count=Count('timetable')).order_by('user__first_name'))
+    class_days = _per_day_counts('class_group_id')
+    teacher_days = _per_day_counts('teacher_id')
+
+    for cls in classes:
+        counts = class_days.get(cls.id, {})
+        cls.periods_per_day = {day: counts.get(day, 0) for day in days}
+
+    for teacher in teachers:
+        counts = teacher_days.get(teacher.id, {})
+        teacher.periods_per_day = {day: counts.get(day, 0) for day in days}
+        teacher.free_periods = {day: max(periods_per_day - n, 0) for day, n in teacher.periods_per_day.items()}
+        teacher.free_periods_total = sum(teacher.free_periods.values())
+
+    return {
+        'classes': classes,
+        'teachers': teachers,
+        'days': days,
+        'periods_per_day': periods_per_day,
+    }
+
+
+def timetable_statistics_data():
+    """Plain-data version of :func:`timetable_statistics` for JSON and reports."""
+    stats = timetable_statistics()
+    return {
+        'days': stats['days'],
+        'periods_per_day': stats['periods_per_day'],
+        'classes': [
+            {
+                'id': cls.id,
+                'name': str(cls),
+                'entry_count': cls.entry_count,
+                'periods_per_day': cls.periods_per_day,
+            }
+            for cls in stats['classes']
+        ],
+        'teachers': [
+            {
+                'id': teacher.id,
+                'name': teacher.user.get_full_name(),
+                'entry_count': teacher.entry_count,
+                'periods_per_day': teacher.periods_per_day,
+                'free_periods': teacher.free_periods,
+                'free_periods_total': teacher.free_periods_total,
+            }
+            for teacher in stats['teachers']
+        ],
+    }
+
+
+class IntervalIndex:
+    """
+    Time intervals grouped by key (e.g. ``('teacher', day, teacher_id)``).
+
+    Each key's intervals are sorted by start time with a running maximum of
+    end times, so an overlap query is a bisect plus a walk over the actual
+    overlaps: O(log n) on a clash-free timetable.
+    """
+
+    def __init__(self, entries=()):
+        groups = {}
+        for key, start, end, entry in entries:
+            groups.setdefault(key, []).append((start, end, entry))
+        self._groups = {}
+        for key, items in groups.items():
+            items.sort(key=lambda item: (item[0], item[1]))
+            max_ends, running = [], None
+            for _start, end, _entry in items:
+                running = end if running is None or end > running else running
+                max_ends.append(running)
+            self._groups[key] = ([item[0] for item in items], max_ends, items)
+
+    def keys(self):
+        return self._groups.keys()
+
+    def items(self, key):
+        return self._groups[key][2] if key in self._groups else []
+
+    def overlapping(self, key, start, end):
+        """Entries under ``key`` whose interval overlaps ``[start, end)``."""
+        if key not in self._groups:
+            return []
+        starts, max_ends, items = self._groups[key]
+        found = []
+        i = bisect_left(starts, end) - 1
+        while i >= 0 and max_ends[i] > start:
+            _item_start, item_end, entry = items[i]
+            if item_end > start:
+                found.append(entry)
+            i -= 1
+        return found
+
+
+def _slot_keys(entry):
+    day = entry['day']
+    keys = [('class', day, entry['class_group_id'])]
+    if entry['teacher_id']:
+        keys.append(('teacher', day, entry['teacher_id']))
+    room = (entry['room_number'] or '').strip().lower()
+    if room:
+        keys.append(('room', day, room))
+    return keys
+
+
+def build_timetable_index(day=None):
+    """Load the timetable (optionally a single day) with one query and index it."""
+    rows = Timetable.objects.all()
+    if day:
+        rows = rows.filter(day=day)
+    rows = rows.values('id', 'class_group_id', 'subject_id', 'teacher_id', 'day', 'start_time', 'end_time', 'room_number')
+    return IntervalIndex(
+        (key, row['start_time'], row['end_time'], row)
+        for row in rows
+        for key in _slot_keys(row)
+    )
+
+
+def check_slot(class_group_id, teacher_id, day, start_time, end_time, room_number='', index=None, exclude_id=None):
+    """
+    Return human-readable clashes for a proposed slot; an empty list means it is free.
+    ``index`` may be a prebuilt :class:`IntervalIndex`; otherwise the day is loaded.
+    """
+    if start_time >= end_time:
+        return ["End time must be after start time."]
+    index = index or build_timetable_index(day)
+    proposed = {
+        'id': exclude_id, 'class_group_id': class_group_id, 'teacher_id': teacher_id,
+        'day': day, 'room_number': room_number,
+    }
+    labels = {'class': 'Class', 'teacher': 'Teacher', 'room': 'Room'}
+    clashes = []
+    for key in _slot_keys(proposed):
+        for other in index.overlapping(key, start_time, end_time):
+            if exclude_id is not None and other['id'] == exclude_id:
+                continue
+            clashes.append(
+                f"{labels[key[0]]} is already booked on {day.title()} "
+                f"{other['start_time']:%H:%M}-{other['end_time']:%H:%M} (entry #{other['id']})."
+            )
+    return clashes
+
+
+def find_clashes(index=None):
+    """
+    Every pair of overlapping slots that share a class, teacher or room on the same day.
+    Returns a list of ``(kind, key, first, second)`` tuples.
+    """
+    index = index or build_timetable_index()
+    clashes = []
+    for key in index.keys():
+        active = []
+        for start, end, entry in index.items(key):
+            active = [item for item in active if item[1] > start]
+            for _other_start, _other_end, other in active:
+                clashes.append((key[0], key, other, entry))
+            active.append((start, end, entry))
+    return clashes
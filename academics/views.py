@@ -1,32 +1,45 @@
+import datetime
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required, user_passes_test
 from django.contrib import messages
+from django.http import JsonResponse
 from core.models import User
 from .models import Class, Timetable, Subject
 from staff.models import Staff
+from .timetable import check_slot, timetable_statistics, timetable_statistics_data
 
 def is_admin(user):
     return user.is_authenticated and user.role == User.Role.ADMIN
 
+def _slot_clashes(class_group_id, teacher_id, day, start_time, end_time, room):
+    """Validate a new slot against everything already booked on that day."""
+    try:
+        start = datetime.time.fromisoformat(start_time)
+        end = datetime.time.fromisoformat(end_time)
+    except (TypeError, ValueError):
+        return ["Please enter valid start and end times."]
+    if day not in Timetable.DayOfWeek.values:
+        return ["Please choose a valid day."]
+    return check_slot(class_group_id, int(teacher_id) if teacher_id else None, day, start, end, room)
+
 @login_required
 @user_passes_test(is_admin)
 def manage_timetable(request):
-    classes = Class.objects.all().order_by('name', 'section')
-    teachers = Staff.objects.select_related('user').all().order_by('user__first_name')
-    
-    # Count timetable entries per class and teacher
-    for cls in classes:
-        cls.entry_count = Timetable.objects.filter(class_group=cls).count()
-    
-    for teacher in teachers:
-        teacher.entry_count = Timetable.objects.filter(teacher=teacher).count()
+    # Entry counts and free periods come from grouped queries, not one COUNT per row
+    stats = timetable_statistics()
     
     context = {
-        'classes': classes,
-        'teachers': teachers,
+        'classes': stats['classes'],
+        'teachers': stats['teachers'],
+        'periods_per_week': stats['periods_per_day'] * len(stats['days']),
     }
     return render(request, 'academics/manage_timetable.html', context)
 
+@login_required
+@user_passes_test(is_admin)
+def timetable_stats_api(request):
+    return JsonResponse(timetable_statistics_data())
+
 @login_required
 @user_passes_test(is_admin)
 def edit_timetable(request, class_id):
@@ -47,6 +60,12 @@ def edit_timetable(request, class_id):
             subject = get_object_or_404(Subject, id=subject_id)
             teacher = get_object_or_404(Staff, id=teacher_id) if teacher_id else None
             
+            clashes = _slot_clashes(class_obj.id, teacher_id or None, day, start_time, end_time, room)
+            if clashes:
+                for clash in clashes:
+                    messages.error(request, clash)
+                return redirect('academics:edit_timetable', class_id=class_id)
+            
             Timetable.objects.create(
                 class_group=class_obj,
                 subject=subject,
@@ -100,6 +119,12 @@ def edit_timetable_teacher(request, teacher_id):
             class_obj = get_object_or_404(Class, id=class_id)
             subject = get_object_or_404(Subject, id=subject_id)
             
+            clashes = _slot_clashes(class_obj.id, teacher_obj.id, day, start_time, end_time, room)
+            if clashes:
+                for clash in clashes:
+                    messages.error(request, clash)
+                return redirect('academics:edit_timetable_teacher', teacher_id=teacher_id)
+            
             Timetable.objects.create(
                 class_group=class_obj,
                 subject=subject,
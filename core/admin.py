@@ -1,6 +1,7 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
-from .models import User, Announcement, Notification, ActivityLog
+from django.utils import timezone
+from .models import User, Announcement, Notification, ActivityLog, OutboundEmail
 
 @admin.register(User)
 class CustomUserAdmin(UserAdmin):
@@ -28,3 +29,19 @@ class ActivityLogAdmin(admin.ModelAdmin):
     list_display = ('user', 'action', 'timestamp', 'ip_address')
     list_filter = ('timestamp',)
     readonly_fields = ('user', 'action', 'timestamp', 'ip_address')
+
+@admin.register(OutboundEmail)
+class OutboundEmailAdmin(admin.ModelAdmin):
+    list_display = ('subject', 'recipients', 'status', 'attempts', 'next_attempt_at', 'sent_at')
+    list_filter = ('status', 'created_at')
+    search_fields = ('subject', 'recipients')
+    # Bodies can hold passwords; they are cleared once sent and never shown here.
+    exclude = ('body',)
+    readonly_fields = ('attempts', 'last_error', 'created_at', 'sent_at')
+    actions = ['retry_now']
+
+    @admin.action(description="Retry selected emails now")
+    def retry_now(self, request, queryset):
+        updated = queryset.exclude(status=OutboundEmail.Status.SENT).update(
+            status=OutboundEmail.Status.PENDING, attempts=0, next_attempt_at=timezone.now())
+        self.message_user(request, f"{updated} email(s) queued for retry.")
@@ -0,0 +1,86 @@
+"""
+Cached counters for the admin dashboard and admin profile.
+
+All counters are computed in a single round trip (one SELECT of scalar
+subqueries) and kept in Django's cache for at most DASHBOARD_STATS_TTL
+seconds. Writes to the counted models drop the cached copy (see
+core.signals), so the TTL only bounds staleness from writes that bypass
+model signals, such as bulk_create or raw SQL.
+"""
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+from django.utils import timezone
+
+from academics.models import Class, Subject
+from finance.models import Invoice, Payment
+from staff.models import Staff
+from students.models import Student
+from transport.models import Route, Vehicle
+from .models import User
+
+CACHE_KEY = 'core:dashboard-stats'
+
+# Models that are only counted: creating or deleting rows changes the counters.
+COUNTED_MODELS = (Student, Class, Subject, Staff, User, Vehicle, Route)
+# Models whose updates matter too (revenue sums amounts, pending checks is_paid).
+AGGREGATED_MODELS = (Payment, Invoice)
+
+
+def _table(model):
+    return connection.ops.quote_name(model._meta.db_table)
+
+
+def compute_dashboard_stats():
+    """Compute every dashboard counter with one query."""
+    is_paid = connection.ops.quote_name(Invoice._meta.get_field('is_paid').column)
+    amount_paid = connection.ops.quote_name(Payment._meta.get_field('amount_paid').column)
+    sql = f"""
+        SELECT
+            (SELECT COUNT(*) FROM {_table(Student)}),
+            (SELECT COUNT(*) FROM {_table(Class)}),
+            (SELECT COUNT(*) FROM {_table(Subject)}),
+            (SELECT COUNT(*) FROM {_table(Staff)}),
+            (SELECT COUNT(*) FROM {_table(User)}),
+            (SELECT COALESCE(SUM({amount_paid}), 0) FROM {_table(Payment)}),
+            (SELECT COUNT(*) FROM {_table(Invoice)} WHERE {is_paid} = %s),
+            (SELECT COUNT(*) FROM {_table(Vehicle)}),
+            (SELECT COUNT(*) FROM {_table(Route)})
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [False])
+        row = cursor.fetchone()
+    (students, classes, subjects, staff, users, revenue, pending_invoices, vehicles, routes) = row
+    return {
+        'total_students': students,
+        'total_classes': classes,
+        'total_subjects': subjects,
+        'total_staff': staff,
+        'total_users': users,
+        # SQLite hands SUM() of a decimal column back as a float.
+        'total_revenue': Decimal(str(revenue)).quantize(Decimal('0.01')),
+        'pending_invoices': pending_invoices,
+        'total_vehicles': vehicles,
+        'total_routes': routes,
+        'computed_at': timezone.now(),
+    }
+
+
+def get_dashboard_stats():
+    """Return the cached counters, recomputing them when missing or expired."""
+    stats = cache.get(CACHE_KEY)
+    if stats is None:
+        stats = warm_dashboard_stats()
+    return stats
+
+
+def warm_dashboard_stats():
+    stats = compute_dashboard_stats()
+    cache.set(CACHE_KEY, stats, timeout=settings.DASHBOARD_STATS_TTL)
+    return stats
+
+
+def invalidate_dashboard_stats():
+    cache.delete(CACHE_KEY)
@@ -0,0 +1,114 @@
+"""
+Persistent outbound email queue.
+
+Request handlers call queue_mail()/queue_mass_mail() instead of send_mail(),
+which only inserts OutboundEmail rows. The send_queued_mail management
+command delivers them in batches over one reused connection per worker,
+retrying failures with exponential backoff.
+
+Bodies can carry new accounts' passwords, so a message's body is cleared
+once it has been sent, and the admin never shows it.
+"""
+import datetime
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import OutboundEmail
+
+
+def _row(subject, message, from_email, recipient_list):
+    return OutboundEmail(
+        subject=subject,
+        body=message,
+        from_email=from_email or settings.DEFAULT_FROM_EMAIL,
+        recipients=','.join(recipient_list),
+    )
+
+
+def queue_mail(subject, message, from_email, recipient_list):
+    """Queue one email; same arguments as django.core.mail.send_mail."""
+    email = _row(subject, message, from_email, recipient_list)
+    email.save()
+    return email
+
+
+def queue_mass_mail(datatuple, batch_size=500):
+    """Queue many emails with bulk inserts; same datatuple as send_mass_mail."""
+    rows = [_row(*data) for data in datatuple]
+    OutboundEmail.objects.bulk_create(rows, batch_size=batch_size)
+    return len(rows)
+
+
+def retry_delay(attempts):
+    """Backoff before the next attempt: base * 2^(attempts - 1), capped at one day."""
+    seconds = settings.OUTBOX_RETRY_BASE_SECONDS * (2 ** max(attempts - 1, 0))
+    return datetime.timedelta(seconds=min(seconds, 24 * 60 * 60))
+
+
+def claim_batch(batch_size):
+    """
+    Reserve up to ``batch_size`` due messages for this worker.
+
+    Claimed rows move to SENDING with a lease; if a worker dies mid-batch the
+    lease expires and another worker picks the rows up again.
+    """
+    now = timezone.now()
+    due = Q(status=OutboundEmail.Status.PENDING) | Q(status=OutboundEmail.Status.SENDING)
+    ids = list(OutboundEmail.objects.filter(due, next_attempt_at__lte=now)
+               .order_by('next_attempt_at', 'id').values_list('id', flat=True)[:batch_size])
+    if not ids:
+        return []
+    lease = now + datetime.timedelta(seconds=settings.OUTBOX_LEASE_SECONDS)
+    # Only rows still due are taken, so two workers never claim the same message.
+    OutboundEmail.objects.filter(due, id__in=ids, next_attempt_at__lte=now).update(
+        status=OutboundEmail.Status.SENDING, next_attempt_at=lease)
+    return list(OutboundEmail.objects.filter(id__in=ids, status=OutboundEmail.Status.SENDING, next_attempt_at=lease))
+
+
+def deliver(messages):
+    """Send claimed messages over one connection. Returns ``(sent, failed)``."""
+    now = timezone.now()
+    sent = failed = 0
+    try:
+        connection = get_connection(fail_silently=False)
+        connection.open()
+    except Exception as e:
+        for message in messages:
+            _failed(message, e, now)
+        OutboundEmail.objects.bulk_update(messages, ['status', 'attempts', 'next_attempt_at', 'last_error'])
+        return 0, len(messages)
+
+    try:
+        for message in messages:
+            email = EmailMessage(message.subject, message.body, message.from_email,
+                                 message.recipient_list(), connection=connection)
+            try:
+                email.send()
+            except Exception as e:
+                _failed(message, e, now)
+                failed += 1
+            else:
+                message.status = OutboundEmail.Status.SENT
+                message.attempts += 1
+                message.sent_at = timezone.now()
+                message.last_error = ''
+                message.body = ''
+                sent += 1
+    finally:
+        connection.close()
+    OutboundEmail.objects.bulk_update(messages, ['status', 'attempts', 'next_attempt_at', 'last_error', 'sent_at',
+                                                 'body'])
+    return sent, failed
+
+
+def _failed(message, error, now):
+    message.attempts += 1
+    message.last_error = f"{type(error).__name__}: {error}"
+    if message.attempts >= settings.OUTBOX_MAX_ATTEMPTS:
+        message.status = OutboundEmail.Status.FAILED
+    else:
+        message.status = OutboundEmail.Status.PENDING
+        message.next_attempt_at = now + retry_delay(message.attempts)
@@ -0,0 +1,49 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from core.mail import claim_batch, deliver
+
+
+def _work(batch_size):
+    """Claim and deliver batches until the queue has nothing due. Runs in a worker thread."""
+    sent = failed = 0
+    try:
+        while True:
+            batch = claim_batch(batch_size)
+            if not batch:
+                return sent, failed
+            batch_sent, batch_failed = deliver(batch)
+            sent += batch_sent
+            failed += batch_failed
+    finally:
+        close_old_connections()
+
+
+class Command(BaseCommand):
+    help = 'Delivers queued outbound emails in batches, retrying failures with backoff'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=settings.OUTBOX_BATCH_SIZE,
+                            help='Messages sent per SMTP connection')
+        parser.add_argument('--workers', type=int, default=1, help='Parallel sending threads')
+        parser.add_argument('--loop', action='store_true', help='Keep polling the queue instead of exiting')
+        parser.add_argument('--interval', type=float, default=5, help='Seconds between polls with --loop')
+
+    def handle(self, *args, **options):
+        workers = max(options['workers'], 1)
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            while True:
+                started = time.perf_counter()
+                results = list(pool.map(_work, [options['batch_size']] * workers))
+                sent = sum(result[0] for result in results)
+                failed = sum(result[1] for result in results)
+                if sent or failed or not options['loop']:
+                    elapsed = time.perf_counter() - started
+                    self.stdout.write(f"Sent {sent}, failed {failed} in {elapsed:.2f}s")
+                if not options['loop']:
+                    break
+                time.sleep(options['interval'])
@@ -0,0 +1,51 @@
+import logging
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+
+from .profiling import QueryBudgetExceeded, query_budget, record, start_profile, stop_profile
+
+logger = logging.getLogger(__name__)
+
+
+class ProfilingMiddleware:
+    """
+    Record query count, DB time, template time and total latency for every
+    request under its resolved URL name, and enforce QUERY_BUDGETS: a view
+    that runs more queries than its budget raises QueryBudgetExceeded when
+    QUERY_BUDGET_RAISE is set (see core.tests) and logs a warning otherwise.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not settings.PROFILING_ENABLED:
+            return self.get_response(request)
+
+        profile, token = start_profile()
+        started = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(profile.execute_wrapper))
+                response = self.get_response(request)
+        finally:
+            stop_profile(token)
+        total_time = time.perf_counter() - started
+
+        match = getattr(request, 'resolver_match', None)
+        if match is None:
+            return response
+        url_name = match.view_name
+        record(url_name, request.method, response.status_code, total_time, profile)
+
+        budget = query_budget(url_name)
+        if budget is not None and profile.queries > budget:
+            message = f"{url_name} ran {profile.queries} queries (budget {budget}) for {request.method} {request.path}"
+            if settings.QUERY_BUDGET_RAISE:
+                raise QueryBudgetExceeded(message)
+            logger.warning(message)
+        return response
@@ -0,0 +1,145 @@
+"""
+Per-view request profiling.
+
+core.middleware.ProfilingMiddleware measures each request's query count,
+database time, template render time and total latency, and records them
+here under the resolved URL name (e.g. ``staff:enter_marks``). The last
+PROFILING_BUFFER_SIZE requests per URL name are kept in an in-process ring
+buffer, so each server process reports on the traffic it has served.
+
+Template time is measured by the ProfilingDjangoTemplates backend, which
+wraps the standard Django backend and only times top-level renders (an
+``{% include %}`` is part of its parent's render).
+"""
+import contextvars
+import statistics
+import threading
+import time
+from collections import deque
+
+from django.conf import settings
+from django.template.backends.django import DjangoTemplates
+
+_current = contextvars.ContextVar('request_profile', default=None)
+_buffers = {}
+_lock = threading.Lock()
+
+
+class QueryBudgetExceeded(Exception):
+    pass
+
+
+class RequestProfile:
+    def __init__(self):
+        self.queries = 0
+        self.db_time = 0.0
+        self.template_time = 0.0
+
+    def execute_wrapper(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries += 1
+            self.db_time += time.perf_counter() - started
+
+
+def start_profile():
+    profile = RequestProfile()
+    return profile, _current.set(profile)
+
+
+def stop_profile(token):
+    _current.reset(token)
+
+
+class _ProfiledTemplate:
+    def __init__(self, template):
+        self._wrapped = template
+
+    def __getattr__(self, name):
+        # origin, template, backend, ... read through to the backend template unchanged.
+        return getattr(self._wrapped, name)
+
+    def render(self, context=None, request=None):
+        profile = _current.get()
+        if profile is None:
+            return self._wrapped.render(context, request)
+        started = time.perf_counter()
+        try:
+            return self._wrapped.render(context, request)
+        finally:
+            profile.template_time += time.perf_counter() - started
+
+
+class ProfilingDjangoTemplates(DjangoTemplates):
+    """The standard Django template backend, with render times added to the request profile."""
+
+    def from_string(self, template_code):
+        return _ProfiledTemplate(super().from_string(template_code))
+
+    def get_template(self, template_name):
+        return _ProfiledTemplate(super().get_template(template_name))
+
+
+def record(url_name, method, status_code, total_time, profile):
+    sample = {
+        'method': method,
+        'status': status_code,
+        'queries': profile.queries,
+        'db_ms': round(profile.db_time * 1000, 2),
+        'template_ms': round(profile.template_time * 1000, 2),
+        'total_ms': round(total_time * 1000, 2),
+        'at': time.time(),
+    }
+    with _lock:
+        buffer = _buffers.get(url_name)
+        if buffer is None:
+            buffer = _buffers[url_name] = deque(maxlen=settings.PROFILING_BUFFER_SIZE)
+        buffer.append(sample)
+    return sample
+
+
+def query_budget(url_name):
+    return settings.QUERY_BUDGETS.get(url_name)
+
+
+def _percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(int(len(ordered) * fraction), len(ordered) - 1)]
+
+
+def profile_summary():
+    """One row per URL name with request count, averages, p95/max latency and budget overruns."""
+    with _lock:
+        buffers = {url_name: list(samples) for url_name, samples in _buffers.items()}
+    rows = []
+    for url_name, samples in buffers.items():
+        totals = [sample['total_ms'] for sample in samples]
+        queries = [sample['queries'] for sample in samples]
+        budget = query_budget(url_name)
+        rows.append({
+            'url_name': url_name,
+            'requests': len(samples),
+            'avg_queries': round(statistics.fmean(queries), 1),
+            'max_queries': max(queries),
+            'query_budget': budget,
+            'over_budget': sum(1 for n in queries if budget is not None and n > budget),
+            'avg_db_ms': round(statistics.fmean(sample['db_ms'] for sample in samples), 2),
+            'avg_template_ms': round(statistics.fmean(sample['template_ms'] for sample in samples), 2),
+            'avg_total_ms': round(statistics.fmean(totals), 2),
+            'p95_total_ms': _percentile(totals, 0.95),
+            'max_total_ms': max(totals),
+        })
+    rows.sort(key=lambda row: row['avg_total_ms'], reverse=True)
+    return rows
+
+
+def recent_samples(url_name):
+    with _lock:
+        return list(_buffers.get(url_name, ()))
+
+
+def reset():
+    with _lock:
+        _buffers.clear()
@@ -0,0 +1,18 @@
+from django.db.models.signals import post_delete, post_save
+
+from .dashboard import AGGREGATED_MODELS, COUNTED_MODELS, invalidate_dashboard_stats
+
+
+def dashboard_row_saved(sender, created, **kwargs):
+    # Plain updates (e.g. User.last_login on every login) leave the counts alone.
+    if created or sender in AGGREGATED_MODELS:
+        invalidate_dashboard_stats()
+
+
+def dashboard_row_deleted(sender, **kwargs):
+    invalidate_dashboard_stats()
+
+
+for model in COUNTED_MODELS + AGGREGATED_MODELS:
+    post_save.connect(dashboard_row_saved, sender=model, dispatch_uid=f'dashboard-save-{model._meta.label}')
+    post_delete.connect(dashboard_row_deleted, sender=model, dispatch_uid=f'dashboard-delete-{model._meta.label}')
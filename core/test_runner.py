@@ -0,0 +1,35 @@
+"""
+Test runner that keeps tests off the shared cache.
+
+The dev server and management commands share the file-based cache, and
+tests reuse small integer primary keys, so cached rankings, route manifests
+or fleet analytics from either side could be served to the other. The
+runner points CACHES at settings.TEST_CACHES for the whole run and clears it
+before each test, so every test starts from an empty cache.
+"""
+from django.conf import settings
+from django.core.cache import caches
+from django.test.runner import DiscoverRunner
+from django.test.utils import override_settings
+
+
+class _ClearCachesBeforeTest:
+    def startTest(self, test):
+        for cache in caches.all(initialized_only=True):
+            cache.clear()
+        super().startTest(test)
+
+
+class TestRunner(DiscoverRunner):
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self._test_caches = override_settings(CACHES=settings.TEST_CACHES)
+        self._test_caches.enable()
+
+    def teardown_test_environment(self, **kwargs):
+        self._test_caches.disable()
+        super().teardown_test_environment(**kwargs)
+
+    def get_resultclass(self):
+        base = super().get_resultclass() or self.test_runner.resultclass
+        return type('CacheClearingResult', (_ClearCachesBeforeTest, base), {})
@@ -1,3 +1,157 @@
-from django.test import TestCase
+import datetime
 
-# Create your tests here.
+from django.conf import settings
+from django.core import mail
+from django.template import Template as EngineTemplate, loader
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from academics.models import Attendance, Class, Exam, Grade, Homework, Subject, Timetable
+from core.utils import academic_year_for
+from finance.models import FeeStructure, Payment
+from staff.models import Staff
+from students.models import Student
+from transport.models import Driver, FuelLog, MaintenanceLog, Route, RouteStop, StudentTransport, Vehicle
+from .mail import claim_batch, deliver, queue_mail
+from .models import Announcement, OutboundEmail, User
+from .profiling import QueryBudgetExceeded
+
+CLASSES = 3
+SUBJECTS_PER_CLASS = 6
+STUDENTS_PER_CLASS = 12
+
+
+def make_user(username, role):
+    return User.objects.create_user(username, password='x', role=role, first_name=username.title(), last_name='Test')
+
+
+@override_settings(QUERY_BUDGET_RAISE=True)
+class QueryBudgetTests(TestCase):
+    """
+    Every budgeted page, fetched cold with more rows than its budget, so a
+    query per row pushes it over and QueryBudgetExceeded fails the test.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        today = timezone.localdate()
+        cls.admin = make_user('admin', User.Role.ADMIN)
+        cls.manager = make_user('manager', User.Role.TRANSPORT_MANAGER)
+        teachers = [Staff.objects.create(user=make_user(f'teacher{n}', User.Role.TEACHER), designation='Teacher',
+                                         employee_id=f'T{n}', department='Academics', joining_date=today)
+                    for n in range(1, SUBJECTS_PER_CLASS + 1)]
+        cls.teacher = teachers[0].user
+        driver = Driver.objects.create(user=make_user('driver', User.Role.STAFF), license_number='DL-1',
+                                       phone_number='1')
+        cls.driver = driver.user
+        vehicle = Vehicle.objects.create(registration_number='KA-01', capacity=50, model='Bus', driver=driver)
+        cls.route = Route.objects.create(name='North', start_point='North Gate', end_point='School', vehicle=vehicle)
+        stops = [RouteStop.objects.create(route=cls.route, name=f'Stop {n}', sequence=n) for n in range(1, 6)]
+        for week in range(4):
+            FuelLog.objects.create(vehicle=vehicle, date=today - datetime.timedelta(weeks=week), liters=40, cost=100,
+                                   odometer_reading=20000 - week * 500)
+        MaintenanceLog.objects.create(vehicle=vehicle, date=today - datetime.timedelta(days=30),
+                                      description='Service', cost=300, serviced_by='Garage')
+        for role in (User.Role.STUDENT, User.Role.TRANSPORT_MANAGER):
+            for n in range(3):
+                Announcement.objects.create(title=f'Notice {n}', content='-', posted_by=cls.admin, target_role=role)
+
+        cls.classes = [Class.objects.create(name=f'Class {n}', section='A', teacher=teachers[n - 1])
+                       for n in range(1, CLASSES + 1)]
+        cls.exams = []
+        number = 0
+        for school_class in cls.classes:
+            FeeStructure.objects.create(class_level=school_class, tuition_fee=1000, other_fees=100,
+                                        academic_year=academic_year_for())
+            exams = []
+            for period, teacher in enumerate(teachers):
+                subject = Subject.objects.create(name=f'Subject {period} of {school_class.pk}',
+                                                 code=f'S{school_class.pk}-{period}', teacher=teacher)
+                subject.classes.add(school_class)
+                exams.append(Exam.objects.create(name='Mid term', date=today, subject=subject,
+                                                 class_group=school_class, total_marks=100))
+                Homework.objects.create(subject=subject, class_group=school_class, title='Exercises',
+                                        description='-', assigned_date=today, due_date=today, assigned_by=teacher)
+                for day in Timetable.DayOfWeek.values[:5]:
+                    Timetable.objects.create(class_group=school_class, subject=subject, teacher=teacher, day=day,
+                                             start_time=datetime.time(8 + period), end_time=datetime.time(9 + period))
+            cls.exams += exams
+            for _ in range(STUDENTS_PER_CLASS):
+                number += 1
+                user = make_user(f'student{number}', User.Role.STUDENT)
+                student = Student.objects.create(user=user, admission_number=f'ADM{number:04d}',
+                                                 date_of_birth=datetime.date(2015, 1, 1), address='Somewhere',
+                                                 current_class=school_class)
+                for days in range(5):
+                    Attendance.objects.create(student=student, date=today - datetime.timedelta(days=days),
+                                              status=Attendance.Status.PRESENT)
+                for exam in exams:
+                    Grade.objects.create(student=student, exam=exam, marks_obtained=40 + number)
+                Payment.objects.create(student=student, amount_paid=100, payment_method='CASH')
+                stop = stops[number % len(stops)]
+                StudentTransport.objects.create(student=student, route=cls.route, pickup_stop=stop, drop_stop=stop,
+                                                bus_fees=100)
+        cls.student = Student.objects.select_related('user').first().user
+
+    def get(self, user, url_name, *args):
+        self.client.force_login(user)
+        response = self.client.get(reverse(url_name, args=args))
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def test_budgets_are_covered(self):
+        covered = {'admin_dashboard', 'students:dashboard', 'students:grades', 'staff:take_attendance',
+                   'staff:enter_marks', 'academics:manage_timetable', 'transport:dashboard',
+                   'transport:driver_dashboard', 'transport:attendance'}
+        self.assertEqual(set(settings.QUERY_BUDGETS), covered)
+
+    def test_admin_dashboard(self):
+        self.get(self.admin, 'admin_dashboard')
+
+    def test_student_pages(self):
+        self.get(self.student, 'students:dashboard')
+        self.get(self.student, 'students:grades')
+
+    def test_staff_pages(self):
+        self.get(self.teacher, 'staff:take_attendance', self.classes[0].pk)
+        self.get(self.teacher, 'staff:enter_marks', self.exams[0].pk)
+
+    def test_manage_timetable(self):
+        self.get(self.admin, 'academics:manage_timetable')
+
+    def test_transport_pages(self):
+        self.get(self.manager, 'transport:dashboard')
+        self.get(self.manager, 'transport:attendance', self.route.pk)
+        self.get(self.driver, 'transport:driver_dashboard')
+        self.get(self.driver, 'transport:attendance', self.route.pk)
+
+    def test_over_budget(self):
+        self.client.force_login(self.admin)
+        with override_settings(QUERY_BUDGETS={'admin_dashboard': 1}):
+            with self.assertRaises(QueryBudgetExceeded):
+                self.client.get(reverse('admin_dashboard'))
+            with override_settings(QUERY_BUDGET_RAISE=False), self.assertLogs('core.middleware', 'WARNING'):
+                self.client.get(reverse('admin_dashboard'))
+
+
+class OutboxTests(TestCase):
+    def test_sent_bodies_are_cleared(self):
+        email = queue_mail('Credentials', 'Password: s3cret', None, ['student@example.com'])
+        self.client.force_login(User.objects.create_superuser('admin', password='x', role=User.Role.ADMIN))
+        page = self.client.get(reverse('admin:core_outboundemail_change', args=[email.pk]))
+        self.assertContains(page, 'student@example.com')
+        self.assertNotContains(page, 's3cret')
+
+        self.assertEqual(deliver(claim_batch(10)), (1, 0))
+        self.assertEqual(mail.outbox[0].body, 'Password: s3cret')
+        email.refresh_from_db()
+        self.assertEqual((email.status, email.body), (OutboundEmail.Status.SENT, ''))
+
+
+class ProfilingTemplateTests(TestCase):
+    def test_wrapped_template_attributes(self):
+        template = loader.get_template('core/access_denied.html')
+        self.assertIsInstance(template.template, EngineTemplate)
+        self.assertEqual(template.origin.template_name, 'core/access_denied.html')
+        self.assertIs(template.origin, template.template.origin)
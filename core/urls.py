@@ -17,4 +17,6 @@ urlpatterns = [
     path('logout/', views.logout_view, name='logout'),
     path('profile/', views.profile_router, name='profile_router'),
     path('admin-profile/', views.admin_profile, name='admin_profile'),
+    path('admin-performance/', views.performance_profile, name='performance_profile'),
+    path('admin-performance/data/', views.performance_profile_api, name='performance_profile_api'),
 ]
@@ -0,0 +1,30 @@
+import datetime
+
+from django.conf import settings
+from django.db.models import QuerySet
+from django.utils import timezone
+
+
+def academic_year_for(date=None):
+    """Label of the academic year containing ``date`` (default today), e.g. ``'2025-2026'``."""
+    date = date or timezone.localdate()
+    start = date.year if date.month >= settings.ACADEMIC_YEAR_START_MONTH else date.year - 1
+    return f"{start}-{start + 1}"
+
+
+def academic_year_bounds(label):
+    """``(first_day, last_day)`` of an academic year label such as ``'2025-2026'``."""
+    start_year = int(label.split('-')[0])
+    first_day = datetime.date(start_year, settings.ACADEMIC_YEAR_START_MONTH, 1)
+    next_first_day = datetime.date(start_year + 1, settings.ACADEMIC_YEAR_START_MONTH, 1)
+    return first_day, next_first_day - datetime.timedelta(days=1)
+
+
+def cascades_from(origin, *models):
+    """
+    Whether a delete that started at ``origin`` (the ``origin`` argument of
+    pre_delete/post_delete: an instance or a queryset) deletes one of
+    ``models``, i.e. whether the row being handled is going away with it.
+    """
+    model = origin.model if isinstance(origin, QuerySet) else type(origin)
+    return issubclass(model, models)
@@ -1,15 +1,12 @@
 from django.shortcuts import render, redirect
 from django.contrib.auth import logout
 from django.contrib.auth.decorators import login_required, user_passes_test
-from django.db.models import Sum, Count
-from students.models import Student
-from staff.models import Staff
-from finance.models import Payment, Invoice
-from academics.models import Class, Subject, Exam, Attendance
-from transport.models import Vehicle, Route
+from django.http import JsonResponse
+from .dashboard import get_dashboard_stats
+from .mail import queue_mail
+from .profiling import profile_summary, recent_samples
 from .models import User, Announcement
 import random
-from django.core.mail import send_mail
 from django.conf import settings
 from django.contrib import messages
 
@@ -41,34 +38,13 @@ def dashboard_router(request):
 @login_required
 @user_passes_test(is_admin)
 def admin_dashboard(request):
-    # Academics
-    total_students = Student.objects.count()
-    total_classes = Class.objects.count()
-    total_subjects = Subject.objects.count()
-    
-    # Staff
-    total_staff = Staff.objects.count()
-    
-    # Finance
-    total_revenue = Payment.objects.aggregate(Sum('amount_paid'))['amount_paid__sum'] or 0
-    pending_invoices = Invoice.objects.filter(is_paid=False).count()
-    
-    # Transport
-    total_vehicles = Vehicle.objects.count()
-    total_routes = Route.objects.count()
+    stats = get_dashboard_stats()
     
     # Announcements
     recent_announcements = Announcement.objects.all().order_by('-date_posted')[:5]
 
     context = {
-        'total_students': total_students,
-        'total_classes': total_classes,
-        'total_subjects': total_subjects,
-        'total_staff': total_staff,
-        'total_revenue': total_revenue,
-        'pending_invoices': pending_invoices,
-        'total_vehicles': total_vehicles,
-        'total_routes': total_routes,
+        **stats,
         'recent_announcements': recent_announcements,
     }
     return render(request, 'core/admin_dashboard.html', context)
@@ -92,7 +68,7 @@ def forgot_password(request):
             email_from = settings.EMAIL_HOST_USER
             recipient_list = [email]
             
-            send_mail(subject, message, email_from, recipient_list)
+            queue_mail(subject, message, email_from, recipient_list)
             # Mask email for privacy
             masked_email = email[0:2] + "****" + email[email.find('@'):]
             messages.success(request, f'OTP sent to your registered email ({masked_email}).')
@@ -171,15 +147,28 @@ def profile_router(request):
 @user_passes_test(is_admin)
 def admin_profile(request):
     """Admin profile page with account info and system stats."""
-    total_students = Student.objects.count()
-    total_staff = Staff.objects.count()
-    total_users = User.objects.count()
-    total_vehicles = Vehicle.objects.count()
+    stats = get_dashboard_stats()
 
     context = {
-        'total_students': total_students,
-        'total_staff': total_staff,
-        'total_users': total_users,
-        'total_vehicles': total_vehicles,
+        'total_students': stats['total_students'],
+        'total_staff': stats['total_staff'],
+        'total_users': stats['total_users'],
+        'total_vehicles': stats['total_vehicles'],
     }
     return render(request, 'core/admin_profile.html', context)
+
+
+@login_required
+@user_passes_test(is_admin)
+def performance_profile(request):
+    """Per-view query counts and latency recorded by ProfilingMiddleware."""
+    return render(request, 'core/performance_profile.html', {'rows': profile_summary()})
+
+
+@login_required
+@user_passes_test(is_admin)
+def performance_profile_api(request):
+    url_name = request.GET.get('url_name')
+    if url_name:
+        return JsonResponse({'url_name': url_name, 'samples': recent_samples(url_name)})
+    return JsonResponse({'views': profile_summary()})
@@ -1,19 +1,105 @@
-from django.contrib import admin
-from .models import FeeStructure, Payment, Invoice
+import uuid
+
+from django.contrib import admin, messages
+from django.http import HttpResponseRedirect
+from .models import FeeStructure, Payment, Invoice, FeeLedger, LedgerEntry, PaymentAllocation
+from .payments import PaymentError, record_payment
 
 @admin.register(FeeStructure)
 class FeeStructureAdmin(admin.ModelAdmin):
     list_display = ('class_level', 'academic_year', 'tuition_fee', 'other_fees')
     list_filter = ('academic_year', 'class_level')
+    actions = ['generate_invoices']
+
+    @admin.action(description="Generate invoices for the students of these classes")
+    def generate_invoices(self, request, queryset):
+        from .invoicing import generate_invoices
+
+        for year in sorted(set(queryset.values_list('academic_year', flat=True))):
+            class_ids = queryset.filter(academic_year=year).values_list('class_level_id', flat=True)
+            totals = generate_invoices(year, class_ids=list(class_ids))
+            self.message_user(
+                request,
+                f"{year}: issued {totals['created']} invoices totalling {totals['amount']}, "
+                f"{totals['skipped']} students already invoiced.",
+                messages.SUCCESS,
+            )
 
 @admin.register(Invoice)
 class InvoiceAdmin(admin.ModelAdmin):
     list_display = ('invoice_number', 'student', 'amount_due', 'due_date', 'is_paid')
-    list_filter = ('is_paid', 'due_date')
+    list_filter = ('is_paid', 'due_date', 'last_dunning_bucket')
     search_fields = ('invoice_number', 'student__user__username')
 
+class PaymentAllocationInline(admin.TabularInline):
+    model = PaymentAllocation
+    fields = ('invoice', 'amount')
+    readonly_fields = fields
+    extra = 0
+    can_delete = False
+
+    def has_add_permission(self, request, obj=None):
+        return False
+
+
 @admin.register(Payment)
 class PaymentAdmin(admin.ModelAdmin):
     list_display = ('student', 'amount_paid', 'payment_method', 'payment_date', 'transaction_id')
-    search_fields = ('student__admission_number', 'transaction_id')
+    search_fields = ('student__admission_number', 'transaction_id', 'idempotency_key')
     list_filter = ('payment_date', 'payment_method')
+    readonly_fields = ('idempotency_key',)
+    inlines = [PaymentAllocationInline]
+
+    def get_readonly_fields(self, request, obj=None):
+        # Allocations are written once, when the payment is recorded.
+        if obj is not None:
+            return self.readonly_fields + ('student', 'invoice', 'amount_paid')
+        return self.readonly_fields
+
+    def save_model(self, request, obj, form, change):
+        # New payments are allocated like online ones: to the chosen invoice
+        # first, then over the student's other open invoices.
+        if change:
+            return super().save_model(request, obj, form, change)
+        try:
+            payment, _created = record_payment(obj.student_id, obj.amount_paid, uuid.uuid4().hex,
+                                               method=obj.payment_method, transaction_id=obj.transaction_id or None,
+                                               remarks=obj.remarks, invoice_id=obj.invoice_id)
+        except PaymentError as e:
+            request.payment_error = True
+            messages.error(request, str(e))
+            return
+        obj.pk = payment.pk
+
+    def log_addition(self, request, obj, message):
+        if not getattr(request, 'payment_error', False):
+            return super().log_addition(request, obj, message)
+
+    def response_add(self, request, obj, post_url_continue=None):
+        if getattr(request, 'payment_error', False):
+            return HttpResponseRedirect(request.path)
+        return super().response_add(request, obj, post_url_continue)
+
+
+class LedgerEntryInline(admin.TabularInline):
+    model = LedgerEntry
+    fields = ('date', 'kind', 'description', 'amount', 'balance_after')
+    readonly_fields = fields
+    extra = 0
+    can_delete = False
+
+    def has_add_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(FeeLedger)
+class FeeLedgerAdmin(admin.ModelAdmin):
+    list_display = ('student', 'academic_year', 'total_charged', 'total_paid', 'balance', 'updated_at')
+    list_filter = ('academic_year',)
+    list_select_related = ('student__user',)
+    search_fields = ('student__user__username', 'student__admission_number')
+    readonly_fields = ('student', 'academic_year', 'total_charged', 'total_paid', 'balance', 'updated_at')
+    inlines = [LedgerEntryInline]
+
+    def has_add_permission(self, request):
+        return False
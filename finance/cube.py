@@ -0,0 +1,206 @@
+"""
+Fee-collection cube.
+
+CollectionCell holds invoiced ("due") and collected amounts per class,
+academic year, calendar month and payment method, so finance reports
+aggregate a few hundred cells instead of scanning Payment and Invoice.
+
+Cells are rebuilt a month at a time from two grouped queries, one over the
+invoices due in the month and one over the payments made in it. The class
+and academic year of an invoice come from its fee structure, falling back
+to the student's current class and the year it was issued; a payment is
+counted under the year its ledger credits it to (see finance.ledger). Writes
+mark their months stale (mark_stale, called from finance.signals and the
+bulk writers) and reads refresh the stale months first, so the cube is
+refreshed incrementally and is never behind the tables it summarises.
+"""
+import datetime
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Count, F, Min, Max, Sum
+from django.db.models.functions import TruncMonth
+from django.utils import timezone
+
+from core.utils import academic_year_for
+from .models import CollectionCell, CollectionMonth, Invoice, Payment
+
+DIMENSIONS = ('class', 'academic_year', 'month', 'payment_method')
+DIMENSION_FIELDS = {
+    'class': 'class_level_id',
+    'academic_year': 'academic_year',
+    'month': 'month',
+    'payment_method': 'payment_method',
+}
+ZERO = Decimal('0.00')
+
+
+def _decimal(value):
+    # SQLite hands SUM() of a decimal column back as a float or an integer.
+    return Decimal(str(value or 0)).quantize(ZERO)
+
+
+def month_start(date):
+    return date.replace(day=1)
+
+
+def _next_month(month):
+    return (month + datetime.timedelta(days=32)).replace(day=1)
+
+
+def mark_stale(dates):
+    """Flag the months containing ``dates`` for refresh."""
+    months = {month_start(date) for date in dates if date}
+    if months:
+        CollectionMonth.objects.bulk_create([CollectionMonth(month=month, is_stale=True) for month in months],
+                                            update_conflicts=True, unique_fields=['month'], update_fields=['is_stale'])
+
+
+def _cells(months):
+    """Compute the cells of ``months`` (first days) from the Invoice and Payment tables."""
+    first, last = min(months), _next_month(max(months)) - datetime.timedelta(days=1)
+    cells = defaultdict(lambda: {'due': ZERO, 'invoices': 0, 'collected': ZERO, 'payments': 0})
+
+    due = (Invoice.objects.filter(due_date__range=(first, last))
+           .values(period=TruncMonth('due_date'), issued=TruncMonth('date_issued'),
+                   structure_class=F('fee_structure__class_level_id'), student_class=F('student__current_class_id'),
+                   structure_year=F('fee_structure__academic_year'))
+           .annotate(total=Sum('amount_due'), n=Count('id')).order_by())
+    for row in due:
+        if row['period'] not in months:
+            continue
+        year = row['structure_year'] or academic_year_for(row['issued'])
+        cell = cells[(row['structure_class'] or row['student_class'], year, row['period'], '')]
+        cell['due'] += _decimal(row['total'])
+        cell['invoices'] += row['n']
+
+    collected = (Payment.objects.filter(payment_date__range=(first, last))
+                 .values('payment_method', period=TruncMonth('payment_date'),
+                         invoice_issued=TruncMonth('invoice__date_issued'),
+                         structure_class=F('invoice__fee_structure__class_level_id'),
+                         student_class=F('student__current_class_id'),
+                         structure_year=F('invoice__fee_structure__academic_year'))
+                 .annotate(total=Sum('amount_paid'), n=Count('id')).order_by())
+    for row in collected:
+        if row['period'] not in months:
+            continue
+        year = row['structure_year'] or academic_year_for(row['invoice_issued'] or row['period'])
+        cell = cells[(row['structure_class'] or row['student_class'], year, row['period'], row['payment_method'])]
+        cell['collected'] += _decimal(row['total'])
+        cell['payments'] += row['n']
+    return cells
+
+
+def refresh(months=None):
+    """
+    Rebuild the cells of ``months`` (dates; default: every stale month) and
+    mark them fresh. Returns the number of months refreshed.
+    """
+    if months is None:
+        months = set(CollectionMonth.objects.filter(is_stale=True).values_list('month', flat=True))
+    months = {month_start(month) for month in months}
+    if not months:
+        return 0
+    # Stamp before computing: a write landing meanwhile marks its month stale again.
+    started = timezone.now()
+    CollectionMonth.objects.filter(month__in=months).update(is_stale=False, refreshed_at=started)
+    cells = _cells(months)
+    with transaction.atomic():
+        CollectionCell.objects.filter(month__in=months).delete()
+        CollectionCell.objects.bulk_create([
+            CollectionCell(class_level_id=class_id, academic_year=year, month=month, payment_method=method, **values)
+            for (class_id, year, month, method), values in cells.items()
+        ], batch_size=1000)
+        CollectionMonth.objects.bulk_create(
+            [CollectionMonth(month=month, is_stale=False, refreshed_at=started) for month in months],
+            ignore_conflicts=True)
+    return len(months)
+
+
+def rebuild():
+    """Recompute the whole cube from the first invoice or payment onwards. Returns months refreshed."""
+    bounds = [
+        Invoice.objects.aggregate(first=Min('due_date'), last=Max('due_date')),
+        Payment.objects.aggregate(first=Min('payment_date'), last=Max('payment_date')),
+    ]
+    firsts = [bound['first'] for bound in bounds if bound['first']]
+    if not firsts:
+        CollectionCell.objects.all().delete()
+        return 0
+    month, last = month_start(min(firsts)), month_start(max(bound['last'] for bound in bounds if bound['last']))
+    months = []
+    while month <= last:
+        months.append(month)
+        month = _next_month(month)
+    CollectionCell.objects.exclude(month__in=months).delete()
+    refreshed = 0
+    for start in range(0, len(months), 12):
+        refreshed += refresh(months[start:start + 12])
+    return refreshed
+
+
+def collection_summary(group_by=('class', 'academic_year'), academic_year=None, class_id=None,
+                       month_from=None, month_to=None, payment_method=None):
+    """
+    Due, collected and outstanding totals grouped by any of DIMENSIONS,
+    after refreshing stale months. Outstanding is left out when grouping or
+    filtering by payment method, since invoiced amounts have none.
+    """
+    refresh()
+    fields = [DIMENSION_FIELDS[dimension] for dimension in group_by]
+    cells = CollectionCell.objects.all()
+    if academic_year:
+        cells = cells.filter(academic_year=academic_year)
+    if class_id:
+        cells = cells.filter(class_level_id=class_id)
+    if month_from:
+        cells = cells.filter(month__gte=month_start(month_from))
+    if month_to:
+        cells = cells.filter(month__lte=month_start(month_to))
+    if payment_method:
+        cells = cells.filter(payment_method=payment_method)
+    rows = (cells.values(*fields)
+            .annotate(due=Sum('due'), invoices=Sum('invoices'), collected=Sum('collected'), payments=Sum('payments'))
+            .order_by(*fields))
+
+    by_method = 'payment_method' in group_by or payment_method
+    results = []
+    for row in rows:
+        result = {dimension: row[DIMENSION_FIELDS[dimension]] for dimension in group_by}
+        due, collected = _decimal(row['due']), _decimal(row['collected'])
+        result.update(due=due, invoices=row['invoices'], collected=collected, payments=row['payments'])
+        if not by_method:
+            result['outstanding'] = due - collected
+        results.append(result)
+    return results
+
+
+def month_end_report(month):
+    """
+    Month-end figures per class for the academic year containing ``month``:
+    due and collected in the month and year to date, with collections of the
+    month split by payment method.
+    """
+    month = month_start(month)
+    year = academic_year_for(month)
+    in_month = {row['class']: row for row in collection_summary(('class',), academic_year=year,
+                                                                 month_from=month, month_to=month)}
+    to_date = collection_summary(('class',), academic_year=year, month_to=month)
+    methods = defaultdict(dict)
+    for row in collection_summary(('class', 'payment_method'), academic_year=year, month_from=month, month_to=month):
+        if row['payment_method']:
+            methods[row['class']][row['payment_method']] = row['collected']
+    report = []
+    for row in to_date:
+        month_row = in_month.get(row['class'], {})
+        report.append({
+            'class': row['class'],
+            'due_in_month': month_row.get('due', ZERO),
+            'collected_in_month': month_row.get('collected', ZERO),
+            'due_to_date': row['due'],
+            'collected_to_date': row['collected'],
+            'outstanding': row['outstanding'],
+            'collected_by_method': methods.get(row['class'], {}),
+        })
+    return {'academic_year': year, 'month': month, 'classes': report}
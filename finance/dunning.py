@@ -0,0 +1,138 @@
+"""
+Dunning: reminders about overdue invoices.
+
+A run finds the unpaid invoices past their due date with one query on the
+(is_paid, due_date) index and sorts each into an aging bucket by days
+overdue (DUNNING_BUCKETS, e.g. 0/30/60/90). An invoice is reminded about
+once per bucket: ``Invoice.last_dunning_bucket`` records the last bucket
+sent, so running the job daily only notifies invoices that have just moved
+into a later bucket.
+
+Reminders are grouped per recipient. A student hears about their own
+invoices and a parent gets one message covering all of their children;
+the students of a run are loaded in chunks with their users and parents
+prefetched, so the number of queries does not grow with the number of
+students. Each recipient gets a core.Notification and, if they have an
+email address, a queued email (core.mail), all written in bulk.
+"""
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Prefetch, Sum
+from django.utils import timezone
+
+from core.mail import queue_mass_mail
+from core.models import Notification
+from students.models import Parent, Student
+from .models import Invoice, PaymentAllocation
+
+
+def aging_bucket(days_overdue, buckets=None):
+    """The largest bucket threshold ``days_overdue`` has reached, or None if not overdue."""
+    if days_overdue <= 0:
+        return None
+    reached = [bucket for bucket in (buckets or settings.DUNNING_BUCKETS) if days_overdue >= bucket]
+    return max(reached) if reached else None
+
+
+def bucket_label(bucket):
+    return f"{bucket}+ days overdue" if bucket else "Overdue"
+
+
+def overdue_invoices(as_of=None):
+    """
+    Unpaid invoices due before ``as_of`` (default: today) as dicts with
+    ``outstanding``, ``days_overdue`` and ``bucket`` set.
+    """
+    as_of = as_of or timezone.localdate()
+    overdue = Invoice.objects.filter(is_paid=False, due_date__lt=as_of)
+    invoices = list(overdue.values('pk', 'student_id', 'invoice_number', 'due_date', 'amount_due',
+                                   'last_dunning_bucket').order_by('student_id', 'due_date', 'pk'))
+    allocated = dict(PaymentAllocation.objects.filter(invoice__is_paid=False, invoice__due_date__lt=as_of)
+                     .values('invoice_id').annotate(total=Sum('amount')).order_by()
+                     .values_list('invoice_id', 'total'))
+    for invoice in invoices:
+        invoice['outstanding'] = invoice['amount_due'] - allocated.get(invoice['pk'], 0)
+        invoice['days_overdue'] = (as_of - invoice['due_date']).days
+        invoice['bucket'] = aging_bucket(invoice['days_overdue'])
+    return [invoice for invoice in invoices if invoice['outstanding'] > 0 and invoice['bucket'] is not None]
+
+
+def _students(student_ids, chunk_size):
+    user_fields = ['user__username', 'user__first_name', 'user__last_name', 'user__email']
+    parents = Prefetch('parents', queryset=Parent.objects.select_related('user').only(*user_fields))
+    for start in range(0, len(student_ids), chunk_size):
+        yield from (Student.objects.filter(pk__in=student_ids[start:start + chunk_size])
+                    .select_related('user').only('admission_number', *user_fields).prefetch_related(parents))
+
+
+def _message(user, children):
+    """Notification title and body for ``user`` about ``children``: [(student, invoices)]."""
+    worst = max(invoice['bucket'] for _student, invoices in children for invoice in invoices)
+    total = sum(invoice['outstanding'] for _student, invoices in children for invoice in invoices)
+    lines = []
+    for student, invoices in children:
+        for invoice in invoices:
+            lines.append(f"- {invoice['invoice_number']} ({student.user.get_full_name() or student.admission_number}): "
+                         f"${invoice['outstanding']} due {invoice['due_date']:%d %b %Y}, "
+                         f"{invoice['days_overdue']} days overdue")
+    title = f"Overdue fees ({bucket_label(worst)}): ${total}"
+    message = (f"Dear {user.first_name or user.username},\n\n"
+               f"The following fees are past their due date:\n\n" + "\n".join(lines) +
+               f"\n\nTotal outstanding: ${total}\n\n"
+               f"Please pay online from the Fees page of the portal or at the school office. "
+               f"If you have already paid, please ignore this reminder.\n\n"
+               f"Best Regards,\nSchool Administration")
+    return title, message
+
+
+def send_dunning_notices(as_of=None, dry_run=False, chunk_size=500):
+    """
+    Notify students and parents about invoices that have entered a new aging
+    bucket. Returns ``{'overdue', 'invoices', 'students', 'notifications',
+    'emails', 'amount', 'buckets', 'elapsed'}``, where ``invoices`` counts the
+    invoices reminded about in this run and ``buckets`` maps each bucket to that count.
+    """
+    started = time.perf_counter()
+    overdue = overdue_invoices(as_of)
+    due = defaultdict(list)
+    for invoice in overdue:
+        if invoice['last_dunning_bucket'] is None or invoice['bucket'] > invoice['last_dunning_bucket']:
+            due[invoice['student_id']].append(invoice)
+
+    recipients = {}
+    for student in _students(sorted(due), chunk_size):
+        for user in [student.user] + [parent.user for parent in student.parents.all()]:
+            recipients.setdefault(user.pk, (user, []))[1].append((student, due[student.pk]))
+
+    notifications, emails = [], []
+    for user, children in recipients.values():
+        title, message = _message(user, children)
+        notifications.append(Notification(recipient=user, title=title, message=message))
+        if user.email:
+            emails.append((title, message, None, [user.email]))
+
+    reminded = [invoice for invoices in due.values() for invoice in invoices]
+    by_bucket = defaultdict(list)
+    for invoice in reminded:
+        by_bucket[invoice['bucket']].append(invoice['pk'])
+    if not dry_run and reminded:
+        with transaction.atomic():
+            Notification.objects.bulk_create(notifications, batch_size=1000)
+            queue_mass_mail(emails)
+            for bucket, invoice_ids in by_bucket.items():
+                for start in range(0, len(invoice_ids), 1000):
+                    Invoice.objects.filter(pk__in=invoice_ids[start:start + 1000]).update(last_dunning_bucket=bucket)
+
+    return {
+        'overdue': len(overdue),
+        'invoices': len(reminded),
+        'students': len(due),
+        'notifications': len(notifications),
+        'emails': len(emails),
+        'amount': sum(invoice['outstanding'] for invoice in reminded),
+        'buckets': {bucket: len(by_bucket[bucket]) for bucket in sorted(by_bucket)},
+        'elapsed': time.perf_counter() - started,
+    }
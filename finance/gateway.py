@@ -0,0 +1,55 @@
+"""
+Card payment gateways.
+
+PAYMENT_GATEWAY names the class to use. A gateway charges a card once per
+idempotency key: charging again with the same key returns the original
+result instead of taking the money twice, which is what lets
+finance.views.process_payment be retried safely.
+"""
+import hashlib
+import threading
+from dataclasses import dataclass
+from decimal import Decimal
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+
+@dataclass(frozen=True)
+class GatewayResult:
+    approved: bool
+    reference: str
+    message: str = ''
+
+
+class SimulatedGateway:
+    """
+    Local stand-in for a card processor. Approves every card except the
+    decline test number, and returns a reference derived from the
+    idempotency key so that retries see the same charge.
+    """
+    DECLINED_CARDS = {'4000000000000002'}
+
+    _charges = {}
+    _lock = threading.Lock()
+
+    def charge(self, amount, card_number, idempotency_key, description=''):
+        card_number = ''.join(ch for ch in str(card_number) if ch.isdigit())
+        with self._lock:
+            if idempotency_key in self._charges:
+                return self._charges[idempotency_key]
+            reference = 'SIM' + hashlib.sha256(idempotency_key.encode()).hexdigest()[:13].upper()
+            if len(card_number) < 12:
+                result = GatewayResult(False, reference, "Invalid card number.")
+            elif card_number in self.DECLINED_CARDS:
+                result = GatewayResult(False, reference, "Card declined.")
+            elif Decimal(amount) <= 0:
+                result = GatewayResult(False, reference, "Amount must be positive.")
+            else:
+                result = GatewayResult(True, reference, "Approved.")
+            self._charges[idempotency_key] = result
+            return result
+
+
+def get_gateway():
+    return import_string(settings.PAYMENT_GATEWAY)()
@@ -0,0 +1,87 @@
+"""
+Invoice runs: one invoice per student for an academic year's fee structure.
+
+A run walks the classes that have a fee structure for the year, skips the
+students already invoiced against that year's fees, and writes the rest
+with bulk_create in batches. Invoice numbers are derived from the year and
+the student (``INV-2026-000123``), so re-running a run, even one that was
+interrupted halfway, never issues a second invoice to the same student.
+"""
+import datetime
+import time
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from core.dashboard import invalidate_dashboard_stats
+from core.utils import academic_year_for
+from students.models import Student
+from students.summary import FEES, PAYMENTS, refresh_summaries
+from .cube import mark_stale
+from .ledger import sync_charges
+from .models import FeeStructure, Invoice
+
+
+def invoice_number(academic_year, student_id):
+    """Deterministic invoice number for a student's fees in ``academic_year``."""
+    return f"INV-{academic_year[:4]}-{student_id:06d}"
+
+
+def structures_for(academic_year, class_ids=None):
+    """``{class_id: FeeStructure}`` for the year, the first structure of each class if there are several."""
+    structures = {}
+    queryset = FeeStructure.objects.filter(academic_year=academic_year).order_by('pk')
+    if class_ids:
+        queryset = queryset.filter(class_level_id__in=class_ids)
+    for structure in queryset:
+        structures.setdefault(structure.class_level_id, structure)
+    return structures
+
+
+def generate_invoices(academic_year=None, class_ids=None, due_date=None, batch_size=1000,
+                      dry_run=False, progress=None):
+    """
+    Invoice every student of the classes with a fee structure for
+    ``academic_year`` (default: the current one), optionally limited to
+    ``class_ids``. ``progress``, if given, is called with the running totals
+    after each batch. Returns ``{'students', 'created', 'skipped', 'amount', 'elapsed'}``.
+    """
+    started = time.perf_counter()
+    year = academic_year or academic_year_for()
+    due_date = due_date or timezone.localdate() + datetime.timedelta(days=settings.INVOICE_DUE_DAYS)
+    structures = structures_for(year, class_ids)
+    students = list(Student.objects.filter(current_class_id__in=structures)
+                    .order_by('pk').values_list('pk', 'current_class_id'))
+    totals = {'students': len(students), 'created': 0, 'skipped': 0, 'amount': 0}
+
+    for start in range(0, len(students), batch_size):
+        batch = students[start:start + batch_size]
+        batch_ids = [student_id for student_id, _class_id in batch]
+        invoiced = set(Invoice.objects.filter(Q(student_id__in=batch_ids, fee_structure__academic_year=year) |
+                                              Q(invoice_number__in=[invoice_number(year, pk) for pk in batch_ids]))
+                       .values_list('student_id', flat=True))
+        invoices = [
+            Invoice(student_id=student_id, fee_structure=structures[class_id], due_date=due_date,
+                    amount_due=structures[class_id].total_fee(), invoice_number=invoice_number(year, student_id))
+            for student_id, class_id in batch if student_id not in invoiced
+        ]
+        if not dry_run and invoices:
+            with transaction.atomic():
+                Invoice.objects.bulk_create(invoices)
+                # bulk_create skips the signals, so make sure the fee charges the
+                # invoices bill for are on the ledgers.
+                sync_charges([invoice.student_id for invoice in invoices], year)
+            refresh_summaries([invoice.student_id for invoice in invoices], parts=(PAYMENTS, FEES))
+        totals['created'] += len(invoices)
+        totals['skipped'] += len(batch) - len(invoices)
+        totals['amount'] += sum(invoice.amount_due for invoice in invoices)
+        if progress:
+            progress(dict(totals, processed=start + len(batch)))
+
+    if totals['created'] and not dry_run:
+        invalidate_dashboard_stats()
+        mark_stale([due_date])
+    totals['elapsed'] = time.perf_counter() - started
+    return totals
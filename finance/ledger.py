@@ -0,0 +1,329 @@
+"""
+Per-student fee ledgers with running balances.
+
+Each (student, academic year) has one FeeLedger holding the year's totals
+and balance, and LedgerEntry rows whose ``balance_after`` is the running
+balance, so reading what a student owes is a single indexed lookup.
+
+Charges are posted rather than derived: sync_charges brings the charges
+linked to each fee structure and stand-alone invoice up to their current
+amount by posting the difference, so a fee revision or a class change
+appears as an adjustment instead of rewriting the year. The current year
+follows each student's class; earlier years follow the fee structures the
+students were invoiced against, and sync_all_charges covers every year.
+Payment entries mirror the Payment table one to one. post_payment appends them as payments
+are made, inside the payment's transaction; rebuild_payments recreates them
+from the raw rows, which is also how reconcile repairs a ledger.
+"""
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Q, Sum
+from django.utils import timezone
+
+from core.utils import academic_year_bounds, academic_year_for
+from students.models import Student
+from .models import FeeLedger, FeeStructure, Invoice, LedgerEntry, Payment
+
+CHARGE = LedgerEntry.Kind.CHARGE
+PAYMENT = LedgerEntry.Kind.PAYMENT
+ZERO = Decimal('0.00')
+LEDGER_FIELDS = ['total_charged', 'total_paid', 'balance', 'updated_at']
+
+
+def payment_year(payment):
+    """Academic year a payment is credited to: its invoice's fee year, else the year it was made in."""
+    invoice = payment.invoice
+    if invoice is not None:
+        if invoice.fee_structure is not None:
+            return invoice.fee_structure.academic_year
+        return academic_year_for(invoice.date_issued)
+    return academic_year_for(payment.payment_date)
+
+
+def _payment_description(payment):
+    if payment.transaction_id:
+        return f"Payment {payment.transaction_id} ({payment.payment_method})"
+    return f"Payment ({payment.payment_method})"
+
+
+def _locked_ledgers(keys):
+    """FeeLedger rows for ``(student_id, academic_year)`` keys, locked for update and created as needed."""
+    keys = set(keys)
+    if not keys:
+        return {}
+
+    def fetch():
+        rows = FeeLedger.objects.select_for_update().filter(student_id__in={key[0] for key in keys},
+                                                            academic_year__in={key[1] for key in keys})
+        return {(row.student_id, row.academic_year): row for row in rows
+                if (row.student_id, row.academic_year) in keys}
+
+    ledgers = fetch()
+    missing = keys - set(ledgers)
+    if missing:
+        FeeLedger.objects.bulk_create([FeeLedger(student_id=student_id, academic_year=year)
+                                       for student_id, year in missing], ignore_conflicts=True)
+        ledgers = fetch()
+    return ledgers
+
+
+def _post(ledger, kind, amount, date, description, **links):
+    """Apply an entry to ``ledger``'s totals in memory and return the unsaved LedgerEntry."""
+    amount = Decimal(str(amount))
+    if kind == CHARGE:
+        ledger.total_charged += amount
+    else:
+        ledger.total_paid += amount
+    ledger.balance = ledger.total_charged - ledger.total_paid
+    # bulk_update() skips auto_now, so stamp the row ourselves.
+    ledger.updated_at = timezone.now()
+    return LedgerEntry(ledger=ledger, kind=kind, amount=amount, date=date, description=description,
+                       balance_after=ledger.balance, **links)
+
+
+def post_payment(payment):
+    """Credit a newly recorded payment to its ledger. Returns the ledger."""
+    key = (payment.student_id, payment_year(payment))
+    with transaction.atomic():
+        ledger = _locked_ledgers([key])[key]
+        _post(ledger, PAYMENT, payment.amount_paid, payment.payment_date,
+              _payment_description(payment), payment=payment).save()
+        ledger.save(update_fields=LEDGER_FIELDS)
+    return ledger
+
+
+def _year_structures(student_ids, year, exclude):
+    """
+    ``{student_id: FeeStructure}`` each student owes for ``year``. This year
+    that is their current class's structure; for other years the class they
+    were in is unknown, so it is the structure they were invoiced against.
+    """
+    if year != academic_year_for():
+        billed = {}
+        for invoice in (Invoice.objects.filter(student_id__in=student_ids, fee_structure__academic_year=year)
+                        .select_related('fee_structure__class_level').order_by('pk')):
+            if ('fee_structure', invoice.fee_structure_id) not in exclude:
+                billed.setdefault(invoice.student_id, invoice.fee_structure)
+        return billed
+
+    class_ids = dict(Student.objects.filter(pk__in=student_ids).values_list('pk', 'current_class_id'))
+    structures = {}
+    for structure in (FeeStructure.objects.filter(class_level_id__in={c for c in class_ids.values() if c},
+                                                  academic_year=year)
+                      .select_related('class_level').order_by('pk')):
+        if ('fee_structure', structure.pk) not in exclude:
+            structures.setdefault(structure.class_level_id, structure)
+    return {student_id: structures[class_id] for student_id, class_id in class_ids.items() if class_id in structures}
+
+
+def _charge_targets(student_ids, year, exclude):
+    """What each student should have been charged for ``year``: ``{student_id: {link: (amount, description)}}``."""
+    targets = {student_id: {} for student_id in
+               Student.objects.filter(pk__in=student_ids).values_list('pk', flat=True)}
+    for student_id, structure in _year_structures(student_ids, year, exclude).items():
+        targets[student_id][('fee_structure', structure.pk)] = (
+            structure.total_fee(), f"Fees {year}, {structure.class_level}")
+    first_day, last_day = academic_year_bounds(year)
+    invoices = Invoice.objects.filter(student_id__in=student_ids, fee_structure__isnull=True,
+                                      date_issued__range=(first_day, last_day))
+    for invoice in invoices:
+        if ('invoice', invoice.pk) not in exclude:
+            targets[invoice.student_id][('invoice', invoice.pk)] = (
+                invoice.amount_due, f"Invoice {invoice.invoice_number}")
+    return targets
+
+
+def _posted_charges(student_ids, year):
+    posted = defaultdict(dict)
+    rows = (LedgerEntry.objects.filter(kind=CHARGE, ledger__student_id__in=student_ids, ledger__academic_year=year)
+            .values('ledger__student_id', 'fee_structure_id', 'invoice_id')
+            .annotate(total=Sum('amount')).order_by())
+    for row in rows:
+        if row['fee_structure_id']:
+            link = ('fee_structure', row['fee_structure_id'])
+        elif row['invoice_id']:
+            link = ('invoice', row['invoice_id'])
+        else:
+            continue
+        posted[row['ledger__student_id']][link] = row['total']
+    return posted
+
+
+def sync_charges(student_ids, academic_year=None, exclude=(), batch_size=500):
+    """
+    Post the charges (or adjustments) that bring each student's ``academic_year``
+    (default: the current one) in line with the fee structure they owe (see
+    _year_structures) and their stand-alone invoices. ``exclude`` holds
+    ``('fee_structure', pk)`` or ``('invoice', pk)`` links to treat as gone,
+    for use before a delete.
+    Returns the number of entries posted.
+    """
+    year = academic_year or academic_year_for()
+    exclude = set(exclude)
+    student_ids = sorted(set(student_ids))
+    posted_count = 0
+    for start in range(0, len(student_ids), batch_size):
+        batch = student_ids[start:start + batch_size]
+        with transaction.atomic():
+            # Lock the existing ledgers first so the posted totals cannot move underneath us.
+            ledgers = {ledger.student_id: ledger for ledger in
+                       FeeLedger.objects.select_for_update().filter(student_id__in=batch, academic_year=year)}
+            targets = _charge_targets(batch, year, exclude)
+            posted = _posted_charges(batch, year)
+            changes = []
+            for student_id in batch:
+                student_targets, student_posted = targets.get(student_id, {}), posted.get(student_id, {})
+                for link in sorted(set(student_targets) | set(student_posted)):
+                    amount, description = student_targets.get(link, (ZERO, None))
+                    already = student_posted.get(link, ZERO)
+                    if amount == already:
+                        continue
+                    if description is None:
+                        description = "Reversed charge"
+                    elif already:
+                        description = f"Adjustment: {description}"
+                    changes.append((student_id, link, amount - already, description))
+            if not changes:
+                continue
+            # New ledgers are inserted with their final totals, so only the
+            # existing ones need an UPDATE.
+            new_ledgers = {}
+            for student_id, _link, _difference, _description in changes:
+                if student_id not in ledgers and student_id not in new_ledgers:
+                    new_ledgers[student_id] = FeeLedger(student_id=student_id, academic_year=year,
+                                                        total_charged=ZERO, total_paid=ZERO)
+            today = timezone.localdate()
+            entries = [
+                _post(ledgers.get(student_id) or new_ledgers[student_id], CHARGE, difference, today, description,
+                      **{f"{kind}_id": pk})
+                for student_id, (kind, pk), difference, description in changes
+            ]
+            FeeLedger.objects.bulk_create(new_ledgers.values())
+            LedgerEntry.objects.bulk_create(entries)
+            FeeLedger.objects.bulk_update([ledgers[student_id] for student_id in {change[0] for change in changes}
+                                           if student_id in ledgers], LEDGER_FIELDS, batch_size=100)
+            posted_count += len(entries)
+    return posted_count
+
+
+def charge_years(student_ids):
+    """Every academic year ``student_ids`` have charges or ledgers in, plus the current one."""
+    years = {academic_year_for()}
+    years.update(FeeLedger.objects.filter(student_id__in=student_ids).values_list('academic_year', flat=True))
+    years.update(Invoice.objects.filter(student_id__in=student_ids, fee_structure__isnull=False)
+                 .values_list('fee_structure__academic_year', flat=True))
+    years.update(academic_year_for(date) for date in
+                 Invoice.objects.filter(student_id__in=student_ids, fee_structure__isnull=True)
+                 .values_list('date_issued', flat=True).distinct())
+    return sorted(years)
+
+
+def sync_all_charges(student_ids, batch_size=500):
+    """sync_charges for every academic year in charge_years. Returns the number of entries posted."""
+    student_ids = sorted(set(student_ids))
+    posted = 0
+    for start in range(0, len(student_ids), batch_size):
+        batch = student_ids[start:start + batch_size]
+        for year in charge_years(batch):
+            posted += sync_charges(batch, year, batch_size=batch_size)
+    return posted
+
+
+def _recompute(ledger_ids):
+    """Recompute running balances and totals of ``ledger_ids`` from their entries."""
+    ledgers = {ledger.pk: ledger for ledger in FeeLedger.objects.filter(pk__in=ledger_ids)}
+    for ledger in ledgers.values():
+        ledger.total_charged = ledger.total_paid = ledger.balance = ZERO
+    changed = []
+    for entry in LedgerEntry.objects.filter(ledger_id__in=ledgers).order_by('ledger_id', 'date', 'pk'):
+        ledger = ledgers[entry.ledger_id]
+        expected = _post(ledger, entry.kind, entry.amount, entry.date, entry.description).balance_after
+        if entry.balance_after != expected:
+            entry.balance_after = expected
+            changed.append(entry)
+    LedgerEntry.objects.bulk_update(changed, ['balance_after'], batch_size=1000)
+    FeeLedger.objects.bulk_update(ledgers.values(), LEDGER_FIELDS, batch_size=1000)
+
+
+def rebuild_payments(student_ids):
+    """
+    Recreate the payment entries of ``student_ids`` from the Payment table and
+    recompute their ledgers. Returns the ids of every student whose ledgers
+    were touched, which includes the previous owner of a reassigned payment.
+    """
+    student_ids = set(student_ids)
+    with transaction.atomic():
+        stale = LedgerEntry.objects.filter(Q(ledger__student_id__in=student_ids) | Q(payment__student_id__in=student_ids),
+                                           kind=PAYMENT)
+        student_ids |= set(stale.values_list('ledger__student_id', flat=True))
+        list(FeeLedger.objects.select_for_update().filter(student_id__in=student_ids))
+        LedgerEntry.objects.filter(kind=PAYMENT, ledger__student_id__in=student_ids).delete()
+
+        payments = list(Payment.objects.filter(student_id__in=student_ids)
+                        .select_related('invoice__fee_structure').order_by('payment_date', 'pk'))
+        ledgers = _locked_ledgers({(payment.student_id, payment_year(payment)) for payment in payments})
+        LedgerEntry.objects.bulk_create([
+            LedgerEntry(ledger=ledgers[(payment.student_id, payment_year(payment))], kind=PAYMENT,
+                        amount=payment.amount_paid, date=payment.payment_date,
+                        description=_payment_description(payment), balance_after=ZERO, payment=payment)
+            for payment in payments
+        ], batch_size=1000)
+        _recompute(FeeLedger.objects.filter(student_id__in=student_ids).values_list('pk', flat=True))
+    return student_ids
+
+
+def reconcile(student_ids=None, batch_size=500):
+    """
+    Check every ledger (or those of ``student_ids``) against the Payment table
+    and its own entries. Returns ``[(student_id, academic_year, problem)]``.
+    """
+    if student_ids is None:
+        student_ids = (set(FeeLedger.objects.values_list('student_id', flat=True)) |
+                       set(Payment.objects.values_list('student_id', flat=True)))
+    student_ids = sorted(set(student_ids))
+    problems = []
+    for start in range(0, len(student_ids), batch_size):
+        batch = student_ids[start:start + batch_size]
+        expected = defaultdict(dict)
+        for payment in Payment.objects.filter(student_id__in=batch).select_related('invoice__fee_structure'):
+            expected[(payment.student_id, payment_year(payment))][payment.pk] = payment.amount_paid
+        entries = defaultdict(list)
+        for entry in LedgerEntry.objects.filter(ledger__student_id__in=batch).order_by('ledger_id', 'date', 'pk'):
+            entries[entry.ledger_id].append(entry)
+
+        for ledger in FeeLedger.objects.filter(student_id__in=batch).order_by('student_id', 'academic_year'):
+            key = (ledger.student_id, ledger.academic_year)
+
+            def report(problem):
+                problems.append((ledger.student_id, ledger.academic_year, problem))
+
+            running = FeeLedger(total_charged=ZERO, total_paid=ZERO)
+            credited = {}
+            broken = None
+            for entry in entries.get(ledger.pk, []):
+                if _post(running, entry.kind, entry.amount, entry.date, '').balance_after != entry.balance_after:
+                    broken = broken or entry
+                if entry.kind == PAYMENT:
+                    credited[entry.payment_id] = entry.amount
+            if broken:
+                report(f"running balance breaks at entry #{broken.pk}")
+            if (ledger.total_charged, ledger.total_paid, ledger.balance) != (running.total_charged, running.total_paid,
+                                                                          running.balance):
+                report(f"stored totals {ledger.total_charged}/{ledger.total_paid}/{ledger.balance} "
+                       f"differ from entries {running.total_charged}/{running.total_paid}/{running.balance}")
+
+            raw = expected.pop(key, {})
+            if None in credited:
+                report("payment entries for deleted payments")
+            for payment_id in sorted(set(raw) - set(credited)):
+                report(f"payment #{payment_id} of {raw[payment_id]} is not credited")
+            for payment_id in sorted(set(credited) - set(raw) - {None}):
+                report(f"payment #{payment_id} is credited to the wrong ledger")
+            for payment_id in sorted(set(raw) & set(credited)):
+                if raw[payment_id] != credited[payment_id]:
+                    report(f"payment #{payment_id} is {raw[payment_id]} but credited as {credited[payment_id]}")
+        for (student_id, year), raw in sorted(expected.items()):
+            problems.append((student_id, year, f"{len(raw)} payment(s) without a ledger"))
+    return problems
@@ -0,0 +1,39 @@
+import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.utils import academic_year_for
+from finance.invoicing import generate_invoices
+
+
+class Command(BaseCommand):
+    help = "Issues one invoice per student from their class's fee structure for an academic year"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--year', help='Academic year, e.g. 2026-2027 (default: the current year)')
+        parser.add_argument('--class', dest='class_ids', type=int, nargs='+', help='Only these class ids')
+        parser.add_argument('--due-date', help='YYYY-MM-DD (default: INVOICE_DUE_DAYS from today)')
+        parser.add_argument('--batch-size', type=int, default=1000, help='Invoices written per batch')
+        parser.add_argument('--dry-run', action='store_true', help='Count the invoices without writing them')
+
+    def handle(self, *args, **options):
+        year = options['year'] or academic_year_for()
+        due_date = None
+        if options['due_date']:
+            try:
+                due_date = datetime.date.fromisoformat(options['due_date'])
+            except ValueError:
+                raise CommandError(f"Invalid due date {options['due_date']!r}; use YYYY-MM-DD")
+
+        def progress(totals):
+            self.stdout.write(f"  {totals['processed']}/{totals['students']} students, "
+                              f"{totals['created']} new, {totals['skipped']} already invoiced")
+
+        totals = generate_invoices(year, class_ids=options['class_ids'], due_date=due_date,
+                                   batch_size=options['batch_size'], dry_run=options['dry_run'], progress=progress)
+        if not totals['students']:
+            raise CommandError(f"No students in classes with a fee structure for {year}")
+        verb = 'Would issue' if options['dry_run'] else 'Issued'
+        self.stdout.write(self.style.SUCCESS(
+            f"{verb} {totals['created']} invoices for {year} totalling {totals['amount']} "
+            f"({totals['skipped']} students already invoiced) in {totals['elapsed']:.2f}s"))
@@ -0,0 +1,41 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from finance.ledger import rebuild_payments, reconcile, sync_all_charges
+from students.models import Student
+from students.summary import FEES, PAYMENTS, refresh_summaries
+
+
+class Command(BaseCommand):
+    help = 'Verifies every fee ledger against the Payment table and its own running balances'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--student', type=int, nargs='+', help='Only check these student ids')
+        parser.add_argument('--fix', action='store_true',
+                            help='Rebuild the payment entries and balances of every ledger that fails')
+        parser.add_argument('--sync-charges', action='store_true',
+                            help="First post every academic year's fee charges for every student")
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        if options['sync_charges']:
+            student_ids = options['student'] or list(Student.objects.values_list('pk', flat=True))
+            posted = sync_all_charges(student_ids)
+            refresh_summaries(student_ids, parts=(PAYMENTS, FEES))
+            self.stdout.write(f"Posted {posted} charge entries")
+
+        problems = reconcile(options['student'])
+        for student_id, year, problem in problems:
+            self.stdout.write(f"Student {student_id}, {year}: {problem}")
+
+        if problems and options['fix']:
+            touched = rebuild_payments({student_id for student_id, _year, _problem in problems})
+            refresh_summaries(touched, parts=(PAYMENTS, FEES))
+            problems = reconcile(touched)
+            self.stdout.write(f"Rebuilt the ledgers of {len(touched)} students")
+
+        elapsed = time.perf_counter() - started
+        if problems:
+            raise CommandError(f"{len(problems)} ledger problem(s) found in {elapsed:.2f}s")
+        self.stdout.write(self.style.SUCCESS(f"All ledgers reconcile ({elapsed:.2f}s)"))
@@ -0,0 +1,18 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from finance.cube import rebuild, refresh
+
+
+class Command(BaseCommand):
+    help = 'Refreshes the stale months of the fee-collection cube, or rebuilds it from scratch'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rebuild', action='store_true', help='Recompute every month, not just the stale ones')
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        months = rebuild() if options['rebuild'] else refresh()
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(f"Refreshed {months} month(s) of the collection cube in {elapsed:.2f}s"))
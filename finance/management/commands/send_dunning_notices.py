@@ -0,0 +1,30 @@
+import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+
+from finance.dunning import bucket_label, send_dunning_notices
+
+
+class Command(BaseCommand):
+    help = "Notifies students and parents about overdue invoices that have entered a new aging bucket"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--as-of', help='YYYY-MM-DD to age invoices against (default: today)')
+        parser.add_argument('--dry-run', action='store_true', help='Count the reminders without sending them')
+
+    def handle(self, *args, **options):
+        as_of = None
+        if options['as_of']:
+            try:
+                as_of = datetime.date.fromisoformat(options['as_of'])
+            except ValueError:
+                raise CommandError(f"Invalid date {options['as_of']!r}; use YYYY-MM-DD")
+
+        totals = send_dunning_notices(as_of, dry_run=options['dry_run'])
+        for bucket, count in totals['buckets'].items():
+            self.stdout.write(f"  {bucket_label(bucket)}: {count} invoices")
+        verb = 'Would send' if options['dry_run'] else 'Sent'
+        self.stdout.write(self.style.SUCCESS(
+            f"{verb} {totals['notifications']} notifications and {totals['emails']} emails about "
+            f"{totals['invoices']} of {totals['overdue']} overdue invoices ({totals['students']} students, "
+            f"{totals['amount']} outstanding) in {totals['elapsed']:.2f}s"))
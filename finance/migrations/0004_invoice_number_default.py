@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-17 22:19
+
+import finance.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('finance', '0003_feeledger_ledgerentry'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='invoice',
+            name='invoice_number',
+            field=models.CharField(default=finance.models.new_invoice_number, max_length=20, unique=True),
+        ),
+    ]
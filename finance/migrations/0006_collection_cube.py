@@ -0,0 +1,42 @@
+# Generated by Django 5.2.18 on 2026-10-17 22:28
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('academics', '0008_attendancemonth'),
+        ('finance', '0005_payment_idempotency_allocation'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CollectionMonth',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('month', models.DateField(unique=True)),
+                ('is_stale', models.BooleanField(default=True)),
+                ('refreshed_at', models.DateTimeField(blank=True, null=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='CollectionCell',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('academic_year', models.CharField(max_length=9)),
+                ('month', models.DateField()),
+                ('payment_method', models.CharField(blank=True, max_length=50)),
+                ('due', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('invoices', models.PositiveIntegerField(default=0)),
+                ('collected', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('payments', models.PositiveIntegerField(default=0)),
+                ('class_level', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='academics.class')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['academic_year', 'month'], name='finance_col_academi_daf12d_idx')],
+                'unique_together': {('class_level', 'academic_year', 'month', 'payment_method')},
+            },
+        ),
+    ]
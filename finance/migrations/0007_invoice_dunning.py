@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-17 22:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('finance', '0006_collection_cube'),
+        ('students', '0003_studentsummary'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='invoice',
+            name='last_dunning_bucket',
+            field=models.PositiveSmallIntegerField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='invoice',
+            index=models.Index(fields=['is_paid', 'due_date'], name='finance_inv_is_paid_19b722_idx'),
+        ),
+    ]
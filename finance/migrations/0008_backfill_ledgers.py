@@ -0,0 +1,38 @@
+from django.db import migrations
+
+BATCH_SIZE = 500
+
+
+def backfill_ledgers(apps, schema_editor):
+    """
+    Post the fee charges of every academic year and credit every payment for
+    the students that existed before the ledgers did, then bring their
+    summaries' fee totals in line. Safe to re-run: charges are posted as
+    differences and payment entries are recreated.
+
+    The ledger logic lives in finance.ledger and runs on the current models,
+    which match the schema as of the migrations this one depends on.
+    """
+    from finance.ledger import rebuild_payments, sync_all_charges
+    from students.summary import FEES, PAYMENTS, refresh_summaries
+
+    Student = apps.get_model('students', 'Student')
+    student_ids = list(Student.objects.order_by('pk').values_list('pk', flat=True))
+    for start in range(0, len(student_ids), BATCH_SIZE):
+        batch = student_ids[start:start + BATCH_SIZE]
+        sync_all_charges(batch)
+        rebuild_payments(batch)
+        refresh_summaries(batch, parts=(PAYMENTS, FEES), create=False)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('academics', '0008_attendancemonth'),
+        ('finance', '0007_invoice_dunning'),
+        ('students', '0003_studentsummary'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_ledgers, migrations.RunPython.noop),
+    ]
@@ -15,6 +15,10 @@ class FeeStructure(models.Model):
         return f"Fee Structure for {self.class_level} ({self.academic_year})"
 
 
+def new_invoice_number():
+    return f"INV-{uuid.uuid4().hex[:12].upper()}"
+
+
 class Invoice(models.Model):
     student = models.ForeignKey(Student, on_delete=models.CASCADE)
     fee_structure = models.ForeignKey(FeeStructure, on_delete=models.SET_NULL, null=True)
@@ -22,7 +26,12 @@ class Invoice(models.Model):
     due_date = models.DateField()
     amount_due = models.DecimalField(max_digits=10, decimal_places=2)
     is_paid = models.BooleanField(default=False)
-    invoice_number = models.CharField(max_length=20, unique=True, default=uuid.uuid4)
+    invoice_number = models.CharField(max_length=20, unique=True, default=new_invoice_number)
+    # Days-overdue bucket (see DUNNING_BUCKETS) of the last reminder sent; null until the first one.
+    last_dunning_bucket = models.PositiveSmallIntegerField(null=True, blank=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['is_paid', 'due_date'])]
 
     def __str__(self):
         return f"Invoice {self.invoice_number} for {self.student}"
@@ -35,6 +44,93 @@ class Payment(models.Model):
     transaction_id = models.CharField(max_length=100, unique=True, null=True, blank=True)
     payment_method = models.CharField(max_length=50, default='CASH') # CASH, ONLINE, CHEQUE
     remarks = models.TextField(blank=True)
+    # Supplied by the client for each payment attempt so a retried request is recorded once.
+    idempotency_key = models.CharField(max_length=64, unique=True, null=True, blank=True)
 
     def __str__(self):
         return f"Payment of {self.amount_paid} by {self.student}"
+
+
+class PaymentAllocation(models.Model):
+    """The part of a payment applied to one invoice, written by finance.payments."""
+    payment = models.ForeignKey(Payment, on_delete=models.CASCADE, related_name='allocations')
+    invoice = models.ForeignKey(Invoice, on_delete=models.CASCADE, related_name='allocations')
+    amount = models.DecimalField(max_digits=10, decimal_places=2)
+
+    class Meta:
+        unique_together = ('payment', 'invoice')
+
+    def __str__(self):
+        return f"{self.amount} of payment #{self.payment_id} to {self.invoice}"
+
+
+class FeeLedger(models.Model):
+    """A student's fees for one academic year, maintained by finance.ledger."""
+    student = models.ForeignKey(Student, on_delete=models.CASCADE, related_name='fee_ledgers')
+    academic_year = models.CharField(max_length=9)
+    total_charged = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    total_paid = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    balance = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ('student', 'academic_year')
+
+    def __str__(self):
+        return f"Ledger {self.academic_year} for {self.student}"
+
+
+class LedgerEntry(models.Model):
+    class Kind(models.TextChoices):
+        CHARGE = 'CHARGE', 'Charge'
+        PAYMENT = 'PAYMENT', 'Payment'
+
+    ledger = models.ForeignKey(FeeLedger, on_delete=models.CASCADE, related_name='entries')
+    kind = models.CharField(max_length=10, choices=Kind.choices)
+    date = models.DateField()
+    description = models.CharField(max_length=200)
+    amount = models.DecimalField(max_digits=10, decimal_places=2)
+    balance_after = models.DecimalField(max_digits=12, decimal_places=2)
+    fee_structure = models.ForeignKey(FeeStructure, on_delete=models.SET_NULL, null=True, blank=True)
+    invoice = models.ForeignKey(Invoice, on_delete=models.SET_NULL, null=True, blank=True)
+    payment = models.OneToOneField(Payment, on_delete=models.SET_NULL, null=True, blank=True, related_name='ledger_entry')
+
+    class Meta:
+        ordering = ['ledger', 'date', 'pk']
+        verbose_name_plural = "Ledger entries"
+
+    def __str__(self):
+        return f"{self.get_kind_display()} of {self.amount} on {self.date}"
+
+
+class CollectionCell(models.Model):
+    """
+    One cell of the fee-collection cube, maintained by finance.cube: invoiced
+    amounts fall due in ``month`` (``payment_method`` blank), payments are
+    collected in ``month`` by ``payment_method``.
+    """
+    class_level = models.ForeignKey('academics.Class', on_delete=models.CASCADE, null=True, blank=True)
+    academic_year = models.CharField(max_length=9)
+    month = models.DateField()  # first day of the month
+    payment_method = models.CharField(max_length=50, blank=True)
+    due = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    invoices = models.PositiveIntegerField(default=0)
+    collected = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    payments = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        unique_together = ('class_level', 'academic_year', 'month', 'payment_method')
+        indexes = [models.Index(fields=['academic_year', 'month'])]
+
+    def __str__(self):
+        return f"{self.class_level or 'No class'} {self.academic_year} {self.month:%Y-%m} {self.payment_method or 'due'}"
+
+
+class CollectionMonth(models.Model):
+    """A month of the collection cube and whether writes since its last refresh left it stale."""
+    month = models.DateField(unique=True)
+    is_stale = models.BooleanField(default=True)
+    refreshed_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.month:%Y-%m}{' (stale)' if self.is_stale else ''}"
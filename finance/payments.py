@@ -0,0 +1,125 @@
+"""
+Recording payments.
+
+record_payment is the one way the site records a payment. Each payment
+carries a client-supplied idempotency key: a retried or double-submitted
+request finds the payment already recorded under its key and gets it back
+instead of creating another. Within one transaction the student's open
+invoices are locked (select_for_update), the payment is written, spread
+over the invoices oldest due date first as PaymentAllocation rows, and the
+invoices it settles are marked paid. The ledger entry is posted by the
+Payment post_save handler inside the same transaction. Any amount left
+over stays on the ledger as credit.
+"""
+from decimal import Decimal, InvalidOperation
+
+from django.db import IntegrityError, transaction
+from django.db.models import Sum
+
+from .models import Invoice, Payment, PaymentAllocation
+
+CENT = Decimal('0.01')
+
+
+class PaymentError(Exception):
+    pass
+
+
+def parse_amount(value):
+    """Validate a submitted amount, returning it as a 2-place Decimal."""
+    try:
+        amount = Decimal(str(value)).quantize(CENT)
+    except (InvalidOperation, ValueError):
+        raise PaymentError(f"Invalid amount {value!r}.")
+    if not amount.is_finite() or amount <= 0:
+        raise PaymentError("The amount must be greater than zero.")
+    return amount
+
+
+def outstanding_invoices(student_id, lock=False):
+    """Unpaid invoices of a student, oldest due first, each with ``outstanding`` set."""
+    invoices = Invoice.objects.filter(student_id=student_id, is_paid=False).order_by('due_date', 'pk')
+    if lock:
+        invoices = invoices.select_for_update()
+    invoices = list(invoices)
+    allocated = dict(PaymentAllocation.objects.filter(invoice__in=invoices)
+                     .values('invoice_id').annotate(total=Sum('amount')).order_by()
+                     .values_list('invoice_id', 'total'))
+    for invoice in invoices:
+        invoice.outstanding = invoice.amount_due - allocated.get(invoice.pk, 0)
+    return invoices
+
+
+def _existing(idempotency_key, student_id, amount):
+    payment = Payment.objects.filter(idempotency_key=idempotency_key).first()
+    if payment is not None and (payment.student_id != student_id or payment.amount_paid != amount):
+        raise PaymentError("This payment key was already used for a different payment.")
+    return payment
+
+
+def record_payment(student_id, amount, idempotency_key, method='ONLINE', transaction_id=None, remarks='',
+                   invoice_id=None):
+    """
+    Record a payment once per ``idempotency_key``. Returns ``(payment, created)``;
+    ``created`` is False when the key was already recorded. ``invoice_id``, if
+    given, must be one of the student's open invoices and is settled first.
+    """
+    amount = parse_amount(amount)
+    if not idempotency_key:
+        raise PaymentError("A payment key is required.")
+    payment = _existing(idempotency_key, student_id, amount)
+    if payment is not None:
+        return payment, False
+
+    try:
+        with transaction.atomic():
+            invoices = outstanding_invoices(student_id, lock=True)
+            if invoice_id is not None:
+                if not any(invoice.pk == invoice_id for invoice in invoices):
+                    raise PaymentError("The chosen invoice is not an open invoice of this student.")
+                invoices.sort(key=lambda invoice: invoice.pk != invoice_id)
+            allocations = []
+            remaining = amount
+            for invoice in invoices:
+                if remaining <= 0:
+                    break
+                share = min(remaining, invoice.outstanding)
+                if share > 0:
+                    allocations.append((invoice, share))
+                    remaining -= share
+            payment = Payment.objects.create(
+                student_id=student_id,
+                invoice=allocations[0][0] if allocations else None,
+                amount_paid=amount,
+                transaction_id=transaction_id,
+                payment_method=method,
+                remarks=remarks,
+                idempotency_key=idempotency_key,
+            )
+            PaymentAllocation.objects.bulk_create(
+                PaymentAllocation(payment=payment, invoice=invoice, amount=share) for invoice, share in allocations)
+            settled = [invoice.pk for invoice, share in allocations if share == invoice.outstanding]
+            if settled:
+                Invoice.objects.filter(pk__in=settled).update(is_paid=True)
+    except IntegrityError:
+        # A concurrent request with the same key committed first.
+        payment = _existing(idempotency_key, student_id, amount)
+        if payment is None:
+            raise
+        return payment, False
+    return payment, True
+
+
+def settle_invoices(invoice_ids):
+    """Recompute ``is_paid`` of ``invoice_ids`` from their allocations, e.g. after a payment is deleted."""
+    invoices = list(Invoice.objects.filter(pk__in=invoice_ids))
+    allocated = dict(PaymentAllocation.objects.filter(invoice__in=invoices)
+                     .values('invoice_id').annotate(total=Sum('amount')).order_by()
+                     .values_list('invoice_id', 'total'))
+    changed = []
+    for invoice in invoices:
+        is_paid = allocated.get(invoice.pk, 0) >= invoice.amount_due
+        if invoice.is_paid != is_paid:
+            invoice.is_paid = is_paid
+            changed.append(invoice)
+    Invoice.objects.bulk_update(changed, ['is_paid'])
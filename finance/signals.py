@@ -0,0 +1,124 @@
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from core.models import User
+from core.utils import cascades_from
+from students.models import Student
+from students.summary import FEES, PAYMENTS, refresh_summaries
+from . import cube, ledger
+from .models import FeeStructure, Invoice, Payment
+from .payments import settle_invoices
+
+
+def _refresh(student_ids, create=True):
+    refresh_summaries(student_ids, parts=(PAYMENTS, FEES), create=create)
+
+
+@receiver(post_save, sender=Payment)
+def payment_saved(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    if created:
+        ledger.post_payment(instance)
+        _refresh([instance.student_id])
+    else:
+        _refresh(ledger.rebuild_payments([instance.student_id]))
+
+
+@receiver(pre_delete, sender=Payment)
+def payment_deleting(sender, instance, **kwargs):
+    # The allocations go with the payment; remember which invoices they covered.
+    instance._allocated_invoice_ids = list(instance.allocations.values_list('invoice_id', flat=True))
+
+
+@receiver(post_delete, sender=Payment)
+def payment_deleted(sender, instance, **kwargs):
+    settle_invoices(getattr(instance, '_allocated_invoice_ids', []))
+    _refresh(ledger.rebuild_payments([instance.student_id]), create=False)
+
+
+@receiver(post_save, sender=FeeStructure)
+def fee_structure_saved(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    student_ids = list(Student.objects.filter(current_class_id=instance.class_level_id).values_list('pk', flat=True))
+    ledger.sync_charges(student_ids, instance.academic_year)
+    _refresh(student_ids)
+
+
+@receiver(pre_delete, sender=FeeStructure)
+def fee_structure_deleting(sender, instance, **kwargs):
+    # Reverse the charges while they still point at the structure.
+    student_ids = list(Student.objects.filter(current_class_id=instance.class_level_id).values_list('pk', flat=True))
+    ledger.sync_charges(student_ids, instance.academic_year, exclude=[('fee_structure', instance.pk)])
+    _refresh(student_ids)
+
+
+def _invoice_year(invoice):
+    if invoice.fee_structure_id:
+        return invoice.fee_structure.academic_year
+    return ledger.academic_year_for(invoice.date_issued)
+
+
+@receiver(post_save, sender=Invoice)
+def invoice_saved(sender, instance, raw=False, **kwargs):
+    # Fee invoices decide what earlier years owe (see ledger._year_structures).
+    if raw:
+        return
+    ledger.sync_charges([instance.student_id], _invoice_year(instance))
+    _refresh([instance.student_id])
+
+
+@receiver(pre_delete, sender=Invoice)
+def invoice_deleting(sender, instance, origin=None, **kwargs):
+    if cascades_from(origin, Student, User):
+        return
+    if not instance.fee_structure_id:
+        exclude = [('invoice', instance.pk)]
+    elif instance.fee_structure.academic_year != ledger.academic_year_for():
+        exclude = [('fee_structure', instance.fee_structure_id)]
+    else:
+        # This year's fees follow the student's class, not the invoice.
+        return
+    ledger.sync_charges([instance.student_id], _invoice_year(instance), exclude=exclude)
+    _refresh([instance.student_id])
+
+
+@receiver(pre_save, sender=Invoice)
+def invoice_saving(sender, instance, **kwargs):
+    # Moving the due date leaves the old month of the collection cube stale too.
+    instance._previous_due_date = (Invoice.objects.filter(pk=instance.pk).values_list('due_date', flat=True).first()
+                                   if instance.pk else None)
+    # A new due date restarts the dunning cycle.
+    if instance._previous_due_date and instance._previous_due_date != instance.due_date:
+        instance.last_dunning_bucket = None
+
+
+@receiver(post_save, sender=Invoice)
+@receiver(post_delete, sender=Invoice)
+def invoice_changed(sender, instance, raw=False, **kwargs):
+    if not raw:
+        cube.mark_stale([instance.due_date, getattr(instance, '_previous_due_date', None)])
+
+
+@receiver(post_save, sender=Payment)
+@receiver(post_delete, sender=Payment)
+def payment_changed(sender, instance, raw=False, **kwargs):
+    if not raw:
+        cube.mark_stale([instance.payment_date])
+
+
+@receiver(pre_save, sender=Student)
+def student_saving(sender, instance, **kwargs):
+    instance._previous_class_id = (Student.objects.filter(pk=instance.pk).values_list('current_class_id', flat=True)
+                                   .first() if instance.pk else None)
+
+
+@receiver(post_save, sender=Student)
+def student_saved(sender, instance, created, raw=False, **kwargs):
+    # Joining or changing class re-bases this year's charges on the new class.
+    if raw:
+        return
+    if created or instance.current_class_id != getattr(instance, '_previous_class_id', None):
+        ledger.sync_charges([instance.pk])
+        _refresh([instance.pk])
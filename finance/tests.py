@@ -1,3 +1,296 @@
-from django.test import TestCase
+import datetime
+import functools
+import importlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
 
-# Create your tests here.
+from django.apps import apps
+from django.db import connection
+from django.db.models import Sum
+from django.test import TestCase, TransactionTestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from academics.models import Class
+from core.models import Notification, OutboundEmail, User
+from core.utils import academic_year_for
+from students.models import Parent, Student, StudentSummary
+from . import ledger
+from .dunning import send_dunning_notices
+from .invoicing import generate_invoices, invoice_number
+from .models import FeeLedger, FeeStructure, Invoice, LedgerEntry, Payment, PaymentAllocation
+from .payments import record_payment
+
+THIS_YEAR = academic_year_for()
+LAST_YEAR = academic_year_for(timezone.localdate() - datetime.timedelta(days=366))
+
+
+def make_student(number, school_class=None):
+    user = User.objects.create_user(f'student{number}', password='x', role=User.Role.STUDENT,
+                                    first_name=f'Student{number}', last_name='Test')
+    return Student.objects.create(user=user, admission_number=f'ADM{number:04d}',
+                                  date_of_birth=datetime.date(2015, 1, 1), address='Somewhere',
+                                  current_class=school_class)
+
+
+def ledger_totals(student):
+    return {row.academic_year: (row.total_charged, row.total_paid, row.balance)
+            for row in FeeLedger.objects.filter(student=student)}
+
+
+class LedgerTests(TestCase):
+    def setUp(self):
+        self.class_one = Class.objects.create(name='Class 1', section='A')
+        self.class_two = Class.objects.create(name='Class 2', section='A')
+        self.last_year_fees = FeeStructure.objects.create(class_level=self.class_one, tuition_fee=800, other_fees=0,
+                                                          academic_year=LAST_YEAR)
+        self.this_year_fees = FeeStructure.objects.create(class_level=self.class_two, tuition_fee=1000,
+                                                          other_fees=100, academic_year=THIS_YEAR)
+        # Promoted from Class 1 last year to Class 2 this year.
+        self.student = make_student(1, self.class_two)
+
+    def test_current_year_follows_class(self):
+        self.assertEqual(ledger_totals(self.student), {THIS_YEAR: (Decimal('1100.00'), 0, Decimal('1100.00'))})
+        self.student.current_class = self.class_one
+        self.student.save()
+        self.assertEqual(ledger_totals(self.student)[THIS_YEAR][0], 0)
+        self.assertEqual(self.student.summary.total_fee, 0)
+
+    def test_past_year_follows_invoices(self):
+        Invoice.objects.create(student=self.student, fee_structure=self.last_year_fees, amount_due=800,
+                               due_date=timezone.localdate())
+        other = make_student(2, self.class_one)
+        self.assertEqual(ledger_totals(self.student)[LAST_YEAR][0], Decimal('800.00'))
+        # Being in Class 1 now says nothing about last year.
+        self.assertNotIn(LAST_YEAR, ledger_totals(other))
+
+        Invoice.objects.get(student=self.student).delete()
+        self.assertEqual(ledger_totals(self.student)[LAST_YEAR][0], 0)
+
+    def test_sync_all_charges_covers_every_year(self):
+        Invoice.objects.create(student=self.student, fee_structure=self.last_year_fees, amount_due=800,
+                               due_date=timezone.localdate())
+        LedgerEntry.objects.all().delete()
+        FeeLedger.objects.all().delete()
+        self.assertEqual(ledger.charge_years([self.student.pk]), sorted({LAST_YEAR, THIS_YEAR}))
+        self.assertEqual(ledger.sync_all_charges([self.student.pk]), 2)
+        self.assertEqual(ledger.sync_all_charges([self.student.pk]), 0)
+        self.assertEqual(ledger_totals(self.student)[LAST_YEAR][0], Decimal('800.00'))
+        self.assertEqual(ledger_totals(self.student)[THIS_YEAR][0], Decimal('1100.00'))
+
+    def test_delete_student_with_invoices(self):
+        Invoice.objects.create(student=self.student, fee_structure=self.last_year_fees, amount_due=800,
+                               due_date=timezone.localdate())
+        record_payment(self.student.pk, 500, 'pay-1')
+        other = make_student(2, self.class_two)
+        self.student.delete()
+        connection.check_constraints()
+        self.assertFalse(FeeLedger.objects.filter(student_id=self.student.pk).exists())
+        self.assertFalse(StudentSummary.objects.filter(student_id=self.student.pk).exists())
+        self.assertEqual(ledger_totals(other)[THIS_YEAR][0], Decimal('1100.00'))
+        self.assertEqual(ledger.reconcile(), [])
+
+    def test_backfill_migration(self):
+        Invoice.objects.create(student=self.student, fee_structure=self.last_year_fees, amount_due=800,
+                               due_date=timezone.localdate())
+        Payment.objects.create(student=self.student, amount_paid=300, payment_method='CASH')
+        expected = ledger_totals(self.student)
+        # The state the ledger migration left existing schools in.
+        LedgerEntry.objects.all().delete()
+        FeeLedger.objects.all().delete()
+        StudentSummary.objects.update(total_fee=0, total_paid=0, fee_balance=0)
+
+        migration = importlib.import_module('finance.migrations.0008_backfill_ledgers')
+        migration.backfill_ledgers(apps, None)
+        migration.backfill_ledgers(apps, None)
+        self.assertEqual(ledger_totals(self.student), expected)
+        self.assertEqual(ledger.reconcile(), [])
+        summary = StudentSummary.objects.get(student=self.student)
+        self.assertEqual((summary.total_fee, summary.total_paid), (Decimal('1900.00'), Decimal('300.00')))
+
+
+class PaymentAdminTests(TestCase):
+    def setUp(self):
+        school_class = Class.objects.create(name='Class 1', section='A')
+        fees = FeeStructure.objects.create(class_level=school_class, tuition_fee=1000, other_fees=0,
+                                           academic_year=THIS_YEAR)
+        self.student = make_student(1, school_class)
+        self.other = make_student(2, school_class)
+        today = timezone.localdate()
+        self.older = Invoice.objects.create(student=self.student, fee_structure=fees, amount_due=300, due_date=today)
+        self.chosen = Invoice.objects.create(student=self.student, fee_structure=fees, amount_due=700,
+                                             due_date=today + datetime.timedelta(days=30))
+        self.foreign = Invoice.objects.create(student=self.other, fee_structure=fees, amount_due=1000, due_date=today)
+        admin_user = User.objects.create_superuser('admin', password='x', role=User.Role.ADMIN)
+        self.client.force_login(admin_user)
+
+    def _add(self, invoice, amount):
+        return self.client.post(reverse('admin:finance_payment_add'), {
+            'student': self.student.pk, 'invoice': invoice.pk, 'amount_paid': amount, 'payment_method': 'CASH',
+            'transaction_id': '', 'remarks': '',
+            'allocations-TOTAL_FORMS': 0, 'allocations-INITIAL_FORMS': 0,
+            'allocations-MIN_NUM_FORMS': 0, 'allocations-MAX_NUM_FORMS': 1000,
+        })
+
+    def test_chosen_invoice_is_settled_first(self):
+        response = self._add(self.chosen, '800.00')
+        self.assertEqual(response.status_code, 302)
+        payment = Payment.objects.get()
+        self.assertEqual(dict(payment.allocations.values_list('invoice_id', 'amount')),
+                         {self.chosen.pk: Decimal('700.00'), self.older.pk: Decimal('100.00')})
+        self.assertTrue(Invoice.objects.get(pk=self.chosen.pk).is_paid)
+        self.assertFalse(Invoice.objects.get(pk=self.older.pk).is_paid)
+        self.assertEqual(ledger.reconcile(), [])
+
+    def test_invoice_of_another_student_is_reported(self):
+        response = self._add(self.foreign, '100.00')
+        self.assertRedirects(response, reverse('admin:finance_payment_add'), fetch_redirect_response=False)
+        self.assertFalse(Payment.objects.exists())
+        messages = [str(message) for message in response.wsgi_request._messages]
+        self.assertEqual(messages, ["The chosen invoice is not an open invoice of this student."])
+
+
+class InvoicingTests(TestCase):
+    def setUp(self):
+        self.billed = Class.objects.create(name='Class 1', section='A')
+        self.unbilled = Class.objects.create(name='Class 2', section='A')
+        self.fees = FeeStructure.objects.create(class_level=self.billed, tuition_fee=1000, other_fees=100,
+                                                academic_year=THIS_YEAR)
+        self.students = [make_student(number, self.billed) for number in range(1, 4)]
+        self.outsider = make_student(4, self.unbilled)
+
+    def test_run_is_idempotent(self):
+        self.assertEqual(generate_invoices(dry_run=True)['created'], 3)
+        self.assertFalse(Invoice.objects.exists())
+
+        totals = generate_invoices(batch_size=2)
+        self.assertEqual((totals['students'], totals['created'], totals['skipped']), (3, 3, 0))
+        self.assertEqual(totals['amount'], Decimal('3300.00'))
+        self.assertEqual(set(Invoice.objects.values_list('invoice_number', flat=True)),
+                         {invoice_number(THIS_YEAR, student.pk) for student in self.students})
+        self.assertFalse(Invoice.objects.filter(student=self.outsider).exists())
+
+        totals = generate_invoices(batch_size=2)
+        self.assertEqual((totals['created'], totals['skipped']), (0, 3))
+        self.assertEqual(Invoice.objects.count(), 3)
+
+    def test_already_invoiced_student_is_skipped(self):
+        Invoice.objects.create(student=self.students[0], fee_structure=self.fees, amount_due=1100,
+                               due_date=timezone.localdate())
+        self.assertEqual(generate_invoices()['created'], 2)
+        self.assertEqual(Invoice.objects.filter(student=self.students[0]).count(), 1)
+
+    def test_ledgers_and_summaries_follow(self):
+        generate_invoices()
+        for student in self.students:
+            self.assertEqual(ledger_totals(student), {THIS_YEAR: (Decimal('1100.00'), 0, Decimal('1100.00'))})
+            self.assertEqual(StudentSummary.objects.get(student=student).fee_balance, Decimal('1100.00'))
+        self.assertEqual(ledger.reconcile(), [])
+
+
+class DunningTests(TestCase):
+    def setUp(self):
+        self.today = timezone.localdate()
+        school_class = Class.objects.create(name='Class 1', section='A')
+        self.fees = FeeStructure.objects.create(class_level=school_class, tuition_fee=1000, other_fees=0,
+                                                academic_year=THIS_YEAR)
+        self.first, self.second = make_student(1, school_class), make_student(2, school_class)
+        self.first.user.email = 'student1@example.com'
+        self.first.user.save()
+        parent = Parent.objects.create(user=User.objects.create_user('parent', password='x', role=User.Role.PARENT,
+                                                                     email='parent@example.com'),
+                                       phone_number='1')
+        parent.all_children.add(self.first, self.second)
+        self.old = self._invoice(self.first, days_overdue=45)
+        self.recent = self._invoice(self.second, days_overdue=5)
+
+    def _invoice(self, student, days_overdue):
+        return Invoice.objects.create(student=student, fee_structure=self.fees, amount_due=1000,
+                                      due_date=self.today - datetime.timedelta(days=days_overdue))
+
+    def test_buckets_and_recipients(self):
+        result = send_dunning_notices()
+        self.assertEqual((result['invoices'], result['students']), (2, 2))
+        self.assertEqual(result['buckets'], {0: 1, 30: 1})
+        self.assertEqual(result['amount'], Decimal('2000.00'))
+        # Each student, plus one message to the parent covering both children.
+        self.assertEqual(result['notifications'], 3)
+        parent_notice = Notification.objects.get(recipient__username='parent')
+        self.assertIn(self.old.invoice_number, parent_notice.message)
+        self.assertIn(self.recent.invoice_number, parent_notice.message)
+        self.assertEqual(set(OutboundEmail.objects.values_list('recipients', flat=True)),
+                         {'student1@example.com', 'parent@example.com'})
+        self.assertEqual(Invoice.objects.get(pk=self.old.pk).last_dunning_bucket, 30)
+
+    def test_reminds_once_per_bucket(self):
+        send_dunning_notices()
+        repeat = send_dunning_notices()
+        self.assertEqual((repeat['invoices'], repeat['notifications']), (0, 0))
+        later = send_dunning_notices(as_of=self.today + datetime.timedelta(days=30))
+        self.assertEqual(later['buckets'], {30: 1, 60: 1})
+        self.assertEqual(Notification.objects.count(), 6)
+
+    def test_payments_reduce_and_clear_reminders(self):
+        record_payment(self.first.pk, 1000, 'pay-old')
+        record_payment(self.second.pk, 400, 'pay-recent')
+        result = send_dunning_notices()
+        self.assertEqual(result['invoices'], 1)
+        self.assertEqual(result['amount'], Decimal('600.00'))
+
+    def test_dry_run(self):
+        result = send_dunning_notices(dry_run=True)
+        self.assertEqual(result['notifications'], 3)
+        self.assertFalse(Notification.objects.exists())
+        self.assertFalse(OutboundEmail.objects.exists())
+        self.assertFalse(Invoice.objects.filter(last_dunning_bucket__isnull=False).exists())
+
+
+class ConcurrentPaymentTests(TransactionTestCase):
+    """record_payment under many simultaneous requests, each on its own connection."""
+    THREADS = 16
+
+    def setUp(self):
+        school_class = Class.objects.create(name='Class 1', section='A')
+        FeeStructure.objects.create(class_level=school_class, tuition_fee=50000, other_fees=0, academic_year=THIS_YEAR)
+        self.student = make_student(1, school_class)
+        self.invoice = Invoice.objects.create(student=self.student, fee_structure=FeeStructure.objects.get(),
+                                              amount_due=50000, due_date=timezone.localdate())
+
+    def _concurrently(self, calls):
+        """Run ``calls`` on THREADS threads, released together, and return their results."""
+        start = threading.Event()
+
+        def run(call):
+            start.wait()
+            try:
+                return call()
+            finally:
+                connection.close()
+
+        with ThreadPoolExecutor(max_workers=self.THREADS) as pool:
+            futures = [pool.submit(run, call) for call in calls]
+            start.set()
+            return [future.result() for future in futures]
+
+    def test_same_key_records_one_payment(self):
+        calls = [functools.partial(record_payment, self.student.pk, '125.50', 'retry-key') for _ in range(200)]
+        results = self._concurrently(calls)
+        self.assertEqual(sum(created for _payment, created in results), 1)
+        self.assertEqual(len({payment.pk for payment, _created in results}), 1)
+        self.assertEqual(Payment.objects.count(), 1)
+        self.assertEqual(LedgerEntry.objects.filter(kind=LedgerEntry.Kind.PAYMENT).count(), 1)
+        self.assertEqual(FeeLedger.objects.get(student=self.student).total_paid, Decimal('125.50'))
+
+    def test_different_keys_all_recorded(self):
+        amounts = [Decimal(10 + n % 7) for n in range(300)]
+        calls = [functools.partial(record_payment, self.student.pk, amount, f'key-{n}')
+                 for n, amount in enumerate(amounts)]
+        results = self._concurrently(calls)
+        self.assertTrue(all(created for _payment, created in results))
+        self.assertEqual(Payment.objects.count(), len(amounts))
+        ledger_row = FeeLedger.objects.get(student=self.student)
+        self.assertEqual(ledger_row.total_paid, sum(amounts))
+        self.assertEqual(ledger_row.balance, Decimal('50000') - sum(amounts))
+        self.assertEqual(PaymentAllocation.objects.aggregate(total=Sum('amount'))['total'], sum(amounts))
+        self.assertEqual(ledger.reconcile(), [])
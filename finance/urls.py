@@ -6,4 +6,6 @@ app_name = 'finance'
 urlpatterns = [
     path('pay/', views.initiate_payment, name='initiate_payment'),
     path('process/', views.process_payment, name='process_payment'),
+    path('analytics/', views.collection_analytics, name='collection_analytics'),
+    path('analytics/data/', views.collection_analytics_api, name='collection_analytics_api'),
 ]
@@ -1,38 +1,152 @@
+import datetime
+
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from .models import Payment
+from django.http import JsonResponse
+from django.views.decorators.http import require_POST
+from .cube import DIMENSIONS, collection_summary, month_end_report
+from .gateway import get_gateway
+from .models import FeeLedger
+from .payments import PaymentError, outstanding_invoices, parse_amount, record_payment
+from academics.models import Class
+from core.models import User
 from students.models import Student
+from django.db.models import Sum
+from django.utils import timezone
 import uuid
 
+
+def _paying_student(request):
+    """Students pay their own fees; admins may pay on behalf of any student."""
+    if request.user.role == User.Role.ADMIN and request.POST.get('student_id'):
+        return get_object_or_404(Student, pk=request.POST['student_id'])
+    try:
+        return request.user.student_profile
+    except Student.DoesNotExist:
+        return None
+
+
 @login_required
+@require_POST
 def initiate_payment(request):
-    if request.method == 'POST':
-        amount = request.POST.get('amount')
-        student_id = request.POST.get('student_id') # In a real scenario, this would be from the logged in user or session
-        
-        # Simulate redirect to payment gateway
-        return render(request, 'finance/payment_gateway.html', {'amount': amount, 'student_id': student_id})
-    return redirect('students:dashboard')
+    student = _paying_student(request)
+    if student is None:
+        return redirect('dashboard_router')
+
+    balance = FeeLedger.objects.filter(student=student).aggregate(total=Sum('balance'))['total'] or 0
+    context = {
+        'student': student,
+        'amount': request.POST.get('amount') or (balance if balance > 0 else ''),
+        'balance': balance,
+        'invoices': outstanding_invoices(student.pk),
+        # One key per payment attempt: resubmitting this form cannot pay twice.
+        'idempotency_key': uuid.uuid4().hex,
+    }
+    return render(request, 'finance/payment_gateway.html', context)
+
 
 @login_required
+@require_POST
 def process_payment(request):
-    if request.method == 'POST':
-        amount = request.POST.get('amount')
-        student_id = request.POST.get('student_id')
-        
-        try:
-            student = Student.objects.get(id=student_id)
-            # Create Payment Record
-            Payment.objects.create(
-                student=student,
-                amount_paid=amount,
-                transaction_id=str(uuid.uuid4())[:12].upper(),
-                remarks="Online Payment"
-            )
-            messages.success(request, f"Payment of ${amount} successful!")
+    student = _paying_student(request)
+    if student is None:
+        return redirect('dashboard_router')
+
+    key = request.POST.get('idempotency_key', '')
+    try:
+        amount = parse_amount(request.POST.get('amount'))
+        if not key:
+            raise PaymentError("This payment form has expired; please start again.")
+        result = get_gateway().charge(amount, request.POST.get('card_number', ''), key,
+                                      description=f"Fees for {student.admission_number}")
+        if not result.approved:
+            messages.error(request, f"Payment failed: {result.message}")
             return redirect('students:fees')
-        except Student.DoesNotExist:
-             messages.error(request, "Student not found.")
-             
-    return redirect('students:dashboard')
+        payment, created = record_payment(student.pk, amount, key, method='ONLINE',
+                                          transaction_id=result.reference, remarks="Online Payment")
+    except PaymentError as e:
+        messages.error(request, str(e))
+        return redirect('students:fees')
+
+    if created:
+        messages.success(request, f"Payment of ${payment.amount_paid} successful! Reference {payment.transaction_id}.")
+    else:
+        messages.info(request, f"Payment {payment.transaction_id} was already recorded.")
+    return redirect('students:fees')
+
+
+GROUPINGS = [
+    ('class,academic_year', 'Class & year'),
+    ('class,academic_year,month', 'Class, year & month'),
+    ('academic_year,month', 'Year & month'),
+    ('class,payment_method', 'Class & payment method'),
+    ('academic_year,month,payment_method', 'Month & payment method'),
+]
+
+
+def _month(value):
+    """``YYYY-MM`` query parameter to the first day of that month, or None."""
+    try:
+        return datetime.datetime.strptime(value, '%Y-%m').date() if value else None
+    except ValueError:
+        return None
+
+
+def _collection_query(request):
+    group_by = [dimension for dimension in request.GET.get('group_by', 'class,academic_year').split(',')
+                if dimension in DIMENSIONS] or ['class', 'academic_year']
+    class_id = request.GET.get('class')
+    return {
+        'group_by': group_by,
+        'academic_year': request.GET.get('year') or None,
+        'class_id': int(class_id) if class_id and class_id.isdigit() else None,
+        'month_from': _month(request.GET.get('from')),
+        'month_to': _month(request.GET.get('to')),
+        'payment_method': request.GET.get('method') or None,
+    }
+
+
+def _label_classes(rows):
+    names = {class_group.pk: str(class_group) for class_group in
+             Class.objects.filter(pk__in={row['class'] for row in rows if row.get('class')})}
+    for row in rows:
+        if 'class' in row:
+            row['class_name'] = names.get(row['class'], 'No class')
+    return rows
+
+
+@login_required
+def collection_analytics(request):
+    """Fee collection by class, academic year, month and payment method, from the collection cube."""
+    if request.user.role != User.Role.ADMIN:
+        return render(request, 'core/access_denied.html')
+
+    query = _collection_query(request)
+    month = _month(request.GET.get('month')) or timezone.localdate().replace(day=1)
+    report = month_end_report(month)
+    context = {
+        'query': query,
+        'rows': _label_classes(collection_summary(**query)),
+        'groupings': GROUPINGS,
+        'grouping': ','.join(query['group_by']),
+        'report': report,
+        'report_rows': _label_classes(report['classes']),
+        'classes': Class.objects.order_by('name', 'section'),
+    }
+    return render(request, 'finance/collection_analytics.html', context)
+
+
+@login_required
+def collection_analytics_api(request):
+    """JSON version of collection_analytics; ``?report=month-end&month=YYYY-MM`` for the month-end report."""
+    if request.user.role != User.Role.ADMIN:
+        return JsonResponse({'error': 'Only administrators can view finance analytics.'}, status=403)
+
+    if request.GET.get('report') == 'month-end':
+        month = _month(request.GET.get('month')) or timezone.localdate().replace(day=1)
+        report = month_end_report(month)
+        _label_classes(report['classes'])
+        return JsonResponse(report)
+    query = _collection_query(request)
+    return JsonResponse({'group_by': query['group_by'], 'rows': _label_classes(collection_summary(**query))})
@@ -55,6 +55,7 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'core.middleware.ProfilingMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -67,7 +68,8 @@ ROOT_URLCONF = 'sms_project.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        # Django's backend plus render timing for core.middleware.ProfilingMiddleware.
+        'BACKEND': 'core.profiling.ProfilingDjangoTemplates',
         'DIRS': [BASE_DIR / 'templates'],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -90,12 +92,133 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        # Take the write lock when a transaction starts and wait for it, so
+        # concurrent payments queue up instead of failing with "database is
+        # locked" (SQLite ignores select_for_update()).
+        'OPTIONS': {
+            'transaction_mode': 'IMMEDIATE',
+            'timeout': 20,
+        },
+        # A file rather than the default shared in-memory database, whose
+        # table locks fail concurrent tests instead of waiting.
+        'TEST': {
+            'NAME': BASE_DIR / 'test_db.sqlite3',
+        },
     }
 }
 
 AUTH_USER_MODEL = 'core.User'
 
 
+# Cache
+# https://docs.djangoproject.com/en/6.0/topics/cache/
+# File-based so that management commands (e.g. warm_dashboard_cache) and the
+# web processes share entries; switch to Redis/Memcached in production.
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': BASE_DIR / '.django_cache',
+    }
+}
+# The test runner swaps in this cache and empties it before every test, so a
+# test run never reads or writes the entries above (see core.test_runner).
+TEST_CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'tests',
+    }
+}
+TEST_RUNNER = 'core.test_runner.TestRunner'
+
+# Maximum age, in seconds, of the cached admin dashboard counters.
+DASHBOARD_STATS_TTL = 300
+# Cached exam and class rankings are dropped on grade writes; this only
+# bounds staleness from writes that bypass signals.
+RANKINGS_CACHE_TTL = 24 * 60 * 60
+# Cached route manifests (stop -> students) are dropped on stop and allocation
+# writes; this only bounds staleness from renamed students.
+ROUTE_MANIFEST_CACHE_TTL = 24 * 60 * 60
+# Cached fleet cost analytics are dropped on fuel, maintenance and vehicle writes.
+FLEET_ANALYTICS_CACHE_TTL = 24 * 60 * 60
+
+
+# School
+# Printed at the top of report cards.
+SCHOOL_NAME = 'Global Talent School'
+
+
+# Academic year
+# Month (1-12) in which the academic year starts; years are labelled like
+# FeeStructure.academic_year, e.g. '2025-2026'.
+ACADEMIC_YEAR_START_MONTH = 4
+
+
+# Finance
+# Days between an invoice run and the due date of the invoices it issues.
+INVOICE_DUE_DAYS = 30
+# Card payments go through this gateway; the simulated one approves every
+# card except 4000 0000 0000 0002 and never contacts a real processor.
+PAYMENT_GATEWAY = 'finance.gateway.SimulatedGateway'
+# Aging buckets, in days overdue, of the dunning run (`manage.py send_dunning_notices`).
+# An overdue invoice is reminded about once on entering each bucket.
+DUNNING_BUCKETS = [0, 30, 60, 90]
+
+
+# Transport
+# Name of the school in the stop coordinates file read by `manage.py plan_routes`;
+# every planned route ends there.
+TRANSPORT_DEPOT = 'School'
+# Service schedule assumed by `manage.py forecast_maintenance` until a vehicle
+# has two services of its own, the window of fuel logs its daily distance is
+# measured over, and how many days ahead a due service is announced.
+MAINTENANCE_INTERVAL_DAYS = 180
+MAINTENANCE_INTERVAL_KM = 10000
+MAINTENANCE_RATE_WINDOW_DAYS = 90
+MAINTENANCE_ALERT_DAYS = 14
+
+
+# Timetable
+# Teaching days and the daily period grid used by the timetable statistics
+# and the timetable generator.
+TIMETABLE_SCHOOL_DAYS = ['MONDAY', 'TUESDAY', 'WEDNESDAY', 'THURSDAY', 'FRIDAY']
+TIMETABLE_PERIOD_TIMES = [
+    ('08:00', '08:45'),
+    ('08:45', '09:30'),
+    ('09:30', '10:15'),
+    ('10:30', '11:15'),
+    ('11:15', '12:00'),
+    ('12:45', '13:30'),
+    ('13:30', '14:15'),
+    ('14:15', '15:00'),
+]
+TIMETABLE_PERIODS_PER_DAY = len(TIMETABLE_PERIOD_TIMES)
+# Rooms the generator may allocate; leave empty to generate without rooms.
+TIMETABLE_ROOMS = []
+
+
+# Request profiling (core.middleware.ProfilingMiddleware)
+# Per-view timings are kept for the last PROFILING_BUFFER_SIZE requests of
+# each URL name and shown at /admin-performance/.
+PROFILING_ENABLED = True
+PROFILING_BUFFER_SIZE = 200
+# Maximum SQL queries per request, by URL name. Exceeding a budget logs a
+# warning, or raises QueryBudgetExceeded when QUERY_BUDGET_RAISE is set, as
+# the query budget tests in core.tests do with override_settings.
+QUERY_BUDGETS = {
+    'admin_dashboard': 10,
+    'students:dashboard': 12,
+    'students:grades': 10,
+    'staff:take_attendance': 12,
+    'staff:enter_marks': 12,
+    'academics:manage_timetable': 12,
+    'transport:dashboard': 18,
+    'transport:driver_dashboard': 10,
+    'transport:attendance': 10,
+}
+QUERY_BUDGET_RAISE = False
+
+
 # Password validation
 # https://docs.djangoproject.com/en/6.0/ref/settings/#auth-password-validators
 
@@ -148,14 +271,24 @@ LOGOUT_REDIRECT_URL = 'login'
 # Email Config
 # Email Config - Gmail SMTP
 # Make sure to generate an App Password if using 2-Step Verification
-EMAIL_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'
+# Set EMAIL_BACKEND=django.core.mail.backends.filebased.EmailBackend to write
+# messages to EMAIL_FILE_PATH instead of sending them (local development).
+EMAIL_BACKEND = os.environ.get('EMAIL_BACKEND', 'django.core.mail.backends.smtp.EmailBackend')
+EMAIL_FILE_PATH = BASE_DIR / 'sent_emails'
 EMAIL_HOST = 'smtp.gmail.com'
 EMAIL_PORT = 587
 EMAIL_USE_TLS = True
+EMAIL_TIMEOUT = 30
 EMAIL_HOST_USER = os.environ.get('EMAIL_USER', 'rajsumit1228@gmail.com')
 EMAIL_HOST_PASSWORD = os.environ.get('EMAIL_PASS', 'demyelyikggnimou')
 DEFAULT_FROM_EMAIL = EMAIL_HOST_USER
 
+# Outbound email queue (core.mail); delivered by `manage.py send_queued_mail`.
+OUTBOX_BATCH_SIZE = 50
+OUTBOX_MAX_ATTEMPTS = 5
+OUTBOX_RETRY_BASE_SECONDS = 60
+OUTBOX_LEASE_SECONDS = 600
+
 
 # Jazzmin Settings
 JAZZMIN_SETTINGS = {
@@ -1,11 +1,11 @@
 from django import forms
 from django.contrib import admin, messages
-from django.core.mail import send_mail
 from django.conf import settings
 from django.utils.crypto import get_random_string
 from django.utils.html import format_html
 from django.utils.safestring import mark_safe
 from .models import Staff, Leave, Payslip
+from core.mail import queue_mail
 from core.models import User
 
 class StaffForm(forms.ModelForm):
@@ -86,7 +86,7 @@ class StaffAdmin(admin.ModelAdmin):
             
             # Send Credentials
             try:
-                send_mail(
+                queue_mail(
                     'Your Staff Portal Credentials - SMS',
                     f'Dear {first_name},\n\n'
                     f'Welcome to School Management System!\n\n'
@@ -96,11 +96,10 @@ class StaffAdmin(admin.ModelAdmin):
                     f'Best Regards,\nSchool Administration',
                     settings.EMAIL_HOST_USER,
                     [email],
-                    fail_silently=False,
                 )
-                messages.success(request, f"Staff created and credentials sent to {email}")
+                messages.success(request, f"Staff created and credentials queued for {email}")
             except Exception as e:
-                messages.warning(request, f"Staff created but email failed: {e}")
+                messages.warning(request, f"Staff created but email could not be queued: {e}")
         else:
             # Update User
             user = obj.user
@@ -7,6 +7,8 @@ urlpatterns = [
     path('dashboard/', views.staff_dashboard, name='dashboard'),
     path('attendance/select/', views.select_attendance_class, name='select_attendance_class'),
     path('attendance/<int:class_id>/', views.take_attendance, name='take_attendance'),
+    path('attendance/roll-call/', views.attendance_roll_call, name='attendance_roll_call'),
+    path('attendance/<int:class_id>/heatmap/', views.attendance_heatmap, name='attendance_heatmap'),
     path('marks/select/', views.select_exam, name='select_exam'),
     path('marks/<int:exam_id>/', views.enter_marks, name='enter_marks'),
     path('timetable/', views.view_timetable, name='timetable'),
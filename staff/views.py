@@ -1,8 +1,19 @@
+import calendar
+import datetime
+import json
+import time
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
+from django.http import JsonResponse
+from django.utils import timezone
+from django.views.decorators.http import require_POST
 from .models import Staff, Leave, Payslip
-from academics.models import Class, Attendance, Subject, Timetable, Grade, Exam
+from academics.models import Class, Subject, Timetable, Grade, Exam
+from academics.attendance import parse_attendance_date, record_attendance, record_roll_call
+from academics.attendance_calendar import attendance_report, class_heatmap
+from academics.marks import import_marks, record_marks
+from academics.rankings import annotate_grades, exam_rankings
 from students.models import Student
 from core.models import User, Announcement
 
@@ -40,24 +51,71 @@ def select_attendance_class(request):
 @login_required
 def take_attendance(request, class_id):
     class_obj = get_object_or_404(Class, id=class_id)
-    students = Student.objects.filter(current_class=class_obj)
+    students = Student.objects.filter(current_class=class_obj).select_related('user')
     
     if request.method == 'POST':
-        date = request.POST.get('date')
-        for student in students:
-            status = request.POST.get(f'status_{student.id}')
-            remarks = request.POST.get(f'remarks_{student.id}', '')
-            Attendance.objects.create(
-                student=student, 
-                date=date, 
-                status=status,
-                remarks=remarks
-            )
-        messages.success(request, f"Attendance marked for {class_obj}")
+        records = {}
+        for student_id in students.values_list('id', flat=True):
+            status = request.POST.get(f'status_{student_id}')
+            if status:
+                records[student_id] = (status, request.POST.get(f'remarks_{student_id}', ''))
+        try:
+            created, updated = record_attendance(request.POST.get('date'), records)
+        except ValueError as e:
+            messages.error(request, str(e))
+            return redirect('staff:take_attendance', class_id=class_id)
+        messages.success(request, f"Attendance marked for {class_obj} ({created} new, {updated} updated)")
         return redirect('staff:dashboard')
     
     return render(request, 'staff/take_attendance.html', {'class': class_obj, 'students': students})
 
+@login_required
+def attendance_heatmap(request, class_id):
+    """JSON day-by-day attendance for a class month (?month=YYYY-MM, default this month)."""
+    if request.user.role not in [User.Role.TEACHER, User.Role.STAFF, User.Role.ADMIN]:
+        return JsonResponse({'error': 'Permission denied.'}, status=403)
+    class_obj = get_object_or_404(Class, id=class_id)
+    try:
+        year, month = (int(part) for part in request.GET.get('month', timezone.localdate().strftime('%Y-%m')).split('-'))
+        first_day = datetime.date(year, month, 1)
+    except ValueError:
+        return JsonResponse({'error': 'month must look like YYYY-MM.'}, status=400)
+    last_day = datetime.date(year, month, calendar.monthrange(year, month)[1])
+
+    student_ids = list(Student.objects.filter(current_class=class_obj).values_list('id', flat=True))
+    data = class_heatmap(student_ids, year, month)
+    report = attendance_report(student_ids, first_day, last_day)
+    data['class'] = str(class_obj)
+    data['students'] = {
+        student_id: {'days': days, **report[student_id]}
+        for student_id, days in data['students'].items()
+    }
+    return JsonResponse(data)
+
+@login_required
+@require_POST
+def attendance_roll_call(request):
+    """
+    JSON roll call for many classes in one request:
+    {"date": "YYYY-MM-DD", "classes": [{"class_id": 1, "records": [{"student_id": 5, "status": "PRESENT", "remarks": ""}]}]}
+    """
+    if request.user.role not in [User.Role.TEACHER, User.Role.STAFF, User.Role.ADMIN]:
+        return JsonResponse({'error': 'Permission denied.'}, status=403)
+    try:
+        payload = json.loads(request.body)
+        date = parse_attendance_date(payload.get('date'))
+        classes = {int(entry['class_id']): entry.get('records', []) for entry in payload['classes']}
+    except (ValueError, KeyError, TypeError, AttributeError) as e:
+        return JsonResponse({'error': f"Malformed roll call: {e}"}, status=400)
+
+    started = time.perf_counter()
+    results = record_roll_call(date, classes)
+    return JsonResponse({
+        'date': date.isoformat(),
+        'elapsed_ms': round((time.perf_counter() - started) * 1000, 2),
+        'classes': results,
+    })
+
 @login_required
 def select_exam(request):
     exams = Exam.objects.all().order_by('-date')
@@ -65,38 +123,39 @@ def select_exam(request):
 
 @login_required
 def enter_marks(request, exam_id):
-    exam = get_object_or_404(Exam, id=exam_id)
-    students = Student.objects.filter(current_class=exam.class_group)
+    exam = get_object_or_404(Exam.objects.select_related('subject', 'class_group'), id=exam_id)
+    students = Student.objects.filter(current_class=exam.class_group).select_related('user')
 
     if request.method == 'POST':
-        for student in students:
-            marks = request.POST.get(f'marks_{student.id}')
-            remarks = request.POST.get(f'remarks_{student.id}', '')
-            
-            if marks:
-                Grade.objects.update_or_create(
-                    student=student,
-                    exam=exam,
-                    defaults={'marks_obtained': marks, 'remarks': remarks}
-                )
+        try:
+            if request.FILES.get('marks_file'):
+                created, updated = import_marks(exam, request.FILES['marks_file'])
             else:
-                # If marks are cleared, remove the grade entry? 
-                # Or just skip. Let's skip for now to avoid accidental deletion, 
-                # but in full system might want to allow clearing.
-                pass
-                
-        messages.success(request, f"Marks updated for {exam}")
+                records = {}
+                for student_id in students.values_list('id', flat=True):
+                    marks = request.POST.get(f'marks_{student_id}')
+                    # Blank marks are skipped rather than deleting an existing grade.
+                    if marks:
+                        records[student_id] = (marks, request.POST.get(f'remarks_{student_id}', ''))
+                created, updated = record_marks(exam, records)
+        except ValueError as e:
+            messages.error(request, str(e))
+            return redirect('staff:enter_marks', exam_id=exam_id)
+
+        messages.success(request, f"Marks updated for {exam} ({created} new, {updated} updated)")
         return redirect('staff:dashboard')
 
     # Pre-fetch existing grades to display
-    existing_grades = Grade.objects.filter(exam=exam, student__in=students)
-    grade_map = {grade.student.id: grade for grade in existing_grades}
+    grades = annotate_grades(list(Grade.objects.filter(exam=exam)))
+    grade_map = {grade.student_id: grade for grade in grades}
     
     # Attach grade to student object temporarily for template
+    students = list(students)
     for student in students:
         student.current_grade = grade_map.get(student.id)
 
-    return render(request, 'staff/enter_marks.html', {'exam': exam, 'students': students})
+    context = {'exam': exam, 'students': students, 'stats': exam_rankings(exam.id)['stats']}
+    return render(request, 'staff/enter_marks.html', context)
 
 @login_required
 def view_timetable(request):
@@ -1,11 +1,13 @@
 from django import forms
 from django.contrib import admin, messages
-from django.core.mail import send_mail
-from django.conf import settings
+from django.shortcuts import redirect, render
+from django.urls import path
 from django.utils.crypto import get_random_string
 from django.utils.html import format_html
 from django.utils.safestring import mark_safe
-from .models import Student, Parent
+from .importer import credentials_email, import_students
+from .models import Student, Parent, StudentSummary
+from core.mail import queue_mail
 from core.models import User
 
 class StudentForm(forms.ModelForm):
@@ -37,6 +39,32 @@ class StudentAdmin(admin.ModelAdmin):
     search_fields = ('user__username', 'user__first_name', 'user__last_name', 'admission_number')
     list_filter = ('current_class',)
 
+    def get_urls(self):
+        return [
+            path('import/', self.admin_site.admin_view(self.import_view), name='students_student_import'),
+        ] + super().get_urls()
+
+    def import_view(self, request):
+        if not self.has_add_permission(request):
+            return redirect('admin:students_student_changelist')
+        context = dict(self.admin_site.each_context(request), title='Import students', opts=self.model._meta, errors=[])
+        if request.method == 'POST' and request.FILES.get('file'):
+            dry_run = bool(request.POST.get('dry_run'))
+            try:
+                result = import_students(request.FILES['file'], dry_run=dry_run)
+            except ValueError as e:
+                messages.error(request, str(e))
+            else:
+                context['errors'] = result['errors']
+                if result['errors']:
+                    messages.error(request, f"No students were created: {len(result['errors'])} row(s) need fixing.")
+                elif dry_run:
+                    messages.success(request, f"All {result['valid']} row(s) are valid.")
+                else:
+                    messages.success(request, f"Created {result['created']} student(s); credential emails are queued.")
+                    return redirect('admin:students_student_changelist')
+        return render(request, 'admin/students/student/import_students.html', context)
+
     def photo_preview(self, obj):
         if obj.photo:
             return format_html('<img src="{}" style="width:36px; height:36px; border-radius:50%; object-fit:cover;" />', obj.photo.url)
@@ -84,22 +112,10 @@ class StudentAdmin(admin.ModelAdmin):
             
             # Send Credentials via Email
             try:
-                send_mail(
-                    'Your Student Portal Credentials - SMS',
-                    f'Dear {first_name},\n\n'
-                    f'Welcome to School Management System!\n\n'
-                    f'Your account has been created. Please log in using the credentials below:\n\n'
-                    f'Username: {username}\n'
-                    f'Password: {password}\n\n'
-                    f'Please change your password after your first login.\n\n'
-                    f'Best Regards,\nSchool Administration',
-                    settings.EMAIL_HOST_USER, # From Settings
-                    [email],
-                    fail_silently=False,
-                )
-                messages.success(request, f"Student created and credentials sent to {email}")
+                queue_mail(*credentials_email(first_name, username, password, email))
+                messages.success(request, f"Student created and credentials queued for {email}")
             except Exception as e:
-                messages.warning(request, f"Student created but email failed: {e}")
+                messages.warning(request, f"Student created but email could not be queued: {e}")
                 
         else:
             # Update existing User
@@ -117,3 +133,10 @@ class StudentAdmin(admin.ModelAdmin):
 class ParentAdmin(admin.ModelAdmin):
     list_display = ('user', 'phone_number')
     search_fields = ('user__username', 'user__first_name', 'user__last_name', 'phone_number')
+
+@admin.register(StudentSummary)
+class StudentSummaryAdmin(admin.ModelAdmin):
+    list_display = ('student', 'present_count', 'absent_count', 'total_paid', 'fee_balance', 'updated_at')
+    list_select_related = ('student__user',)
+    search_fields = ('student__admission_number', 'student__user__username')
+    readonly_fields = [field.name for field in StudentSummary._meta.fields]
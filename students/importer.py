@@ -0,0 +1,219 @@
+"""
+Bulk student onboarding from a CSV or XLSX file.
+
+Rows are streamed and validated against a preloaded class map and the
+existing admission numbers, so validation costs a fixed number of queries
+whatever the file size. Valid rows are then created in one transaction:
+users and students are inserted with bulk_create in chunks, and credential
+emails are queued instead of sent inline. Passwords are hashed in-process
+unless ``workers`` asks for a process pool, which only the import_students
+command does; the admin import runs inside a web request.
+"""
+import csv
+import datetime
+import io
+from concurrent.futures import ProcessPoolExecutor
+
+import django
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.core.exceptions import ValidationError
+from django.core.validators import validate_email
+from django.db import transaction
+from django.utils.crypto import get_random_string
+from django.utils.dateparse import parse_date
+
+from academics.models import Class
+from core.mail import queue_mass_mail
+from core.models import User
+from .models import Student
+
+IMPORT_COLUMNS = ('admission_number', 'first_name', 'last_name', 'email', 'date_of_birth', 'address', 'class_name', 'section')
+REQUIRED_COLUMNS = ('admission_number', 'first_name', 'last_name', 'email', 'date_of_birth', 'class_name')
+
+# Below this many rows the process pool start-up costs more than it saves.
+POOL_THRESHOLD = 50
+
+
+def read_student_rows(upload):
+    """
+    Yield ``(line, row)`` pairs from an uploaded CSV or XLSX file, where
+    ``row`` maps each of IMPORT_COLUMNS to its cell. The first row must be a
+    header naming at least REQUIRED_COLUMNS.
+    """
+    name = (getattr(upload, 'name', '') or '').lower()
+    if name.endswith('.xlsx'):
+        try:
+            from openpyxl import load_workbook
+        except ImportError:
+            raise ValueError("XLSX uploads need the openpyxl package; upload a CSV file instead.")
+        sheet = load_workbook(upload, read_only=True, data_only=True).active
+        rows = sheet.iter_rows(values_only=True)
+    else:
+        rows = csv.reader(io.TextIOWrapper(upload, encoding='utf-8-sig'))
+
+    header = [str(cell or '').strip().lower() for cell in next(rows, [])]
+    missing = [column for column in REQUIRED_COLUMNS if column not in header]
+    if missing:
+        raise ValueError(f"Missing column(s): {', '.join(missing)}")
+    for line, row in enumerate(rows, start=2):
+        values = dict(zip(header, row))
+        if not any(values.values()):
+            continue
+        yield line, {column: values.get(column) for column in IMPORT_COLUMNS}
+
+
+def _text(value):
+    return str(value if value is not None else '').strip()
+
+
+def _date(value):
+    if isinstance(value, datetime.datetime):
+        return value.date()
+    if isinstance(value, datetime.date):
+        return value
+    try:
+        return parse_date(_text(value))
+    except ValueError:
+        return None
+
+
+def validate_rows(rows):
+    """
+    Validate streamed rows. Returns ``(records, errors)``: a list of cleaned
+    record dicts and a list of ``(line, message)`` pairs.
+    """
+    classes = {(name.lower(), section.lower()): pk for pk, name, section in Class.objects.values_list('pk', 'name', 'section')}
+    taken = set(Student.objects.values_list('admission_number', flat=True))
+    taken_usernames = set(User.objects.values_list('username', flat=True))
+    records, errors = [], []
+    for line, row in rows:
+        values = {column: _text(row[column]) for column in IMPORT_COLUMNS}
+        problems = [f"{column} is required" for column in REQUIRED_COLUMNS if not values[column]]
+        admission_number = values['admission_number']
+        username = admission_number.lower()
+        if admission_number and (admission_number in taken or username in taken_usernames):
+            problems.append(f"admission number {admission_number} already exists")
+        if values['email']:
+            try:
+                validate_email(values['email'])
+            except ValidationError:
+                problems.append(f"invalid email {values['email']!r}")
+        date_of_birth = _date(row['date_of_birth']) if values['date_of_birth'] else None
+        if values['date_of_birth'] and date_of_birth is None:
+            problems.append(f"invalid date_of_birth {values['date_of_birth']!r} (use YYYY-MM-DD)")
+        class_id = None
+        if values['class_name']:
+            class_id = classes.get((values['class_name'].lower(), values['section'].lower()))
+            if class_id is None:
+                problems.append(f"no class {values['class_name']} - {values['section'] or '(no section)'}")
+        if problems:
+            errors.append((line, '; '.join(problems)))
+            continue
+        taken.add(admission_number)
+        taken_usernames.add(username)
+        records.append({
+            'admission_number': admission_number,
+            'username': username,
+            'first_name': values['first_name'],
+            'last_name': values['last_name'],
+            'email': values['email'],
+            'date_of_birth': date_of_birth,
+            'address': values['address'],
+            'class_id': class_id,
+        })
+    return records, errors
+
+
+def credentials_email(first_name, username, password, email):
+    """The welcome email with a new student's login, as ``(subject, message, from_email, recipient_list)``."""
+    return (
+        'Your Student Portal Credentials - SMS',
+        f'Dear {first_name},\n\n'
+        f'Welcome to School Management System!\n\n'
+        f'Your account has been created. Please log in using the credentials below:\n\n'
+        f'Username: {username}\n'
+        f'Password: {password}\n\n'
+        f'Please change your password after your first login.\n\n'
+        f'Best Regards,\nSchool Administration',
+        settings.EMAIL_HOST_USER,
+        [email],
+    )
+
+
+def _setup_worker():
+    # Pool workers started with the "spawn" method have no configured Django.
+    django.setup()
+
+
+def hash_passwords(passwords, workers=1):
+    """Hash ``passwords`` with the configured hasher, in a pool of ``workers`` processes for large batches."""
+    if workers <= 1 or len(passwords) < POOL_THRESHOLD:
+        return [make_password(password) for password in passwords]
+    chunksize = max(len(passwords) // (workers * 4), 1)
+    with ProcessPoolExecutor(max_workers=workers, initializer=_setup_worker) as pool:
+        return list(pool.map(make_password, passwords, chunksize=chunksize))
+
+
+def create_students(records, chunk_size=500, workers=1):
+    """Create users and students for validated ``records``. Returns the new Student ids."""
+    passwords = [get_random_string(length=12) for _record in records]
+    hashes = hash_passwords(passwords, workers=workers)
+
+    student_ids = []
+    with transaction.atomic():
+        for start in range(0, len(records), chunk_size):
+            chunk = records[start:start + chunk_size]
+            User.objects.bulk_create([
+                User(
+                    username=record['username'],
+                    email=record['email'],
+                    password=password_hash,
+                    first_name=record['first_name'],
+                    last_name=record['last_name'],
+                    role=User.Role.STUDENT,
+                )
+                for record, password_hash in zip(chunk, hashes[start:start + chunk_size])
+            ])
+            # Not every backend returns primary keys from bulk_create, so look them up.
+            user_ids = dict(User.objects.filter(username__in=[record['username'] for record in chunk])
+                            .values_list('username', 'pk'))
+            Student.objects.bulk_create([
+                Student(
+                    user_id=user_ids[record['username']],
+                    admission_number=record['admission_number'],
+                    date_of_birth=record['date_of_birth'],
+                    address=record['address'],
+                    current_class_id=record['class_id'],
+                )
+                for record in chunk
+            ])
+            student_ids.extend(Student.objects.filter(admission_number__in=[record['admission_number'] for record in chunk])
+                               .values_list('pk', flat=True))
+
+        queue_mass_mail(credentials_email(record['first_name'], record['username'], password, record['email'])
+                        for record, password in zip(records, passwords))
+
+    # Bulk writes bypass the model signals, so refresh the derived data here.
+    from core.dashboard import invalidate_dashboard_stats
+    from finance.ledger import sync_charges
+    from .summary import refresh_summaries
+    sync_charges(student_ids)
+    refresh_summaries(student_ids)
+    invalidate_dashboard_stats()
+    return student_ids
+
+
+def import_students(upload, chunk_size=500, workers=1, dry_run=False):
+    """
+    Validate and import students from ``upload``.
+
+    Nothing is written if any row is invalid. Returns ``{'created', 'valid', 'errors'}``
+    where ``errors`` is a list of ``(line, message)`` pairs.
+    """
+    records, errors = validate_rows(read_student_rows(upload))
+    result = {'created': 0, 'valid': len(records), 'errors': errors}
+    if errors or dry_run:
+        return result
+    result['created'] = len(create_students(records, chunk_size=chunk_size, workers=workers))
+    return result
@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from students.report_card_export import classes_for, export_report_cards
+
+
+class Command(BaseCommand):
+    help = 'Renders PDF report cards for a class, a grade level or the whole school into a ZIP archive'
+
+    def add_arguments(self, parser):
+        parser.add_argument('output', help='Path of the ZIP archive to write')
+        parser.add_argument('--class', dest='class_ids', type=int, action='append', help='Class id (repeatable)')
+        parser.add_argument('--level', help='Grade level name, e.g. "Class 10" (all sections)')
+        parser.add_argument('--all', action='store_true', help='Every class in the school')
+        parser.add_argument('--workers', type=int, default=None, help='PDF rendering processes (default: CPU count)')
+
+    def handle(self, *args, **options):
+        if not (options['class_ids'] or options['level'] or options['all']):
+            raise CommandError('Choose --class, --level or --all')
+        classes = classes_for(options['class_ids'], options['level'])
+        if not classes:
+            raise CommandError('No matching classes')
+
+        def progress(class_group, class_cards, written):
+            self.stdout.write(f"{class_group}: {class_cards} cards ({written} written so far)")
+
+        stats = export_report_cards(classes, options['output'], workers=options['workers'], progress=progress)
+        rate = stats['cards'] / stats['elapsed'] if stats['elapsed'] else 0
+        self.stdout.write(self.style.SUCCESS(
+            f"Wrote {stats['cards']} report cards for {stats['classes']} classes to {options['output']} "
+            f"({stats['bytes'] / 1024:.0f} KB) in {stats['elapsed']:.2f}s, {rate:.0f} cards/s"
+        ))
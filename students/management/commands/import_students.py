@@ -0,0 +1,34 @@
+import os
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from students.importer import import_students
+
+
+class Command(BaseCommand):
+    help = 'Creates students and their user accounts from a CSV or XLSX file'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='CSV or XLSX file with a header row')
+        parser.add_argument('--chunk-size', type=int, default=500, help='Rows inserted per bulk_create')
+        parser.add_argument('--workers', type=int, default=None, help='Password hashing processes (default: CPU count)')
+        parser.add_argument('--dry-run', action='store_true', help='Validate the file without creating anything')
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        try:
+            with open(options['path'], 'rb') as upload:
+                result = import_students(upload, chunk_size=options['chunk_size'],
+                                         workers=options['workers'] or os.cpu_count() or 1, dry_run=options['dry_run'])
+        except (OSError, ValueError) as e:
+            raise CommandError(str(e))
+        for line, message in result['errors']:
+            self.stderr.write(f"Line {line}: {message}")
+        if result['errors']:
+            raise CommandError(f"{len(result['errors'])} invalid row(s); nothing was imported")
+        elapsed = time.perf_counter() - started
+        if options['dry_run']:
+            self.stdout.write(self.style.SUCCESS(f"All {result['valid']} row(s) are valid"))
+        else:
+            self.stdout.write(self.style.SUCCESS(f"Imported {result['created']} students in {elapsed:.2f}s"))
@@ -0,0 +1,18 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from students.summary import rebuild_all
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds the StudentSummary table from attendance, payment, fee and grade records'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='Students processed per batch')
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        written = rebuild_all(batch_size=options['batch_size'])
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {written} student summaries in {elapsed:.2f}s"))
@@ -24,3 +24,38 @@ class Parent(models.Model):
         return f"{self.user.first_name} {self.user.last_name}"
 
 
+
+class StudentSummary(models.Model):
+    """Denormalised per-student dashboard figures, maintained by students.summary."""
+    student = models.OneToOneField(Student, on_delete=models.CASCADE, primary_key=True, related_name='summary')
+    present_count = models.PositiveIntegerField(default=0)
+    absent_count = models.PositiveIntegerField(default=0)
+    late_count = models.PositiveIntegerField(default=0)
+    excused_count = models.PositiveIntegerField(default=0)
+    total_paid = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    total_fee = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    fee_balance = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    latest_grade = models.ForeignKey('academics.Grade', on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name_plural = "Student summaries"
+
+    @property
+    def total_attendance(self):
+        return self.present_count + self.absent_count + self.late_count + self.excused_count
+
+    @property
+    def attendance_percentage(self):
+        from academics.attendance_calendar import attendance_percentage
+        from academics.models import Attendance
+        percentage = attendance_percentage({
+            Attendance.Status.PRESENT: self.present_count,
+            Attendance.Status.ABSENT: self.absent_count,
+            Attendance.Status.LATE: self.late_count,
+            Attendance.Status.EXCUSED: self.excused_count,
+        })
+        return 0 if percentage is None else percentage
+
+    def __str__(self):
+        return f"Summary for {self.student}"
@@ -0,0 +1,144 @@
+"""
+Minimal PDF writer for report cards.
+
+Only what a tabular report needs: text in the standard Helvetica fonts,
+lines and shaded rectangles on A4 pages. It has no Django imports so that
+multiprocessing workers can render PDFs without setting Django up.
+"""
+import zlib
+
+PAGE_WIDTH, PAGE_HEIGHT = 595, 842  # A4 in points
+MARGIN = 50
+
+
+def _escape(value):
+    text = str(value).encode('cp1252', 'replace')
+    return text.replace(b'\\', b'\\\\').replace(b'(', b'\\(').replace(b')', b'\\)')
+
+
+def text_width(value, size):
+    """Approximate Helvetica width; good enough for centring and right alignment."""
+    return len(str(value)) * size * 0.5
+
+
+class PDFDocument:
+    def __init__(self):
+        self.pages = []
+
+    def new_page(self):
+        self.pages.append([])
+
+    def _op(self, data):
+        if not self.pages:
+            self.new_page()
+        self.pages[-1].append(data)
+
+    def text(self, x, y, value, size=10, bold=False):
+        font = b'F2' if bold else b'F1'
+        self._op(b'BT /%s %d Tf %.2f %.2f Td (%s) Tj ET' % (font, size, x, y, _escape(value)))
+
+    def centred_text(self, y, value, size=10, bold=False):
+        self.text((PAGE_WIDTH - text_width(value, size)) / 2, y, value, size=size, bold=bold)
+
+    def line(self, x1, y1, x2, y2, width=0.5):
+        self._op(b'%.2f w %.2f %.2f m %.2f %.2f l S' % (width, x1, y1, x2, y2))
+
+    def shade(self, x, y, width, height, gray=0.93):
+        self._op(b'%.2f g %.2f %.2f %.2f %.2f re f 0 g' % (gray, x, y, width, height))
+
+    def render(self):
+        """Return the document as PDF bytes."""
+        if not self.pages:
+            self.new_page()
+        objects = [
+            b'<< /Type /Catalog /Pages 2 0 R >>',
+            None,  # page tree, filled in below
+            b'<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>',
+            b'<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica-Bold /Encoding /WinAnsiEncoding >>',
+        ]
+        page_ids = []
+        for operations in self.pages:
+            stream = zlib.compress(b'\n'.join(operations))
+            objects.append(b'<< /Length %d /Filter /FlateDecode >>\nstream\n%s\nendstream' % (len(stream), stream))
+            objects.append(
+                b'<< /Type /Page /Parent 2 0 R /MediaBox [0 0 %d %d] /Contents %d 0 R '
+                b'/Resources << /Font << /F1 3 0 R /F2 4 0 R >> >> >>' % (PAGE_WIDTH, PAGE_HEIGHT, len(objects))
+            )
+            page_ids.append(len(objects))
+        kids = b' '.join(b'%d 0 R' % page_id for page_id in page_ids)
+        objects[1] = b'<< /Type /Pages /Kids [%s] /Count %d >>' % (kids, len(page_ids))
+
+        output = bytearray(b'%PDF-1.4\n')
+        offsets = []
+        for number, body in enumerate(objects, start=1):
+            offsets.append(len(output))
+            output += b'%d 0 obj\n%s\nendobj\n' % (number, body)
+        xref = len(output)
+        output += b'xref\n0 %d\n0000000000 65535 f \n' % (len(objects) + 1)
+        for offset in offsets:
+            output += b'%010d 00000 n \n' % offset
+        output += b'trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n' % (len(objects) + 1, xref)
+        return bytes(output)
+
+
+def _table(document, y, columns, rows, footer=None):
+    """Draw a table with a shaded header row; returns the y position below it."""
+    row_height = 18
+    width = PAGE_WIDTH - 2 * MARGIN
+    document.shade(MARGIN, y - row_height + 5, width, row_height)
+    for (x, title) in columns:
+        document.text(MARGIN + x, y - 8, title, size=9, bold=True)
+    y -= row_height
+    for index, row in enumerate(rows + ([footer] if footer else [])):
+        if y < MARGIN + row_height:
+            document.new_page()
+            y = PAGE_HEIGHT - MARGIN
+        is_footer = footer is not None and index == len(rows)
+        for (x, _title), value in zip(columns, row):
+            document.text(MARGIN + x, y - 8, value, size=9, bold=is_footer)
+        document.line(MARGIN, y - 13, MARGIN + width, y - 13, width=0.3)
+        y -= row_height
+    return y - 12
+
+
+def render_report_card(card):
+    """Render one report card, given as the plain dict built by students.report_card_export."""
+    document = PDFDocument()
+    document.new_page()
+    y = PAGE_HEIGHT - MARGIN
+    document.centred_text(y, card['school'], size=18, bold=True)
+    document.centred_text(y - 22, 'STUDENT PROGRESS REPORT', size=12)
+    document.centred_text(y - 38, card['academic_year'], size=10)
+    document.line(MARGIN, y - 48, PAGE_WIDTH - MARGIN, y - 48, width=1.5)
+
+    y -= 74
+    for label, value in (('Name', card['name']), ('Admission No', card['admission_number']), ('Class', card['class_name'])):
+        document.text(MARGIN, y, f'{label}:', size=10, bold=True)
+        document.text(MARGIN + 90, y, value, size=10)
+        y -= 16
+
+    y -= 10
+    if not card['grades']:
+        document.text(MARGIN, y, 'No grades recorded.', size=10)
+    else:
+        y = _table(
+            document, y,
+            [(6, 'Subject'), (140, 'Exam'), (270, 'Marks Obtained'), (360, 'Total Marks'), (440, 'Result')],
+            [[g['subject'], g['exam'], g['marks'], g['total'], g['remarks'][:20]] for g in card['grades']],
+        )
+        _table(
+            document, y,
+            [(6, 'Subject'), (180, 'Marks'), (300, 'Percentage'), (400, 'Rank in Class')],
+            [[s['subject'], f"{s['obtained']} / {s['total']}", f"{s['percentage']}%", s['rank'] or '-'] for s in card['subjects']],
+            footer=['Overall', f"{card['obtained']} / {card['total']}", f"{card['percentage']}%", card['rank']],
+        )
+
+    document.text(MARGIN, MARGIN, f"Generated on {card['generated_on']}", size=8)
+    document.text(MARGIN, MARGIN - 12, 'This is a computer-generated document and does not require a signature.', size=8)
+    return document.render()
+
+
+def render_named_report_card(item):
+    """Pool helper: ``(name, card)`` -> ``(name, pdf_bytes)``."""
+    name, card = item
+    return name, render_report_card(card)
@@ -0,0 +1,115 @@
+"""
+Batch PDF report card export.
+
+Classes are processed one at a time: each class's report cards are built
+with students.report_cards (one grade query per class), flattened to plain
+dicts, rendered to PDF in a multiprocessing pool and written into a ZIP
+archive as they come back, so only one class's PDFs are in memory at once.
+"""
+import multiprocessing
+import os
+import re
+import time
+import zipfile
+
+from django.utils import timezone
+
+from academics.models import Class
+from .pdf import render_named_report_card
+from .report_cards import report_cards_for_classes, report_heading
+
+
+def card_data(card, generated_on, heading):
+    """Plain, picklable view of a ReportCard for the PDF workers."""
+    return {
+        'school': heading['school_name'],
+        'academic_year': heading['academic_year'],
+        'generated_on': generated_on,
+        'name': card.student.user.get_full_name(),
+        'admission_number': card.student.admission_number,
+        'class_name': str(card.student.current_class or '-'),
+        'grades': [
+            {
+                'subject': grade.exam.subject.name,
+                'exam': grade.exam.name,
+                'marks': str(grade.marks_obtained),
+                'total': grade.exam.total_marks,
+                'remarks': grade.remarks,
+            }
+            for grade in card.grades
+        ],
+        'subjects': [
+            {
+                'subject': result.subject.name,
+                'obtained': str(result.obtained),
+                'total': result.total,
+                'percentage': str(result.percentage if result.percentage is not None else '-'),
+                'rank': result.rank,
+            }
+            for result in card.subject_results
+        ],
+        'obtained': str(card.obtained),
+        'total': card.total,
+        'percentage': str(card.percentage if card.percentage is not None else '-'),
+        'rank': f"{card.rank} of {card.class_size}" if card.rank else '-',
+    }
+
+
+def _safe(value):
+    return re.sub(r'[^A-Za-z0-9._-]+', '_', str(value)).strip('_') or 'unnamed'
+
+
+def export_report_cards(classes, path, workers=None, progress=None):
+    """
+    Write one PDF per student of ``classes`` into a ZIP archive at ``path``
+    (a file name or a writable binary file object).
+
+    ``progress``, if given, is called with ``(class_group, class_cards,
+    cards_written)`` after each class: the cards of that class and the
+    running total. ``workers=1`` renders in-process. Returns ``{'cards', 'classes', 'bytes', 'elapsed'}``.
+    """
+    workers = workers or os.cpu_count() or 1
+    generated_on = timezone.localdate().strftime('%B %d, %Y')
+    heading = report_heading()
+    started = time.perf_counter()
+    cards_written = 0
+    classes = list(classes)
+
+    # Workers only run students.pdf, which needs no Django or database.
+    pool = multiprocessing.Pool(workers) if workers > 1 else None
+    try:
+        with zipfile.ZipFile(path, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+            for class_group in classes:
+                folder = _safe(class_group)
+                items = [
+                    (f"{folder}/{_safe(card.student.admission_number)}.pdf", card_data(card, generated_on, heading))
+                    for card in report_cards_for_classes([class_group.pk])
+                ]
+                results = pool.imap(render_named_report_card, items, chunksize=8) if pool else map(render_named_report_card, items)
+                for name, pdf in results:
+                    archive.writestr(name, pdf)
+                cards_written += len(items)
+                if progress:
+                    progress(class_group, len(items), cards_written)
+            size = sum(info.compress_size for info in archive.infolist())
+    finally:
+        if pool:
+            pool.close()
+            pool.join()
+
+    return {
+        'cards': cards_written,
+        'classes': len(classes),
+        'bytes': size,
+        'elapsed': time.perf_counter() - started,
+    }
+
+
+def classes_for(class_ids=None, level=None):
+    """Classes selected by id or grade level name; every class when neither is given."""
+    classes = Class.objects.order_by('name', 'section')
+    if class_ids:
+        classes = classes.filter(pk__in=class_ids)
+    if level:
+        classes = classes.filter(name=level)
+    return list(classes)
@@ -0,0 +1,123 @@
+"""
+Report card data for one student, a class or a whole grade level.
+
+Grades are loaded with their exam and subject in a single query for every
+requested class, then per-subject totals, percentages and in-class ranks
+are computed in Python. Overall and per-subject ranks within the class come
+from the cached class rankings (academics.rankings.class_rankings).
+"""
+from decimal import Decimal
+
+from django.conf import settings
+
+from academics.models import Grade
+from academics.rankings import class_rankings_many
+from core.utils import academic_year_for
+from .models import Student
+
+HUNDRED = Decimal('100')
+
+
+def report_heading():
+    """School name and academic year printed at the top of every report card."""
+    return {'school_name': settings.SCHOOL_NAME, 'academic_year': f"Academic Year {academic_year_for()}"}
+
+
+def _percentage(obtained, total):
+    return (obtained / total * HUNDRED).quantize(Decimal('0.01')) if total else None
+
+
+class SubjectResult:
+    def __init__(self, subject):
+        self.subject = subject
+        self.grades = []
+        self.obtained = Decimal('0')
+        self.total = 0
+        self.rank = None
+        self.percentile = None
+
+    @property
+    def percentage(self):
+        return _percentage(self.obtained, self.total)
+
+
+class ReportCard:
+    def __init__(self, student):
+        self.student = student
+        self.grades = []
+        self.subjects = {}
+        self.rank = None
+        self.percentile = None
+        self.class_size = 0
+        self.class_stats = None
+
+    def add(self, grade):
+        grade.percentage = _percentage(grade.marks_obtained, grade.exam.total_marks)
+        self.grades.append(grade)
+        subject = grade.exam.subject
+        result = self.subjects.get(subject.id)
+        if result is None:
+            result = self.subjects[subject.id] = SubjectResult(subject)
+        result.grades.append(grade)
+        result.obtained += grade.marks_obtained
+        result.total += grade.exam.total_marks
+
+    @property
+    def subject_results(self):
+        return sorted(self.subjects.values(), key=lambda result: result.subject.name)
+
+    @property
+    def obtained(self):
+        return sum((result.obtained for result in self.subjects.values()), Decimal('0'))
+
+    @property
+    def total(self):
+        return sum(result.total for result in self.subjects.values())
+
+    @property
+    def percentage(self):
+        return _percentage(self.obtained, self.total)
+
+
+def build_report_cards(students, grades):
+    """
+    Build one :class:`ReportCard` per student from already-loaded ``grades``
+    (with ``exam__subject`` selected), with ranks from their class rankings.
+    """
+    cards = {student.id: ReportCard(student) for student in students}
+    for grade in grades:
+        card = cards.get(grade.student_id)
+        if card is not None:
+            card.add(grade)
+
+    rankings = class_rankings_many({student.current_class_id for student in students} - {None})
+    for card in cards.values():
+        ranking = rankings.get(card.student.current_class_id)
+        if ranking is None:
+            continue
+        entry = ranking['students'].get(card.student.id, {})
+        card.rank, card.percentile = entry.get('rank'), entry.get('percentile')
+        card.class_size = ranking['stats']['count']
+        card.class_stats = ranking['stats']
+        for subject_id, result in card.subjects.items():
+            entry = ranking['subjects'].get(subject_id, {'students': {}})['students'].get(card.student.id, {})
+            result.rank, result.percentile = entry.get('rank'), entry.get('percentile')
+    return list(cards.values())
+
+
+def _grades(**filters):
+    return (Grade.objects.filter(**filters).select_related('exam__subject')
+            .order_by('exam__subject__name', 'exam__date', 'exam_id'))
+
+
+def report_cards_for_classes(class_ids):
+    """Report cards for every student in ``class_ids``, ordered by class then name (two queries)."""
+    students = list(Student.objects.filter(current_class_id__in=class_ids)
+                    .select_related('user', 'current_class')
+                    .order_by('current_class__name', 'current_class__section', 'user__first_name', 'user__last_name'))
+    return build_report_cards(students, _grades(student__current_class_id__in=class_ids))
+
+
+def student_report_card(student):
+    """The report card of one student: their own grades plus the cached standing in their class."""
+    return build_report_cards([student], _grades(student=student))[0]
@@ -0,0 +1,41 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from core.models import User
+from core.utils import cascades_from
+from . import summary
+from .models import Student
+
+
+@receiver(post_save, sender='academics.Attendance')
+def attendance_saved(sender, instance, raw=False, **kwargs):
+    if not raw:
+        summary.refresh_summaries([instance.student_id], parts=(summary.ATTENDANCE,))
+
+
+@receiver(post_delete, sender='academics.Attendance')
+def attendance_deleted(sender, instance, origin=None, **kwargs):
+    # Nothing to refresh when the student goes too; never recreate its row here.
+    if not cascades_from(origin, Student, User):
+        summary.refresh_summaries([instance.student_id], parts=(summary.ATTENDANCE,), create=False)
+
+
+@receiver(post_save, sender='academics.Grade')
+def grade_saved(sender, instance, raw=False, **kwargs):
+    if not raw:
+        summary.refresh_summaries([instance.student_id], parts=(summary.GRADES,))
+
+
+@receiver(post_delete, sender='academics.Grade')
+def grade_deleted(sender, instance, origin=None, **kwargs):
+    if not cascades_from(origin, Student, User):
+        summary.refresh_summaries([instance.student_id], parts=(summary.GRADES,), create=False)
+
+
+@receiver(post_save, sender=Student)
+def student_saved(sender, instance, created, raw=False, **kwargs):
+    # A new student gets a full row; fee changes arrive through finance.signals.
+    if raw:
+        return
+    if created:
+        summary.refresh_summaries([instance.pk])
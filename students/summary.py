@@ -0,0 +1,164 @@
+"""
+Maintenance of the StudentSummary read model.
+
+Every refresh works on a batch of student ids and costs one grouped query per
+part being refreshed, so signal handlers can refresh a single student and the
+rebuild command can refresh the whole school with the same code.
+"""
+from django.db import transaction
+from django.db.models import Count, OuterRef, Subquery, Sum
+from django.utils import timezone
+
+from academics.models import Attendance, AttendanceArchive, Grade
+from finance.models import FeeLedger
+from .models import Student, StudentSummary
+
+ATTENDANCE = 'attendance'
+PAYMENTS = 'payments'
+FEES = 'fees'
+GRADES = 'grades'
+ALL_PARTS = (ATTENDANCE, PAYMENTS, FEES, GRADES)
+
+STATUS_FIELDS = {
+    Attendance.Status.PRESENT: 'present_count',
+    Attendance.Status.ABSENT: 'absent_count',
+    Attendance.Status.LATE: 'late_count',
+    Attendance.Status.EXCUSED: 'excused_count',
+}
+
+PART_FIELDS = {
+    ATTENDANCE: list(STATUS_FIELDS.values()),
+    PAYMENTS: ['total_paid', 'fee_balance'],
+    FEES: ['total_fee', 'fee_balance'],
+    GRADES: ['latest_grade'],
+}
+
+
+def _attendance_counts(student_ids):
+    """Live rows plus the archived closed years (see academics.archive)."""
+    counts = {}
+    rows = (Attendance.objects.filter(student_id__in=student_ids)
+            .values('student_id', 'status').annotate(n=Count('id')).order_by())
+    for row in rows:
+        counts.setdefault(row['student_id'], {})[row['status']] = row['n']
+    archived = (AttendanceArchive.objects.filter(student_id__in=student_ids)
+                .values('student_id').annotate(**{field: Sum(field) for field in STATUS_FIELDS.values()}).order_by())
+    for row in archived:
+        student_counts = counts.setdefault(row['student_id'], {})
+        for status, field in STATUS_FIELDS.items():
+            student_counts[status] = student_counts.get(status, 0) + row[field]
+    return counts
+
+
+def _payment_totals(student_ids):
+    """Paid across every academic year, from the fee ledgers (see finance.ledger)."""
+    rows = (FeeLedger.objects.filter(student_id__in=student_ids)
+            .values('student_id').annotate(total=Sum('total_paid')).order_by())
+    return {row['student_id']: row['total'] for row in rows}
+
+
+def _fee_totals(student_ids):
+    """Charged across every academic year, from the fee ledgers."""
+    rows = (FeeLedger.objects.filter(student_id__in=student_ids)
+            .values('student_id').annotate(total=Sum('total_charged')).order_by())
+    return {row['student_id']: row['total'] for row in rows}
+
+
+def _latest_grades(student_ids):
+    latest = Grade.objects.filter(student=OuterRef('pk')).order_by('-exam__date', '-pk').values('pk')[:1]
+    return dict(Student.objects.filter(pk__in=student_ids)
+                .annotate(latest_grade_id=Subquery(latest))
+                .values_list('pk', 'latest_grade_id'))
+
+
+def _apply(summary, part, data):
+    sid = summary.student_id
+    if part == ATTENDANCE:
+        counts = data.get(sid, {})
+        for status, field in STATUS_FIELDS.items():
+            setattr(summary, field, counts.get(status, 0))
+    elif part == PAYMENTS:
+        summary.total_paid = data.get(sid) or 0
+    elif part == FEES:
+        summary.total_fee = data.get(sid, 0)
+    elif part == GRADES:
+        summary.latest_grade_id = data.get(sid)
+
+
+def _fill(summary, parts, data):
+    for part in parts:
+        _apply(summary, part, data[part])
+    summary.fee_balance = summary.total_fee - summary.total_paid
+    # bulk_update() skips auto_now, so stamp the row ourselves.
+    summary.updated_at = timezone.now()
+
+
+def _collect(student_ids, parts):
+    loaders = {
+        ATTENDANCE: _attendance_counts,
+        PAYMENTS: _payment_totals,
+        FEES: _fee_totals,
+        GRADES: _latest_grades,
+    }
+    return {part: loaders[part](student_ids) for part in parts}
+
+
+def refresh_summaries(student_ids, parts=ALL_PARTS, create=True):
+    """
+    Recompute the given parts of the summary rows for ``student_ids``, creating
+    missing rows unless ``create`` is False. Delete handlers pass False: the
+    student may be going away in the same cascade, and a row inserted for it
+    would break the delete.
+    """
+    student_ids = list(set(student_ids))
+    if not student_ids:
+        return
+    data = _collect(student_ids, parts)
+    fields = {'updated_at'}
+    for part in parts:
+        fields.update(PART_FIELDS[part])
+
+    with transaction.atomic():
+        summaries = {s.student_id: s for s in StudentSummary.objects.filter(student_id__in=student_ids)}
+        missing = [sid for sid in student_ids if sid not in summaries]
+        if missing and create:
+            # New rows need every part, not just the ones that triggered the refresh.
+            existing_students = Student.objects.filter(pk__in=missing).values_list('pk', flat=True)
+            new_rows = [StudentSummary(student_id=sid) for sid in existing_students]
+            full = _collect([row.student_id for row in new_rows], ALL_PARTS)
+            for row in new_rows:
+                _fill(row, ALL_PARTS, full)
+            StudentSummary.objects.bulk_create(new_rows, ignore_conflicts=True)
+
+        for summary in summaries.values():
+            _fill(summary, parts, data)
+        StudentSummary.objects.bulk_update(summaries.values(), list(fields), batch_size=500)
+
+
+def rebuild_all(batch_size=1000):
+    """Drop and recreate every summary row. Returns the number of rows written."""
+    student_ids = list(Student.objects.values_list('pk', flat=True))
+    written = 0
+    with transaction.atomic():
+        StudentSummary.objects.all().delete()
+        for start in range(0, len(student_ids), batch_size):
+            chunk = student_ids[start:start + batch_size]
+            data = _collect(chunk, ALL_PARTS)
+            rows = []
+            for sid in chunk:
+                row = StudentSummary(student_id=sid)
+                _fill(row, ALL_PARTS, data)
+                rows.append(row)
+            StudentSummary.objects.bulk_create(rows)
+            written += len(rows)
+    return written
+
+
+def get_summary(student):
+    """Return the student's summary row, building it on first access."""
+    queryset = StudentSummary.objects.select_related('latest_grade__exam__subject')
+    try:
+        return queryset.get(student=student)
+    except StudentSummary.DoesNotExist:
+        refresh_summaries([student.pk])
+        return queryset.get(student=student)
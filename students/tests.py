@@ -1,3 +1,188 @@
-from django.test import TestCase
+import datetime
+import io
+import zipfile
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from academics.archive import archive_year
+from academics.models import Attendance, Class, Exam, Grade, Subject
+from core.models import OutboundEmail, User
+from core.utils import academic_year_bounds, academic_year_for
+from finance.models import FeeStructure, Payment
+from .models import Student, StudentSummary
+from .report_card_export import export_report_cards
+from .importer import credentials_email
+from .report_cards import report_cards_for_classes, student_report_card
+from .summary import get_summary, rebuild_all
+
+
+def make_student(number, school_class=None):
+    user = User.objects.create_user(f'student{number}', password='x', role=User.Role.STUDENT,
+                                    first_name=f'Student{number}', last_name='Test')
+    return Student.objects.create(user=user, admission_number=f'ADM{number:04d}',
+                                  date_of_birth=datetime.date(2015, 1, 1), address='Somewhere',
+                                  current_class=school_class)
+
+
+class StudentSummaryTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.school_class = Class.objects.create(name='Class 1', section='A')
+        cls.subject = Subject.objects.create(name='Maths', code='M1')
+        cls.exam = Exam.objects.create(name='Mid term', date=datetime.date(2026, 3, 1), subject=cls.subject,
+                                       class_group=cls.school_class, total_marks=100)
+        FeeStructure.objects.create(class_level=cls.school_class, tuition_fee=1000, other_fees=100,
+                                    academic_year=academic_year_for())
+
+    def setUp(self):
+        self.student = make_student(1, self.school_class)
+
+    def _record_history(self, student):
+        Attendance.objects.create(student=student, date=datetime.date(2026, 3, 2), status=Attendance.Status.PRESENT)
+        Attendance.objects.create(student=student, date=datetime.date(2026, 3, 3), status=Attendance.Status.ABSENT)
+        Grade.objects.create(student=student, exam=self.exam, marks_obtained=80)
+        Payment.objects.create(student=student, amount_paid=250, payment_date=datetime.date(2026, 3, 4),
+                               payment_method='Cash')
+
+    def test_signals_keep_summary_current(self):
+        self._record_history(self.student)
+        summary = get_summary(self.student)
+        self.assertEqual((summary.present_count, summary.absent_count), (1, 1))
+        self.assertEqual(summary.latest_grade.marks_obtained, 80)
+        self.assertEqual(summary.total_paid, Decimal('250.00'))
+
+        Attendance.objects.filter(student=self.student, status=Attendance.Status.ABSENT).get().delete()
+        summary.refresh_from_db()
+        self.assertEqual((summary.present_count, summary.absent_count), (1, 0))
+
+    def test_rebuild_matches_signals(self):
+        self._record_history(self.student)
+        expected = StudentSummary.objects.values().get(student=self.student)
+        rebuild_all()
+        rebuilt = StudentSummary.objects.values().get(student=self.student)
+        expected.pop('updated_at'), rebuilt.pop('updated_at')
+        self.assertEqual(rebuilt, expected)
+
+    def test_deleting_record_does_not_create_summary(self):
+        Attendance.objects.create(student=self.student, date=datetime.date(2026, 3, 2),
+                                  status=Attendance.Status.PRESENT)
+        StudentSummary.objects.filter(student=self.student).delete()
+        Attendance.objects.get(student=self.student).delete()
+        self.assertFalse(StudentSummary.objects.filter(student=self.student).exists())
+
+
+    def test_delete_student_with_history(self):
+        self._record_history(self.student)
+        other = make_student(2, self.school_class)
+        self._record_history(other)
+
+        self.student.delete()
+        connection.check_constraints()
+        self.assertFalse(StudentSummary.objects.filter(student_id=self.student.pk).exists())
+        self.assertEqual(get_summary(other).present_count, 1)
+
+    def test_delete_user_of_student_with_history(self):
+        self._record_history(self.student)
+        self.student.user.delete()
+        connection.check_constraints()
+        self.assertFalse(StudentSummary.objects.exists())
+
+class RankingTests(TestCase):
+    def setUp(self):
+        self.school_class = Class.objects.create(name='Class 1', section='A')
+        subject = Subject.objects.create(name='Maths', code='M1')
+        exam = Exam.objects.create(name='Mid term', date=datetime.date(2026, 3, 1), subject=subject,
+                                   class_group=self.school_class, total_marks=100)
+        self.students = [make_student(number, self.school_class) for number in range(1, 5)]
+        for student, marks in zip(self.students, (90, 80, 80, 70)):
+            Grade.objects.create(student=student, exam=exam, marks_obtained=marks)
+
+    def test_report_card_and_grades_page_agree(self):
+        cards = {card.student.pk: card for card in report_cards_for_classes([self.school_class.pk])}
+        self.assertEqual([cards[student.pk].rank for student in self.students], [1, 2, 2, 3])
+
+        for card in cards.values():
+            self.client.force_login(card.student.user)
+            response = self.client.get(reverse('students:grades'))
+            self.assertEqual(response.context['card'].rank, card.rank)
+            self.assertEqual(response.context['grades'][0].exam_rank, card.rank)
+
+    def test_student_card_reads_cached_class_rankings(self):
+        student_report_card(self.students[0])
+        # Only the student's own grades; ranks and statistics come from the cache.
+        with self.assertNumQueries(1):
+            card = student_report_card(self.students[3])
+        self.assertEqual((card.rank, card.class_size, card.percentile), (3, 4, 12.5))
+        self.assertEqual(card.class_stats['mean'], 80.0)
+        self.assertEqual(card.subject_results[0].rank, 3)
+
+
+    @override_settings(SCHOOL_NAME='Riverside School')
+    def test_report_card_heading(self):
+        self.client.force_login(self.students[0].user)
+        response = self.client.get(reverse('students:report_card'))
+        self.assertContains(response, 'Riverside School')
+        self.assertContains(response, f"Academic Year {academic_year_for()}")
+
+    def test_export_in_process(self):
+        other_class = Class.objects.create(name='Class 2', section='A')
+        make_student(5, other_class)
+        calls = []
+        archive = io.BytesIO()
+        stats = export_report_cards([self.school_class, other_class], archive, workers=1,
+                                    progress=lambda class_group, cards, total: calls.append((class_group, cards, total)))
+        self.assertEqual(stats['cards'], 5)
+        self.assertEqual(calls, [(self.school_class, 4, 4), (other_class, 1, 5)])
+        with zipfile.ZipFile(archive) as result:
+            self.assertEqual(len(result.namelist()), 5)
+
+class AttendancePageTests(TestCase):
+    def test_archived_years_are_shown(self):
+        student = make_student(1)
+        this_year_start = academic_year_bounds(academic_year_for())[0]
+        last_year_start = this_year_start.replace(year=this_year_start.year - 1)
+        last_year = academic_year_for(last_year_start)
+        statuses = [Attendance.Status.PRESENT, Attendance.Status.PRESENT, Attendance.Status.ABSENT]
+        for days, status in enumerate(statuses):
+            Attendance.objects.create(student=student, date=last_year_start + datetime.timedelta(days=days),
+                                      status=status)
+        Attendance.objects.create(student=student, date=this_year_start, status=Attendance.Status.LATE)
+        archive_year(last_year)
+
+        self.client.force_login(student.user)
+        response = self.client.get(reverse('students:attendance'))
+        self.assertEqual([record.status for record in response.context['attendance_records']],
+                         [Attendance.Status.LATE])
+        self.assertEqual([(archive.academic_year, archive.present_count, archive.absent_count)
+                          for archive in response.context['archives']], [(last_year, 2, 1)])
+        self.assertContains(response, last_year)
+
+
+class StudentImportTests(TestCase):
+    CSV = (b'admission_number,first_name,last_name,email,date_of_birth,class_name,section\n'
+           b'A100,Asha,Rao,asha@example.com,2015-04-01,Class 1,A\n'
+           b'A101,Ravi,Rao,ravi@example.com,2015-05-01,Class 1,A\n')
+
+    def setUp(self):
+        Class.objects.create(name='Class 1', section='A')
+        self.client.force_login(User.objects.create_superuser('admin', password='x', role=User.Role.ADMIN))
+
+    @mock.patch('students.importer.POOL_THRESHOLD', 1)
+    @mock.patch('students.importer.ProcessPoolExecutor')
+    def test_admin_import_runs_in_process(self, pool):
+        response = self.client.post(reverse('admin:students_student_import'),
+                                    {'file': SimpleUploadedFile('students.csv', self.CSV)})
+        self.assertRedirects(response, reverse('admin:students_student_changelist'))
+        pool.assert_not_called()
+        self.assertEqual(sorted(Student.objects.values_list('admission_number', flat=True)), ['A100', 'A101'])
+        self.assertTrue(User.objects.get(username='a100').has_usable_password())
+
+        email = OutboundEmail.objects.get(recipients='asha@example.com')
+        password = email.body.split('Password: ')[1].split('\n')[0]
+        self.assertEqual((email.subject, email.body), credentials_email('Asha', 'a100', password, '')[:2])
+        self.assertTrue(User.objects.get(username='a100').check_password(password))
@@ -11,5 +11,6 @@ urlpatterns = [
     path('homework/', views.student_homework, name='homework'),
     path('timetable/', views.student_timetable, name='timetable'),
     path('report-card/', views.download_report_card, name='report_card'),
+    path('report-cards/', views.class_report_cards, name='class_report_cards'),
     path('profile/', views.student_profile, name='profile'),
 ]
@@ -1,8 +1,13 @@
+from decimal import Decimal
+
 from django.shortcuts import render, redirect
 from django.contrib.auth.decorators import login_required
 from .models import Student
-from academics.models import Attendance, Grade, Homework
-from finance.models import Payment, FeeStructure
+from .report_cards import report_cards_for_classes, report_heading, student_report_card
+from .summary import get_summary
+from academics.models import Attendance, Class, Homework
+from academics.rankings import annotate_grades
+from finance.models import Payment
 from core.models import Announcement, User
 from django.template.loader import render_to_string
 from django.http import HttpResponse
@@ -19,34 +24,18 @@ def student_dashboard(request):
         return render(request, 'students/no_profile.html')
     
     announcements = Announcement.objects.filter(target_role=User.Role.STUDENT).order_by('-date_posted')[:5]
-    homeworks = Homework.objects.filter(class_group=student.current_class).order_by('-due_date')[:5]
-
-    # Calculate Attendance Percentage
-    total_attendance = Attendance.objects.filter(student=student).count()
-    present_count = Attendance.objects.filter(student=student, status=Attendance.Status.PRESENT).count()
-    attendance_percentage = (present_count / total_attendance * 100) if total_attendance > 0 else 0
-
-    # Calculate Fee Balance
-    payments = Payment.objects.filter(student=student)
-    total_paid = sum(p.amount_paid for p in payments)
-    try:
-        fee_structure = FeeStructure.objects.get(class_level=student.current_class)
-        total_fee = fee_structure.total_fee()
-        fee_balance = total_fee - total_paid
-    except FeeStructure.DoesNotExist:
-        fee_balance = 0
-        total_fee = 0
+    homeworks = list(Homework.objects.filter(class_group=student.current_class).select_related('subject')
+                     .order_by('-due_date')[:5])
 
-    # Get Latest Grade
-    latest_grade = Grade.objects.filter(student=student).order_by('-exam__date').first()
+    summary = get_summary(student)
 
     context = {
         'student': student,
         'announcements': announcements,
         'homeworks': homeworks,
-        'attendance_percentage': round(attendance_percentage, 1),
-        'fee_balance': fee_balance,
-        'latest_grade': latest_grade,
+        'attendance_percentage': summary.attendance_percentage,
+        'fee_balance': summary.fee_balance,
+        'latest_grade': summary.latest_grade,
     }
     return render(request, 'students/dashboard.html', context)
 
@@ -58,7 +47,10 @@ def student_attendance(request):
         return redirect('student_dashboard')
         
     attendance_records = Attendance.objects.filter(student=student).order_by('-date')
-    return render(request, 'students/attendance.html', {'attendance_records': attendance_records})
+    # Closed years live on as per-year totals once archive_attendance has run.
+    archives = student.attendance_archives.order_by('-academic_year')
+    return render(request, 'students/attendance.html', {'attendance_records': attendance_records,
+                                                        'archives': archives})
 
 @login_required
 def student_grades(request):
@@ -67,8 +59,9 @@ def student_grades(request):
     except Student.DoesNotExist:
         return redirect('student_dashboard')
         
-    grades = Grade.objects.filter(student=student)
-    return render(request, 'students/grades.html', {'grades': grades})
+    card = student_report_card(student)
+    annotate_grades(card.grades)
+    return render(request, 'students/grades.html', {'grades': card.grades, 'card': card})
 
 @login_required
 def student_fees(request):
@@ -77,24 +70,19 @@ def student_fees(request):
     except Student.DoesNotExist:
         return redirect('student_dashboard')
         
-    payments = Payment.objects.filter(student=student)
-    try:
-        fee_structure = FeeStructure.objects.get(class_level=student.current_class)
-        total_fee = fee_structure.total_fee()
-    except FeeStructure.DoesNotExist:
-        total_fee = 0
-        fee_structure = None
-
-    total_paid = sum(p.amount_paid for p in payments)
+    payments = Payment.objects.filter(student=student).order_by('-payment_date', '-pk')
+    ledgers = list(student.fee_ledgers.order_by('-academic_year'))
+    total_fee = sum((ledger.total_charged for ledger in ledgers), Decimal('0.00'))
+    total_paid = sum((ledger.total_paid for ledger in ledgers), Decimal('0.00'))
     balance = total_fee - total_paid
 
     context = {
         'student': student,
-        'fee_structure': fee_structure,
         'payments': payments,
         'total_fee': total_fee,
         'total_paid': total_paid,
         'balance': balance,
+        'ledgers': ledgers,
     }
     return render(request, 'students/fees.html', context)
 
@@ -115,12 +103,35 @@ def download_report_card(request):
     except Student.DoesNotExist:
         return redirect('student_dashboard')
         
-    grades = Grade.objects.filter(student=student)
+    card = student_report_card(student)
     
     # Simple HTML Report Generation for now, ensuring PDF export libraries are available later is better
     # But user asked for PDF/Excel. We will simulate a Print-friendly page which can be saved as PDF.
     
-    content = render_to_string('students/report_card_print.html', {'student': student, 'grades': grades})
+    context = {'student': student, 'card': card, **report_heading()}
+    content = render_to_string('students/report_card_print.html', context)
+    return HttpResponse(content)
+
+@login_required
+def class_report_cards(request):
+    """Printable report cards for a class (?class=<id>, repeatable) or a grade level (?level=<name>)."""
+    if request.user.role not in [User.Role.ADMIN, User.Role.TEACHER, User.Role.STAFF]:
+        return render(request, 'core/access_denied.html')
+
+    classes = Class.objects.all()
+    if request.GET.get('level'):
+        classes = classes.filter(name=request.GET['level'])
+    else:
+        class_ids = [value for value in request.GET.getlist('class') if value.isdigit()]
+        classes = classes.filter(pk__in=class_ids)
+    classes = list(classes.order_by('name', 'section'))
+    if not classes:
+        return HttpResponse("Choose a class (?class=<id>) or a grade level (?level=<name>).", status=400)
+
+    cards = report_cards_for_classes([class_group.pk for class_group in classes])
+    title = request.GET.get('level') or ', '.join(str(class_group) for class_group in classes)
+    context = {'cards': cards, 'title': title, **report_heading()}
+    content = render_to_string('students/report_cards_print.html', context)
     return HttpResponse(content)
 
 from academics.models import Timetable
@@ -158,31 +169,17 @@ def student_profile(request):
     except Student.DoesNotExist:
         return render(request, 'students/no_profile.html')
 
-    # Attendance stats
-    total_attendance = Attendance.objects.filter(student=student).count()
-    present_count = Attendance.objects.filter(student=student, status=Attendance.Status.PRESENT).count()
-    attendance_percentage = (present_count / total_attendance * 100) if total_attendance > 0 else 0
-
-    # Fee stats
-    payments = Payment.objects.filter(student=student)
-    total_paid = sum(p.amount_paid for p in payments)
-    try:
-        fee_structure = FeeStructure.objects.get(class_level=student.current_class)
-        total_fee = fee_structure.total_fee()
-        fee_balance = total_fee - total_paid
-    except FeeStructure.DoesNotExist:
-        fee_balance = 0
-        total_fee = 0
+    summary = get_summary(student)
 
     # Parents
     parents = student.parents.all()
 
     context = {
         'student': student,
-        'attendance_percentage': round(attendance_percentage, 1),
-        'total_paid': total_paid,
-        'total_fee': total_fee,
-        'fee_balance': fee_balance,
+        'attendance_percentage': summary.attendance_percentage,
+        'total_paid': summary.total_paid,
+        'total_fee': summary.total_fee,
+        'fee_balance': summary.fee_balance,
         'parents': parents,
     }
     return render(request, 'students/profile.html', context)
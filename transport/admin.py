@@ -1,11 +1,11 @@
 from django import forms
 from django.contrib import admin, messages
-from django.core.mail import send_mail
 from django.conf import settings
 from django.utils.crypto import get_random_string
 from django.utils.html import format_html
 from django.utils.safestring import mark_safe
-from .models import Driver, Vehicle, Route, StudentTransport, TransportAttendance, MaintenanceLog, FuelLog
+from .models import Driver, Vehicle, Route, RouteStop, StudentTransport, TransportAttendance, MaintenanceLog, FuelLog, MaintenanceForecast
+from core.mail import queue_mail
 from core.models import User
 
 class DriverForm(forms.ModelForm):
@@ -96,7 +96,7 @@ class DriverAdmin(admin.ModelAdmin):
             
             # Send Credentials
             try:
-                send_mail(
+                queue_mail(
                     'Your Driver Portal Credentials - SMS',
                     f'Dear {first_name},\n\n'
                     f'Welcome to School Management System!\n\n'
@@ -106,11 +106,10 @@ class DriverAdmin(admin.ModelAdmin):
                     f'Best Regards,\nSchool Transport Dept',
                     settings.EMAIL_HOST_USER,
                     [email],
-                    fail_silently=False,
                 )
-                messages.success(request, f"Driver created and credentials sent to {email}")
+                messages.success(request, f"Driver created and credentials queued for {email}")
             except Exception as e:
-                messages.warning(request, f"Driver created but email failed: {e}")
+                messages.warning(request, f"Driver created but email could not be queued: {e}")
         else:
             # Update User
             user = obj.user
@@ -144,16 +143,32 @@ class DriverAdmin(admin.ModelAdmin):
 class VehicleAdmin(admin.ModelAdmin):
     list_display = ('registration_number', 'model', 'capacity', 'driver')
 
+class RouteStopInline(admin.TabularInline):
+    model = RouteStop
+    fields = ('sequence', 'name')
+    extra = 1
+
 @admin.register(Route)
 class RouteAdmin(admin.ModelAdmin):
     list_display = ('name', 'start_point', 'end_point', 'vehicle')
     list_filter = ('vehicle',)
+    readonly_fields = ('stops',)
+    inlines = [RouteStopInline]
+
+@admin.register(RouteStop)
+class RouteStopAdmin(admin.ModelAdmin):
+    list_display = ('name', 'route', 'sequence')
+    list_filter = ('route',)
+    search_fields = ('name',)
 
 @admin.register(StudentTransport)
 class StudentTransportAdmin(admin.ModelAdmin):
     list_display = ('student', 'route', 'pickup_point', 'drop_point', 'bus_fees')
     list_filter = ('route',)
-    search_fields = ('student__user__username',)
+    list_select_related = ('student__user', 'route')
+    search_fields = ('student__user__username', 'pickup_point', 'drop_point')
+    fields = ('student', 'route', 'pickup_stop', 'drop_stop', 'bus_fees')
+    autocomplete_fields = ('pickup_stop', 'drop_stop')
 
 @admin.register(TransportAttendance)
 class TransportAttendanceAdmin(admin.ModelAdmin):
@@ -169,3 +184,13 @@ class MaintenanceLogAdmin(admin.ModelAdmin):
 class FuelLogAdmin(admin.ModelAdmin):
     list_display = ('vehicle', 'date', 'liters', 'cost', 'odometer_reading')
     list_filter = ('vehicle', 'date')
+
+@admin.register(MaintenanceForecast)
+class MaintenanceForecastAdmin(admin.ModelAdmin):
+    list_display = ('vehicle', 'due_date', 'due_odometer', 'odometer', 'last_service_date', 'computed_at')
+    list_filter = ('due_date',)
+    # Written by `manage.py forecast_maintenance`; edit the maintenance logs instead.
+    readonly_fields = [field.name for field in MaintenanceForecast._meta.fields]
+
+    def has_add_permission(self, request):
+        return False
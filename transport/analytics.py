@@ -0,0 +1,171 @@
+"""
+Fleet cost analytics over FuelLog and MaintenanceLog.
+
+Fuel efficiency uses the full-tank method: the distance covered since a
+vehicle's previous fill (the odometer delta, taken with a Lag window over
+its fills) divided by the litres of the fill that tops the tank up again.
+Per-vehicle totals and monthly spend come from grouped queries; only the
+per-fill deltas are looked at row by row, to flag outliers.
+
+A fill is flagged when its km/l is far from the vehicle's usual figure (a
+modified z-score over the median and the median absolute deviation, which
+a few bad fills cannot drag along), or when the odometer did not move
+forward since the previous fill.
+
+Everything is computed with a handful of queries and cached; fuel,
+maintenance and vehicle writes drop the cached copy (see transport.signals).
+"""
+import statistics
+from collections import defaultdict
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, F, Max, Min, Sum, Window
+from django.db.models.functions import Lag, TruncMonth
+from django.utils import timezone
+
+from .models import FuelLog, MaintenanceLog, Vehicle
+
+CACHE_KEY = 'transport:fleet_analytics'
+OUTLIER_SCORE = 3.5
+MIN_FILLS_FOR_OUTLIERS = 4
+ZERO = Decimal('0.00')
+
+
+def _decimal(value):
+    # SQLite hands SUM() of a decimal column back as a float or an integer.
+    return Decimal(str(value or 0)).quantize(ZERO)
+
+
+def _ratio(numerator, denominator, places='0.01'):
+    return (Decimal(numerator) / Decimal(denominator)).quantize(Decimal(places)) if denominator else None
+
+
+def fill_deltas():
+    """Every fill with ``distance``, the km since the vehicle's previous fill (None for its first)."""
+    previous = Window(Lag('odometer_reading'), partition_by=[F('vehicle_id')],
+                      order_by=[F('date').asc(), F('odometer_reading').asc(), F('pk').asc()])
+    fills = (FuelLog.objects.annotate(previous=previous)
+             .values('pk', 'vehicle_id', 'date', 'liters', 'cost', 'odometer_reading', 'previous')
+             .order_by('vehicle_id', 'date', 'odometer_reading', 'pk'))
+    for fill in fills:
+        fill['distance'] = None if fill['previous'] is None else fill['odometer_reading'] - fill['previous']
+        fill['km_per_litre'] = (_ratio(fill['distance'], fill['liters'])
+                                if fill['distance'] and fill['distance'] > 0 and fill['liters'] else None)
+        yield fill
+
+
+def _flag(fills):
+    """Anomalous fills of one vehicle, each with the ``expected`` km/l and a ``reason``."""
+    flagged = []
+    efficiencies = [float(fill['km_per_litre']) for fill in fills if fill['km_per_litre'] is not None]
+    median = statistics.median(efficiencies) if efficiencies else None
+    spread = statistics.median(abs(value - median) for value in efficiencies) if efficiencies else 0
+    for fill in fills:
+        reason = None
+        if fill['distance'] is not None and fill['distance'] <= 0:
+            reason = 'Odometer did not advance since the previous fill'
+        elif fill['km_per_litre'] is not None and len(efficiencies) >= MIN_FILLS_FOR_OUTLIERS and spread:
+            score = 0.6745 * (float(fill['km_per_litre']) - median) / spread
+            if score <= -OUTLIER_SCORE:
+                reason = 'Unusually low km/l'
+            elif score >= OUTLIER_SCORE:
+                reason = 'Unusually high km/l'
+        if reason:
+            flagged.append(dict(fill, reason=reason,
+                                expected=round(Decimal(median), 2) if median is not None else None))
+    return flagged
+
+
+def compute_fleet_analytics():
+    vehicles = {row['pk']: row for row in Vehicle.objects.values('pk', 'registration_number', 'model', 'capacity')}
+    fuel = {row['vehicle_id']: row for row in FuelLog.objects.values('vehicle_id').annotate(
+        fills=Count('id'), liters=Sum('liters'), fuel_cost=Sum('cost'),
+        first_odometer=Min('odometer_reading'), last_odometer=Max('odometer_reading')).order_by()}
+    maintenance = {row['vehicle_id']: row for row in MaintenanceLog.objects.values('vehicle_id').annotate(
+        services=Count('id'), maintenance_cost=Sum('cost')).order_by()}
+
+    measured = defaultdict(lambda: {'distance': 0, 'liters': ZERO})
+    by_vehicle = defaultdict(list)
+    for fill in fill_deltas():
+        by_vehicle[fill['vehicle_id']].append(fill)
+        if fill['km_per_litre'] is not None:
+            measured[fill['vehicle_id']]['distance'] += fill['distance']
+            measured[fill['vehicle_id']]['liters'] += fill['liters']
+
+    anomalies = []
+    for vehicle_id, fills in by_vehicle.items():
+        for fill in _flag(fills):
+            fill['vehicle'] = vehicles[vehicle_id]['registration_number']
+            anomalies.append(fill)
+    anomalies.sort(key=lambda fill: fill['date'], reverse=True)
+    flagged = defaultdict(int)
+    for fill in anomalies:
+        flagged[fill['vehicle_id']] += 1
+
+    rows = []
+    for vehicle_id, vehicle in vehicles.items():
+        fuel_row, service_row = fuel.get(vehicle_id, {}), maintenance.get(vehicle_id, {})
+        distance = (fuel_row['last_odometer'] - fuel_row['first_odometer']) if fuel_row else 0
+        fuel_cost, maintenance_cost = _decimal(fuel_row.get('fuel_cost')), _decimal(service_row.get('maintenance_cost'))
+        rows.append({
+            'vehicle_id': vehicle_id,
+            'vehicle': vehicle['registration_number'],
+            'model': vehicle['model'],
+            'fills': fuel_row.get('fills', 0),
+            'liters': _decimal(fuel_row.get('liters')),
+            'fuel_cost': fuel_cost,
+            'services': service_row.get('services', 0),
+            'maintenance_cost': maintenance_cost,
+            'total_cost': fuel_cost + maintenance_cost,
+            'distance': distance,
+            'km_per_litre': _ratio(measured[vehicle_id]['distance'], measured[vehicle_id]['liters']),
+            'cost_per_km': _ratio(fuel_cost + maintenance_cost, distance, '0.001'),
+            'anomalies': flagged[vehicle_id],
+        })
+    rows.sort(key=lambda row: row['vehicle'])
+
+    monthly = defaultdict(lambda: {'fuel_cost': ZERO, 'liters': ZERO, 'maintenance_cost': ZERO})
+    for row in (FuelLog.objects.values('vehicle_id', month=TruncMonth('date'))
+                .annotate(fuel_cost=Sum('cost'), liters=Sum('liters')).order_by()):
+        cell = monthly[(row['vehicle_id'], row['month'])]
+        cell['fuel_cost'], cell['liters'] = _decimal(row['fuel_cost']), _decimal(row['liters'])
+    for row in (MaintenanceLog.objects.values('vehicle_id', month=TruncMonth('date'))
+                .annotate(maintenance_cost=Sum('cost')).order_by()):
+        monthly[(row['vehicle_id'], row['month'])]['maintenance_cost'] = _decimal(row['maintenance_cost'])
+    spend = [
+        dict(values, vehicle_id=vehicle_id, vehicle=vehicles[vehicle_id]['registration_number'], month=month,
+             total_cost=values['fuel_cost'] + values['maintenance_cost'])
+        for (vehicle_id, month), values in monthly.items()
+    ]
+    spend.sort(key=lambda row: (row['month'], row['vehicle']), reverse=True)
+
+    totals = {
+        'fuel_cost': sum((row['fuel_cost'] for row in rows), ZERO),
+        'maintenance_cost': sum((row['maintenance_cost'] for row in rows), ZERO),
+        'distance': sum(row['distance'] for row in rows),
+        'liters': sum((row['liters'] for row in rows), ZERO),
+        'anomalies': len(anomalies),
+    }
+    totals['total_cost'] = totals['fuel_cost'] + totals['maintenance_cost']
+    totals['cost_per_km'] = _ratio(totals['total_cost'], totals['distance'], '0.001')
+    return {'vehicles': rows, 'monthly': spend, 'anomalies': anomalies, 'totals': totals,
+            'computed_at': timezone.now()}
+
+
+def fleet_analytics():
+    """
+    ``{'vehicles', 'monthly', 'anomalies', 'totals', 'computed_at'}``: per-vehicle
+    cost and efficiency, spend per vehicle and month (newest first) and the
+    flagged fills (newest first), from the cache when possible.
+    """
+    analytics = cache.get(CACHE_KEY)
+    if analytics is None:
+        analytics = compute_fleet_analytics()
+        cache.set(CACHE_KEY, analytics, timeout=settings.FLEET_ANALYTICS_CACHE_TTL)
+    return analytics
+
+
+def invalidate_fleet_analytics():
+    cache.delete(CACHE_KEY)
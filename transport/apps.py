@@ -3,3 +3,6 @@ from django.apps import AppConfig
 
 class TransportConfig(AppConfig):
     name = 'transport'
+
+    def ready(self):
+        from . import signals  # noqa: F401
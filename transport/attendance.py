@@ -0,0 +1,47 @@
+"""
+Batched transport roll calls.
+
+A trip roll call for one route and date is a single transaction: one query
+for the students allocated to the route, one for the rows already recorded
+for that (route, date), then one bulk_create and one bulk_update.
+Resubmitting a roll call updates the existing rows, and the (student, date,
+route) uniqueness constraint rules out duplicates.
+"""
+from django.db import transaction
+
+from academics.attendance import parse_attendance_date
+from .models import StudentTransport, TransportAttendance
+
+
+def record_trip(route_id, date, records):
+    """
+    Upsert the pickup and drop roll call of one route for one date.
+
+    ``records`` maps student id to a ``(pickup, drop)`` pair of booleans;
+    ``None`` leaves that side as already recorded (absent for a new row), so
+    the morning and afternoon halves can be submitted separately or together.
+    Students not allocated to the route are rejected. Returns ``(created, updated)``.
+    """
+    date = parse_attendance_date(date)
+    allocated = set(StudentTransport.objects.filter(route_id=route_id).values_list('student_id', flat=True))
+    strangers = sorted(set(records) - allocated)
+    if strangers:
+        raise ValueError(f"Students {', '.join(map(str, strangers))} are not allocated to this route")
+
+    with transaction.atomic():
+        existing = {row.student_id: row for row in TransportAttendance.objects.filter(route_id=route_id, date=date)}
+        to_create, to_update = [], []
+        for student_id, (pickup, drop) in records.items():
+            row = existing.get(student_id)
+            if row is None:
+                to_create.append(TransportAttendance(student_id=student_id, route_id=route_id, date=date,
+                                                     is_present_pickup=bool(pickup), is_present_drop=bool(drop)))
+                continue
+            pickup = row.is_present_pickup if pickup is None else bool(pickup)
+            drop = row.is_present_drop if drop is None else bool(drop)
+            if (row.is_present_pickup, row.is_present_drop) != (pickup, drop):
+                row.is_present_pickup, row.is_present_drop = pickup, drop
+                to_update.append(row)
+        TransportAttendance.objects.bulk_create(to_create)
+        TransportAttendance.objects.bulk_update(to_update, ['is_present_pickup', 'is_present_drop'])
+    return len(to_create), len(to_update)
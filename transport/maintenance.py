@@ -0,0 +1,197 @@
+"""
+Predictive maintenance.
+
+For every vehicle the next service is projected two ways, and the earlier
+one wins:
+
+* by time: the last service date plus the vehicle's usual gap between
+  services (the median of its MaintenanceLog intervals, or
+  MAINTENANCE_INTERVAL_DAYS with fewer than two services);
+* by mileage: the odometer at the last service plus the usual distance
+  between services (likewise, or MAINTENANCE_INTERVAL_KM), reached at the
+  vehicle's recent daily distance.
+
+Odometer readings come from FuelLog. The reading on a service date is
+interpolated between the surrounding fills, and the daily distance is
+taken over the last MAINTENANCE_RATE_WINDOW_DAYS of fills. A vehicle
+never serviced is measured from its first fill.
+
+refresh_forecasts loads the whole fleet with three queries, upserts
+MaintenanceForecast rows in one statement and, unless told otherwise,
+sends each transport manager one Notification listing the vehicles whose
+service is newly due within MAINTENANCE_ALERT_DAYS.
+"""
+import bisect
+import datetime
+import statistics
+import time
+from collections import defaultdict
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from core.models import Notification, User
+from .models import FuelLog, MaintenanceForecast, MaintenanceLog, Vehicle
+
+FORECAST_FIELDS = ['last_service_date', 'last_service_odometer', 'interval_days', 'interval_km', 'km_per_day',
+                   'odometer', 'due_date', 'due_odometer', 'computed_at']
+
+
+class OdometerHistory:
+    """A vehicle's fills as a non-decreasing odometer over time."""
+
+    def __init__(self, readings):
+        self.days, self.odometers = [], []
+        highest = 0
+        for date, odometer in readings:
+            # A reading below an earlier one is a typo; keep the odometer monotonic.
+            highest = max(highest, odometer)
+            self.days.append(date.toordinal())
+            self.odometers.append(highest)
+
+    def __bool__(self):
+        return bool(self.days)
+
+    def km_per_day(self, window_days):
+        """Average daily distance over the last ``window_days`` of fills (all of them if that is too short)."""
+        if len(self.days) < 2:
+            return None
+        start = bisect.bisect_left(self.days, self.days[-1] - window_days)
+        if self.days[-1] - self.days[start] < 7 or start == len(self.days) - 1:
+            start = 0
+        elapsed = self.days[-1] - self.days[start]
+        return Decimal(self.odometers[-1] - self.odometers[start]) / elapsed if elapsed else None
+
+    def reading_on(self, date, rate):
+        """Odometer on ``date``: interpolated between fills, extrapolated at ``rate`` outside them."""
+        day = date.toordinal()
+        i = bisect.bisect_left(self.days, day)
+        if i < len(self.days) and self.days[i] == day:
+            return self.odometers[i]
+        if 0 < i < len(self.days):
+            before, after = self.days[i - 1], self.days[i]
+            share = (day - before) / (after - before)
+            return round(self.odometers[i - 1] + share * (self.odometers[i] - self.odometers[i - 1]))
+        anchor = 0 if i == 0 else len(self.days) - 1
+        return max(0, round(self.odometers[anchor] + float(rate or 0) * (day - self.days[anchor])))
+
+
+def forecast_vehicle(services, history, as_of):
+    """Forecast field values for one vehicle from its service dates and OdometerHistory, or None."""
+    services = sorted(set(services))
+    if not services and not history:
+        return None
+    rate = history.km_per_day(settings.MAINTENANCE_RATE_WINDOW_DAYS)
+
+    if services:
+        interval_days = (round(statistics.median((b - a).days for a, b in zip(services, services[1:])))
+                         if len(services) > 1 else settings.MAINTENANCE_INTERVAL_DAYS)
+        last_date = services[-1]
+    else:
+        interval_days = settings.MAINTENANCE_INTERVAL_DAYS
+        last_date = datetime.date.fromordinal(history.days[0])
+
+    interval_km, last_odometer = settings.MAINTENANCE_INTERVAL_KM, None
+    if history:
+        if services:
+            readings = [history.reading_on(date, rate) for date in services]
+            gaps = [b - a for a, b in zip(readings, readings[1:]) if b > a]
+            if gaps:
+                interval_km = round(statistics.median(gaps))
+            last_odometer = readings[-1]
+        else:
+            last_odometer = history.odometers[0]
+
+    due_date = last_date + datetime.timedelta(days=max(interval_days, 1))
+    due_odometer = last_odometer + interval_km if last_odometer is not None else None
+    odometer = history.reading_on(as_of, rate) if history else None
+    if due_odometer is not None and rate:
+        # Day the odometer reaches the due reading, counted from the latest fill.
+        latest = datetime.date.fromordinal(history.days[-1])
+        by_mileage = latest + datetime.timedelta(days=int((due_odometer - history.odometers[-1]) / rate))
+        due_date = min(due_date, by_mileage)
+    return {
+        'last_service_date': services[-1] if services else None,
+        'last_service_odometer': last_odometer if services else None,
+        'interval_days': interval_days,
+        'interval_km': interval_km,
+        'km_per_day': rate.quantize(Decimal('0.01')) if rate is not None else None,
+        'odometer': odometer,
+        'due_date': due_date,
+        'due_odometer': due_odometer,
+    }
+
+
+def _alert(vehicles, as_of):
+    lines = []
+    for vehicle, forecast in vehicles:
+        days = (forecast.due_date - as_of).days
+        when = f"overdue by {-days} days" if days < 0 else "due today" if days == 0 else f"due in {days} days"
+        mileage = f", at {forecast.due_odometer} km (now about {forecast.odometer} km)" if forecast.due_odometer else ""
+        lines.append(f"- {vehicle}: {when} ({forecast.due_date:%d %b %Y}{mileage})")
+    title = f"Maintenance due for {len(vehicles)} vehicle{'s' if len(vehicles) != 1 else ''}"
+    return title, "Upcoming vehicle services:\n\n" + "\n".join(lines)
+
+
+def refresh_forecasts(vehicle_ids=None, as_of=None, notify=True, dry_run=False):
+    """
+    Recompute the forecasts of ``vehicle_ids`` (default: the whole fleet) as
+    of ``as_of`` (default: today). Returns ``{'vehicles', 'forecasts', 'due',
+    'notified', 'notifications', 'elapsed'}``; ``due`` lists the
+    ``(vehicle, forecast)`` pairs due within MAINTENANCE_ALERT_DAYS.
+    """
+    started = time.perf_counter()
+    as_of = as_of or timezone.localdate()
+    vehicles = Vehicle.objects.order_by('registration_number')
+    fills = FuelLog.objects.order_by('vehicle_id', 'date', 'odometer_reading')
+    services = MaintenanceLog.objects.all()
+    if vehicle_ids is not None:
+        vehicles, fills, services = (vehicles.filter(pk__in=vehicle_ids), fills.filter(vehicle_id__in=vehicle_ids),
+                                     services.filter(vehicle_id__in=vehicle_ids))
+    vehicles = list(vehicles)
+    readings, service_dates = defaultdict(list), defaultdict(list)
+    for vehicle_id, date, odometer in fills.values_list('vehicle_id', 'date', 'odometer_reading'):
+        readings[vehicle_id].append((date, odometer))
+    for vehicle_id, date in services.values_list('vehicle_id', 'date'):
+        service_dates[vehicle_id].append(date)
+    notified = dict(MaintenanceForecast.objects.filter(vehicle__in=vehicles)
+                    .values_list('vehicle_id', 'notified_due_date'))
+
+    now = timezone.now()
+    forecasts, due, newly_due = [], [], []
+    horizon = as_of + datetime.timedelta(days=settings.MAINTENANCE_ALERT_DAYS)
+    for vehicle in vehicles:
+        values = forecast_vehicle(service_dates[vehicle.pk], OdometerHistory(readings[vehicle.pk]), as_of)
+        if values is None:
+            continue
+        forecast = MaintenanceForecast(vehicle=vehicle, computed_at=now,
+                                       notified_due_date=notified.get(vehicle.pk), **values)
+        forecasts.append(forecast)
+        if forecast.due_date <= horizon:
+            due.append((vehicle, forecast))
+            if notify and forecast.notified_due_date != forecast.due_date:
+                forecast.notified_due_date = forecast.due_date
+                newly_due.append((vehicle, forecast))
+
+    notifications = []
+    if newly_due:
+        title, message = _alert(newly_due, as_of)
+        notifications = [Notification(recipient=manager, title=title, message=message)
+                         for manager in User.objects.filter(role=User.Role.TRANSPORT_MANAGER, is_active=True)]
+    if not dry_run:
+        with transaction.atomic():
+            MaintenanceForecast.objects.bulk_create(forecasts, update_conflicts=True, unique_fields=['vehicle'],
+                                                    update_fields=FORECAST_FIELDS + ['notified_due_date'])
+            MaintenanceForecast.objects.filter(vehicle__in=vehicles).exclude(
+                vehicle__in=[forecast.vehicle for forecast in forecasts]).delete()
+            Notification.objects.bulk_create(notifications)
+    return {
+        'vehicles': len(vehicles),
+        'forecasts': len(forecasts),
+        'due': due,
+        'notified': len(newly_due),
+        'notifications': len(notifications),
+        'elapsed': time.perf_counter() - started,
+    }
@@ -0,0 +1,31 @@
+import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+
+from transport.maintenance import refresh_forecasts
+
+
+class Command(BaseCommand):
+    help = "Projects every vehicle's next service and notifies transport managers of services due soon"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--as-of', help='YYYY-MM-DD to forecast from (default: today)')
+        parser.add_argument('--dry-run', action='store_true', help='Report the forecasts without saving or notifying')
+
+    def handle(self, *args, **options):
+        as_of = None
+        if options['as_of']:
+            try:
+                as_of = datetime.date.fromisoformat(options['as_of'])
+            except ValueError:
+                raise CommandError(f"Invalid date {options['as_of']!r}; use YYYY-MM-DD")
+
+        result = refresh_forecasts(as_of=as_of, dry_run=options['dry_run'])
+        for vehicle, forecast in result['due']:
+            mileage = f" or at {forecast.due_odometer} km" if forecast.due_odometer else ""
+            self.stdout.write(f"  {vehicle}: due {forecast.due_date}{mileage}")
+        verb = 'Would send' if options['dry_run'] else 'Sent'
+        self.stdout.write(self.style.SUCCESS(
+            f"Forecast {result['forecasts']} of {result['vehicles']} vehicles; {len(result['due'])} due soon. "
+            f"{verb} {result['notifications']} notifications about {result['notified']} new services "
+            f"in {result['elapsed']:.2f}s"))
@@ -0,0 +1,44 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from transport.planner import PlanningError, plan_routes, write_plan
+
+
+class Command(BaseCommand):
+    help = 'Plans capacity-feasible bus routes from a stop coordinates file; previews the plan unless --write is given'
+
+    def add_arguments(self, parser):
+        parser.add_argument('stops_file', help='CSV file with name, latitude and longitude columns')
+        parser.add_argument('--depot', help='Name of the school in the stops file (defaults to TRANSPORT_DEPOT)')
+        parser.add_argument('--vehicle', dest='vehicle_ids', type=int, action='append',
+                            help='Only replan this vehicle id and its riders (repeatable); defaults to every vehicle')
+        parser.add_argument('--write', action='store_true', help='Replace the routes of the planned vehicles')
+
+    def handle(self, *args, **options):
+        try:
+            result = plan_routes(options['stops_file'], depot=options['depot'], vehicle_ids=options['vehicle_ids'])
+        except (OSError, PlanningError) as e:
+            raise CommandError(str(e))
+
+        for error in result['errors']:
+            self.stderr.write(self.style.ERROR(error))
+        if result['errors']:
+            raise CommandError("No feasible plan.")
+
+        for planned in result['routes']:
+            kept = f" (+{planned['kept']} unplaced kept)" if planned['kept'] else ""
+            self.stdout.write(f"{planned['vehicle']}: {planned['load']}/{planned['capacity']} riders{kept}, "
+                              f"{len(planned['stops']) - 1} stops, {planned['distance']} km")
+            if options['verbosity'] > 1:
+                for sequence, (name, riders) in enumerate(planned['stops'], start=1):
+                    self.stdout.write(f"  {sequence}. {name} ({len(riders)})")
+        for student_id, pickup in result['unplaced']:
+            self.stdout.write(self.style.WARNING(f"Unplaced: student {student_id}, no coordinates for {pickup!r}"))
+        self.stdout.write(
+            f"Planned {len(result['routes'])} routes for {result['rider_count']} riders, "
+            f"{result['distance']} km in total, in {result['elapsed']:.2f}s")
+
+        if not options['write']:
+            self.stdout.write("Preview only; re-run with --write to apply.")
+            return
+        written = write_plan(result)
+        self.stdout.write(self.style.SUCCESS(f"Wrote {len(written)} routes."))
@@ -0,0 +1,91 @@
+# Generated by Django 5.2.18 on 2026-10-17 22:35
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def create_route_stops(apps, schema_editor):
+    """
+    Turn each route's start point, comma-separated stops and end point into
+    ordered RouteStop rows, then link the students whose pickup and drop
+    points name one of them (ignoring case and surrounding spaces).
+    """
+    Route = apps.get_model('transport', 'Route')
+    RouteStop = apps.get_model('transport', 'RouteStop')
+    StudentTransport = apps.get_model('transport', 'StudentTransport')
+
+    stops = []
+    for route in Route.objects.all():
+        seen = set()
+        for name in [route.start_point, *route.stops.split(','), route.end_point]:
+            name = ' '.join(name.split())[:100]
+            if name and name.casefold() not in seen:
+                seen.add(name.casefold())
+                stops.append(RouteStop(route=route, name=name, sequence=len(seen)))
+    RouteStop.objects.bulk_create(stops)
+
+    by_name = {(stop.route_id, stop.name.casefold()): stop for stop in RouteStop.objects.all()}
+    linked = []
+    for allocation in StudentTransport.objects.exclude(route=None):
+        pickup = by_name.get((allocation.route_id, ' '.join(allocation.pickup_point.split()).casefold()))
+        drop = by_name.get((allocation.route_id, ' '.join(allocation.drop_point.split()).casefold()))
+        if pickup or drop:
+            allocation.pickup_stop, allocation.drop_stop = pickup, drop
+            linked.append(allocation)
+    StudentTransport.objects.bulk_update(linked, ['pickup_stop', 'drop_stop'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('transport', '0003_driver_photo_alter_driver_id_alter_fuellog_id_and_more'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='route',
+            name='stops',
+            field=models.TextField(blank=True, help_text="Comma-separated list of stops, kept in step with the route's stops"),
+        ),
+        migrations.AlterField(
+            model_name='studenttransport',
+            name='drop_point',
+            field=models.CharField(blank=True, max_length=100),
+        ),
+        migrations.AlterField(
+            model_name='studenttransport',
+            name='pickup_point',
+            field=models.CharField(blank=True, max_length=100),
+        ),
+        migrations.CreateModel(
+            name='RouteStop',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100)),
+                ('sequence', models.PositiveSmallIntegerField(help_text='Order along the route, starting at 1')),
+                ('route', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='route_stops', to='transport.route')),
+            ],
+            options={
+                'ordering': ['route', 'sequence'],
+            },
+        ),
+        migrations.AddField(
+            model_name='studenttransport',
+            name='drop_stop',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='drops', to='transport.routestop'),
+        ),
+        migrations.AddField(
+            model_name='studenttransport',
+            name='pickup_stop',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='pickups', to='transport.routestop'),
+        ),
+        migrations.AddIndex(
+            model_name='routestop',
+            index=models.Index(fields=['name'], name='transport_r_name_362f0a_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='routestop',
+            unique_together={('route', 'sequence')},
+        ),
+        migrations.RunPython(create_route_stops, migrations.RunPython.noop),
+    ]
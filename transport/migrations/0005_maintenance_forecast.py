@@ -0,0 +1,34 @@
+# Generated by Django 5.2.18 on 2026-10-17 22:42
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('transport', '0004_route_stops'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MaintenanceForecast',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('last_service_date', models.DateField(blank=True, null=True)),
+                ('last_service_odometer', models.PositiveIntegerField(blank=True, null=True)),
+                ('interval_days', models.PositiveIntegerField()),
+                ('interval_km', models.PositiveIntegerField()),
+                ('km_per_day', models.DecimalField(blank=True, decimal_places=2, max_digits=8, null=True)),
+                ('odometer', models.PositiveIntegerField(blank=True, help_text='Estimated reading on the forecast date', null=True)),
+                ('due_date', models.DateField()),
+                ('due_odometer', models.PositiveIntegerField(blank=True, null=True)),
+                ('notified_due_date', models.DateField(blank=True, null=True)),
+                ('computed_at', models.DateTimeField()),
+                ('vehicle', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='maintenance_forecast', to='transport.vehicle')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['due_date'], name='transport_m_due_dat_f035aa_idx')],
+            },
+        ),
+    ]
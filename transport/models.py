@@ -1,4 +1,5 @@
 from django.conf import settings
+from django.core.exceptions import ValidationError
 from django.db import models
 # Use string reference for Student to avoid circular imports if possible, or import inside methods, but here it's foreign key.
 # It seems safer to use 'students.Student' string reference.
@@ -25,19 +26,53 @@ class Route(models.Model):
     name = models.CharField(max_length=100)
     start_point = models.CharField(max_length=100)
     end_point = models.CharField(max_length=100)
-    stops = models.TextField(help_text="Comma-separated list of stops")
+    stops = models.TextField(blank=True, help_text="Comma-separated list of stops, kept in step with the route's stops")
     vehicle = models.ForeignKey(Vehicle, on_delete=models.SET_NULL, null=True, blank=True, related_name='routes')
 
     def __str__(self):
         return self.name
 
+class RouteStop(models.Model):
+    route = models.ForeignKey(Route, on_delete=models.CASCADE, related_name='route_stops')
+    name = models.CharField(max_length=100)
+    sequence = models.PositiveSmallIntegerField(help_text="Order along the route, starting at 1")
+
+    class Meta:
+        ordering = ['route', 'sequence']
+        unique_together = ('route', 'sequence')
+        indexes = [models.Index(fields=['name'])]
+
+    def __str__(self):
+        return f"{self.route} #{self.sequence}: {self.name}"
+
 class StudentTransport(models.Model):
     student = models.OneToOneField('students.Student', on_delete=models.CASCADE, related_name='transport_details')
     route = models.ForeignKey(Route, on_delete=models.SET_NULL, null=True, blank=True)
-    pickup_point = models.CharField(max_length=100)
-    drop_point = models.CharField(max_length=100)
+    pickup_stop = models.ForeignKey(RouteStop, on_delete=models.SET_NULL, null=True, blank=True, related_name='pickups')
+    drop_stop = models.ForeignKey(RouteStop, on_delete=models.SET_NULL, null=True, blank=True, related_name='drops')
+    # Names of the pickup and drop stops, copied from them on save.
+    pickup_point = models.CharField(max_length=100, blank=True)
+    drop_point = models.CharField(max_length=100, blank=True)
     bus_fees = models.DecimalField(max_digits=8, decimal_places=2, help_text="Monthly/Termly Fees")
 
+    def clean(self):
+        for field in ('pickup_stop', 'drop_stop'):
+            stop = getattr(self, field)
+            if stop is not None and stop.route_id != self.route_id:
+                raise ValidationError({field: f"{stop.name} is not a stop of this route."})
+        vehicle = self.route.vehicle if self.route_id else None
+        if vehicle is not None:
+            riders = StudentTransport.objects.filter(route_id=self.route_id).exclude(pk=self.pk).count()
+            if riders >= vehicle.capacity:
+                raise ValidationError({'route': f"{vehicle} on this route is full ({vehicle.capacity} seats)."})
+
+    def save(self, *args, **kwargs):
+        if self.pickup_stop_id:
+            self.pickup_point = self.pickup_stop.name
+        if self.drop_stop_id:
+            self.drop_point = self.drop_stop.name
+        super().save(*args, **kwargs)
+
     def __str__(self):
         return f"Transport for {self.student}"
 
@@ -73,3 +108,24 @@ class FuelLog(models.Model):
 
     def __str__(self):
         return f"Fuel {self.vehicle} - {self.date}"
+
+class MaintenanceForecast(models.Model):
+    """Projected next service of a vehicle, refreshed by transport.maintenance."""
+    vehicle = models.OneToOneField(Vehicle, on_delete=models.CASCADE, related_name='maintenance_forecast')
+    last_service_date = models.DateField(null=True, blank=True)
+    last_service_odometer = models.PositiveIntegerField(null=True, blank=True)
+    interval_days = models.PositiveIntegerField()
+    interval_km = models.PositiveIntegerField()
+    km_per_day = models.DecimalField(max_digits=8, decimal_places=2, null=True, blank=True)
+    odometer = models.PositiveIntegerField(null=True, blank=True, help_text="Estimated reading on the forecast date")
+    due_date = models.DateField()
+    due_odometer = models.PositiveIntegerField(null=True, blank=True)
+    # Due date of the last alert sent, so each projected service is announced once.
+    notified_due_date = models.DateField(null=True, blank=True)
+    computed_at = models.DateTimeField()
+
+    class Meta:
+        indexes = [models.Index(fields=['due_date'])]
+
+    def __str__(self):
+        return f"{self.vehicle} due {self.due_date}"
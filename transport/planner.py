@@ -0,0 +1,368 @@
+"""
+Offline route planning.
+
+Stop coordinates come from a CSV file (``name,latitude,longitude``) that
+must include the school itself (TRANSPORT_DEPOT). Every StudentTransport
+allocation is one seat to pick up at its pickup stop, and every vehicle
+offers ``capacity`` seats on one route that starts and ends at the school.
+
+The distance matrix (great-circle kilometres) is computed once. Routes are
+built with the Clarke-Wright savings heuristic: start with one route per
+stop, then merge route ends in decreasing order of the distance the merge
+saves, as long as the routes can still be matched to the fleet's vehicles
+(the k-th heaviest route fits the k-th largest vehicle). A stop with more
+riders than the largest vehicle seats is split across vehicles. If savings
+leave more routes than vehicles, the lightest routes are dissolved into the
+others by cheapest insertion. Each route is finally improved with 2-opt.
+
+Riders whose pickup has no coordinates cannot be planned. Those already on
+a planned vehicle stay on it, so they keep their seats: the planner only
+fills the seats left over, and write_plan keeps them on the rewritten route
+without a pickup stop (listed as unassigned in its manifest).
+
+plan_routes only computes a plan; write_plan replaces the Route, RouteStop
+and StudentTransport assignments of the planned vehicles in one
+transaction.
+"""
+import csv
+import math
+import time
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+
+from .models import Route, RouteStop, StudentTransport, Vehicle
+from .stops import invalidate_manifests, sync_stop_text
+
+EARTH_RADIUS_KM = 6371.0
+
+
+class PlanningError(Exception):
+    pass
+
+
+def _key(name):
+    return ' '.join(name.split()).casefold()
+
+
+def load_stop_coordinates(path):
+    """``{normalised name: (name, latitude, longitude)}`` from a ``name,latitude,longitude`` CSV file."""
+    coordinates = {}
+    with open(path, newline='', encoding='utf-8-sig') as handle:
+        for line, row in enumerate(csv.DictReader(handle), start=2):
+            try:
+                name = ' '.join(row['name'].split())
+                latitude, longitude = float(row['latitude']), float(row['longitude'])
+            except (KeyError, TypeError, ValueError, AttributeError):
+                raise PlanningError(f"{path}, line {line}: expected name, latitude and longitude")
+            if not (name and -90 <= latitude <= 90 and -180 <= longitude <= 180):
+                raise PlanningError(f"{path}, line {line}: invalid stop {row}")
+            coordinates[_key(name)] = (name, latitude, longitude)
+    return coordinates
+
+
+def distance_matrix(points):
+    """Great-circle distances in km between ``(latitude, longitude)`` points."""
+    radians = [(math.radians(lat), math.radians(lng)) for lat, lng in points]
+    cosines = [math.cos(lat) for lat, _lng in radians]
+    matrix = []
+    for i, (lat1, lng1) in enumerate(radians):
+        row = []
+        for j, (lat2, lng2) in enumerate(radians):
+            a = math.sin((lat2 - lat1) / 2) ** 2 + cosines[i] * cosines[j] * math.sin((lng2 - lng1) / 2) ** 2
+            row.append(2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a))))
+        matrix.append(row)
+    return matrix
+
+
+def tour_length(route, dist):
+    """Length of depot -> ``route`` -> depot, the depot being point 0."""
+    stops = [0, *route, 0]
+    return sum(dist[a][b] for a, b in zip(stops, stops[1:]))
+
+
+class Fleet:
+    """
+    Tracks whether the current route loads can be given to distinct
+    vehicles: for every capacity level, no more routes may be heavier than
+    it than there are vehicles larger than it.
+    """
+
+    def __init__(self, capacities):
+        self.capacities = sorted(capacities, reverse=True)
+        self.levels = sorted(set(capacities))
+        self.larger = {level: sum(1 for capacity in capacities if capacity > level) for level in self.levels}
+        self.heavier = dict.fromkeys(self.levels, 0)
+
+    @property
+    def largest(self):
+        return self.capacities[0]
+
+    def add(self, load, sign=1):
+        for level in self.levels:
+            if load > level:
+                self.heavier[level] += sign
+
+    def fits(self, removed, added):
+        """Whether replacing routes of loads ``removed`` with one of load ``added`` stays assignable."""
+        if added > self.largest:
+            return False
+        for level in self.levels:
+            heavier = self.heavier[level] - sum(1 for load in removed if load > level) + (added > level)
+            if heavier > self.larger[level]:
+                return False
+        return True
+
+
+def clarke_wright(dist, demand, fleet):
+    """Savings construction over points 1..n; returns the routes as lists of points."""
+    n = len(demand)
+    route_of = {point: [point] for point in range(1, n)}
+    load = {point: demand[point] for point in range(1, n)}
+    for point in range(1, n):
+        fleet.add(demand[point])
+    savings = sorted(((dist[0][i] + dist[0][j] - dist[i][j], i, j)
+                      for i in range(1, n) for j in range(i + 1, n)), reverse=True)
+    for saving, i, j in savings:
+        if saving <= 0:
+            break
+        a, b = route_of[i], route_of[j]
+        if a is b or i not in (a[0], a[-1]) or j not in (b[0], b[-1]):
+            continue
+        load_a, load_b = load[a[0]], load[b[0]]
+        if not fleet.fits((load_a, load_b), load_a + load_b):
+            continue
+        # Join so that i and j end up next to each other.
+        if a[-1] != i:
+            a.reverse()
+        if b[0] != j:
+            b.reverse()
+        merged = a + b
+        fleet.add(load_a, -1)
+        fleet.add(load_b, -1)
+        fleet.add(load_a + load_b)
+        for point in merged:
+            route_of[point] = merged
+        load[merged[0]] = load[merged[-1]] = load_a + load_b
+    routes, seen = [], set()
+    for route in route_of.values():
+        if id(route) not in seen:
+            seen.add(id(route))
+            routes.append(route)
+    return routes
+
+
+def consolidate(routes, dist, demand, fleet, vehicle_count):
+    """Dissolve the lightest routes into the others until there is one route per vehicle at most."""
+    routes = sorted(routes, key=lambda route: sum(demand[point] for point in route))
+    while len(routes) > vehicle_count:
+        victim = routes.pop(0)
+        fleet.add(sum(demand[point] for point in victim), -1)
+        for point in victim:
+            best = None
+            for route in routes:
+                load = sum(demand[p] for p in route)
+                if not fleet.fits((load,), load + demand[point]):
+                    continue
+                stops = [0, *route, 0]
+                for k in range(len(stops) - 1):
+                    cost = dist[stops[k]][point] + dist[point][stops[k + 1]] - dist[stops[k]][stops[k + 1]]
+                    if best is None or cost < best[0]:
+                        best = (cost, route, k, load)
+            if best is None:
+                raise PlanningError(f"{len(routes) + 1} routes are needed but the fleet has {vehicle_count} vehicles")
+            _cost, route, k, load = best
+            fleet.add(load, -1)
+            fleet.add(load + demand[point])
+            route.insert(k, point)
+        routes.sort(key=lambda route: sum(demand[point] for point in route))
+    return routes
+
+
+def two_opt(route, dist):
+    """Improve a depot-to-depot tour by reversing segments while that shortens it."""
+    stops = [0, *route, 0]
+    improved = True
+    while improved:
+        improved = False
+        for i in range(1, len(stops) - 2):
+            for j in range(i + 1, len(stops) - 1):
+                delta = (dist[stops[i - 1]][stops[j]] + dist[stops[i]][stops[j + 1]]
+                         - dist[stops[i - 1]][stops[i]] - dist[stops[j]][stops[j + 1]])
+                if delta < -1e-9:
+                    stops[i:j + 1] = reversed(stops[i:j + 1])
+                    improved = True
+    return stops[1:-1]
+
+
+class RoutingProblem:
+    """Riders, stops and vehicles, loaded with a handful of queries."""
+
+    def __init__(self, coordinates, depot=None, vehicle_ids=None):
+        depot = depot or settings.TRANSPORT_DEPOT
+        if _key(depot) not in coordinates:
+            raise PlanningError(f"The stop file has no coordinates for the school ({depot!r})")
+        self.depot_name, *depot_point = coordinates[_key(depot)]
+
+        vehicles = Vehicle.objects.filter(capacity__gt=0).order_by('-capacity', 'pk')
+        if vehicle_ids:
+            vehicles = vehicles.filter(pk__in=vehicle_ids)
+        vehicles = list(vehicles.values('pk', 'registration_number', 'capacity'))
+        if not vehicles:
+            raise PlanningError("There are no vehicles with seats to plan for")
+
+        # Point 0 is the school; a stop with more riders than the largest
+        # vehicle seats becomes several points at the same place.
+        self.names, self.points, self.riders = [self.depot_name], [tuple(depot_point)], [[]]
+        self.unplaced = []
+        by_stop = defaultdict(list)
+        allocations = StudentTransport.objects.values_list('student_id', 'pickup_stop__name', 'pickup_point',
+                                                           'route__vehicle_id')
+        if vehicle_ids:
+            # A partial replan moves the riders of its own vehicles, plus
+            # those on no bus yet, and leaves every other vehicle's alone.
+            allocations = allocations.filter(Q(route__vehicle_id__in=vehicle_ids) | Q(route__vehicle__isnull=True))
+        kept = Counter()
+        for student_id, stop_name, pickup_point, vehicle_id in allocations.order_by('pk'):
+            key = _key(stop_name or pickup_point or '')
+            if key in coordinates and key != _key(depot):
+                by_stop[key].append(student_id)
+            else:
+                self.unplaced.append((student_id, stop_name or pickup_point))
+                kept[vehicle_id] += 1
+
+        # Unplaced riders stay on their vehicle and keep their seats.
+        for vehicle in vehicles:
+            vehicle['kept'] = kept[vehicle['pk']]
+            vehicle['seats'] = vehicle['capacity'] - vehicle['kept']
+        self.vehicles = sorted((vehicle for vehicle in vehicles if vehicle['seats'] > 0),
+                               key=lambda vehicle: (-vehicle['seats'], vehicle['pk']))
+        if not self.vehicles:
+            raise PlanningError("Riders without coordinates fill every vehicle being planned")
+        largest = self.vehicles[0]['seats']
+        for key, student_ids in sorted(by_stop.items()):
+            name, latitude, longitude = coordinates[key]
+            for start in range(0, len(student_ids), largest):
+                self.names.append(name)
+                self.points.append((latitude, longitude))
+                self.riders.append(student_ids[start:start + largest])
+        self.demand = [len(riders) for riders in self.riders]
+
+    def feasibility_errors(self):
+        seats = sum(vehicle['seats'] for vehicle in self.vehicles)
+        riders = sum(self.demand)
+        if riders > seats:
+            return [f"{riders} riders need seats but the vehicles only have {seats}"]
+        return []
+
+
+def plan_routes(coordinates, depot=None, vehicle_ids=None):
+    """
+    Plan capacity-feasible routes for every allocated student, or with
+    ``vehicle_ids`` for the riders of those vehicles and those on no vehicle.
+    ``coordinates`` is a stop file path or the dict load_stop_coordinates returns.
+
+    Returns a dict with ``routes`` (one per used vehicle: ``vehicle_id``,
+    ``vehicle``, ``capacity``, ``load``, ``kept``, ``distance`` and ``stops``,
+    a list of ``(stop name, student ids)`` ending at the school), ``unplaced``
+    (students whose pickup has no coordinates), ``errors``, ``distance``
+    and ``elapsed``. ``kept`` counts the unplaced riders who stay on the
+    vehicle; ``load + kept`` never exceeds ``capacity``.
+    """
+    started = time.perf_counter()
+    if not isinstance(coordinates, dict):
+        coordinates = load_stop_coordinates(coordinates)
+    problem = RoutingProblem(coordinates, depot=depot, vehicle_ids=vehicle_ids)
+    result = {'routes': [], 'unplaced': problem.unplaced, 'errors': problem.feasibility_errors(),
+              'rider_count': sum(problem.demand), 'distance': 0.0}
+    if result['errors'] or len(problem.points) == 1:
+        result['elapsed'] = time.perf_counter() - started
+        return result
+
+    dist = distance_matrix(problem.points)
+    fleet = Fleet([vehicle['seats'] for vehicle in problem.vehicles])
+    try:
+        routes = clarke_wright(dist, problem.demand, fleet)
+        routes = consolidate(routes, dist, problem.demand, fleet, len(problem.vehicles))
+    except PlanningError as e:
+        result['errors'].append(str(e))
+        result['elapsed'] = time.perf_counter() - started
+        return result
+
+    routes = [two_opt(route, dist) for route in routes]
+    routes.sort(key=lambda route: sum(problem.demand[point] for point in route), reverse=True)
+    for route, vehicle in zip(routes, problem.vehicles):
+        stops = []
+        for point in route:
+            # Points split from one crowded stop are visited together.
+            if stops and stops[-1][0] == problem.names[point]:
+                stops[-1][1].extend(problem.riders[point])
+            else:
+                stops.append((problem.names[point], list(problem.riders[point])))
+        stops.append((problem.depot_name, []))
+        distance = tour_length(route, dist)
+        result['routes'].append({
+            'vehicle_id': vehicle['pk'],
+            'vehicle': vehicle['registration_number'],
+            'capacity': vehicle['capacity'],
+            'load': sum(problem.demand[point] for point in route),
+            'kept': vehicle['kept'],
+            'distance': round(distance, 2),
+            'stops': stops,
+        })
+        result['distance'] += distance
+    result['distance'] = round(result['distance'], 2)
+    result['elapsed'] = time.perf_counter() - started
+    return result
+
+
+def write_plan(result):
+    """
+    Apply a plan in one transaction. Each planned vehicle's first route (or a
+    new one) gets the planned stops, and the planned riders are moved onto it
+    with their pickup stop and the school as drop stop. Riders left on that
+    route (the unplaced ones) keep their place without a pickup stop and get
+    the school as drop stop. Returns the route ids written.
+    """
+    routes = {}
+    for route in Route.objects.filter(vehicle_id__in=[planned['vehicle_id'] for planned in result['routes']]).order_by('pk'):
+        routes.setdefault(route.vehicle_id, route)
+    student_ids = [student_id for planned in result['routes'] for _name, riders in planned['stops'] for student_id in riders]
+    allocations = {allocation.student_id: allocation for allocation in StudentTransport.objects.filter(student_id__in=student_ids)}
+    previous_route_ids = {allocation.route_id for allocation in allocations.values()}
+    staying = list(StudentTransport.objects.filter(route__in=list(routes.values()))
+                   .exclude(student_id__in=student_ids))
+
+    with transaction.atomic():
+        written = []
+        for planned in result['routes']:
+            route = routes.get(planned['vehicle_id']) or Route(vehicle_id=planned['vehicle_id'],
+                                                                name=f"Route {planned['vehicle']}")
+            route.start_point = planned['stops'][0][0]
+            route.end_point = planned['stops'][-1][0]
+            route.save()
+            route.route_stops.all().delete()
+            stops = RouteStop.objects.bulk_create([
+                RouteStop(route=route, name=name, sequence=sequence)
+                for sequence, (name, _riders) in enumerate(planned['stops'], start=1)
+            ])
+            school = stops[-1]
+            for allocation in staying:
+                if allocation.route_id == route.pk:
+                    allocation.pickup_stop, allocation.drop_stop, allocation.drop_point = None, school, school.name
+            for stop, (_name, riders) in zip(stops, planned['stops']):
+                for student_id in riders:
+                    allocation = allocations[student_id]
+                    allocation.route = route
+                    allocation.pickup_stop, allocation.pickup_point = stop, stop.name
+                    allocation.drop_stop, allocation.drop_point = school, school.name
+            written.append(route.pk)
+        StudentTransport.objects.bulk_update(
+            [*allocations.values(), *staying], ['route', 'pickup_stop', 'pickup_point', 'drop_stop', 'drop_point'],
+            batch_size=500)
+        # Bulk writes bypass the model signals, so refresh the derived data here.
+        sync_stop_text(written)
+        invalidate_manifests(set(written) | previous_route_ids)
+    return written
@@ -0,0 +1,55 @@
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from core.utils import cascades_from
+from .analytics import invalidate_fleet_analytics
+from .maintenance import refresh_forecasts
+from .models import FuelLog, MaintenanceLog, Route, RouteStop, StudentTransport, Vehicle
+from .stops import invalidate_manifests, sync_stop_text
+
+
+@receiver(post_save, sender=RouteStop)
+@receiver(post_delete, sender=RouteStop)
+def route_stop_changed(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    sync_stop_text([instance.route_id])
+    invalidate_manifests([instance.route_id])
+
+
+@receiver(pre_save, sender=StudentTransport)
+def student_transport_saving(sender, instance, **kwargs):
+    # Moving a student to another route changes the manifest of both.
+    instance._previous_route_id = (StudentTransport.objects.filter(pk=instance.pk).values_list('route_id', flat=True)
+                                   .first() if instance.pk else None)
+
+
+@receiver(post_save, sender=StudentTransport)
+@receiver(post_delete, sender=StudentTransport)
+def student_transport_changed(sender, instance, raw=False, **kwargs):
+    if not raw:
+        invalidate_manifests([instance.route_id, getattr(instance, '_previous_route_id', None)])
+
+
+@receiver(post_delete, sender=Route)
+def route_deleted(sender, instance, **kwargs):
+    invalidate_manifests([instance.pk])
+
+
+@receiver(post_save, sender=FuelLog)
+@receiver(post_delete, sender=FuelLog)
+@receiver(post_save, sender=MaintenanceLog)
+@receiver(post_delete, sender=MaintenanceLog)
+@receiver(post_save, sender=Vehicle)
+@receiver(post_delete, sender=Vehicle)
+def fleet_log_changed(sender, instance, **kwargs):
+    invalidate_fleet_analytics()
+
+
+@receiver(post_save, sender=MaintenanceLog)
+@receiver(post_delete, sender=MaintenanceLog)
+def maintenance_logged(sender, instance, raw=False, origin=None, **kwargs):
+    # A service restarts the vehicle's schedule; the nightly run sends the alerts.
+    # The forecast goes with a deleted vehicle, so do not write one back for it.
+    if not raw and not cascades_from(origin, Vehicle):
+        refresh_forecasts([instance.vehicle_id], notify=False)
@@ -0,0 +1,84 @@
+"""
+Route stops and route manifests.
+
+RouteStop rows are the ordered stops of a route; StudentTransport links to
+the stops a student boards and leaves at. Route.stops keeps the old
+comma-separated text in step with the stop rows for anything still reading
+it.
+
+A manifest lists a route's stops in order with the students picked up and
+dropped at each. Manifests for any number of routes are computed from two
+queries and cached; stop and allocation writes drop the affected routes
+(see transport.signals), so the driver dashboard and the attendance page
+read them straight from the cache.
+"""
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import F
+
+from .models import Route, RouteStop, StudentTransport
+
+MANIFEST_KEY = 'transport:manifest:{}'
+
+
+def sync_stop_text(route_ids):
+    """Rewrite Route.stops of ``route_ids`` from their stop rows."""
+    names = defaultdict(list)
+    for route_id, name in RouteStop.objects.filter(route_id__in=route_ids).values_list('route_id', 'name'):
+        names[route_id].append(name)
+    for route_id in route_ids:
+        Route.objects.filter(pk=route_id).update(stops=', '.join(names[route_id]))
+
+
+def _compute(route_ids):
+    manifests = {route_id: {'stops': [], 'unassigned': [], 'riders': 0} for route_id in route_ids}
+    stops = {}
+    for stop in RouteStop.objects.filter(route_id__in=route_ids).values('id', 'route_id', 'name', 'sequence'):
+        stops[stop['id']] = dict(stop, pickups=[], drops=[])
+        manifests[stop['route_id']]['stops'].append(stops[stop['id']])
+
+    riders = (StudentTransport.objects.filter(route_id__in=route_ids)
+              .values('student_id', 'route_id', 'pickup_stop_id', 'drop_stop_id', 'pickup_point', 'drop_point',
+                      admission_number=F('student__admission_number'),
+                      first_name=F('student__user__first_name'), last_name=F('student__user__last_name'))
+              .order_by('student__user__first_name', 'student__user__last_name'))
+    for rider in riders:
+        manifest = manifests[rider['route_id']]
+        manifest['riders'] += 1
+        rider['name'] = f"{rider.pop('first_name')} {rider.pop('last_name')}".strip() or rider['admission_number']
+        if rider['pickup_stop_id'] in stops:
+            stops[rider['pickup_stop_id']]['pickups'].append(rider)
+        else:
+            manifest['unassigned'].append(rider)
+        if rider['drop_stop_id'] in stops:
+            stops[rider['drop_stop_id']]['drops'].append(rider)
+    return manifests
+
+
+def route_manifests(route_ids):
+    """
+    ``{route_id: {'stops': [...], 'unassigned': [...], 'riders': n}}``. Each
+    stop has ``id``, ``name``, ``sequence``, ``pickups`` and ``drops``;
+    students with no pickup stop are listed under ``unassigned``.
+    """
+    route_ids = set(route_ids)
+    keys = {MANIFEST_KEY.format(route_id): route_id for route_id in route_ids}
+    cached = cache.get_many(list(keys))
+    manifests = {keys[key]: value for key, value in cached.items()}
+    missing = route_ids - set(manifests)
+    if missing:
+        computed = _compute(missing)
+        cache.set_many({MANIFEST_KEY.format(route_id): value for route_id, value in computed.items()},
+                       timeout=settings.ROUTE_MANIFEST_CACHE_TTL)
+        manifests.update(computed)
+    return manifests
+
+
+def route_manifest(route_id):
+    return route_manifests([route_id])[route_id]
+
+
+def invalidate_manifests(route_ids):
+    cache.delete_many([MANIFEST_KEY.format(route_id) for route_id in route_ids if route_id])
@@ -1,3 +1,400 @@
-from django.test import TestCase
+import csv
+import datetime
+import importlib
+import io
+import json
+from decimal import Decimal
 
-# Create your tests here.
+from django.apps import apps
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from core.models import Notification, User
+from students.models import Student
+from .analytics import ZERO, fleet_analytics
+from .attendance import record_trip
+from .maintenance import refresh_forecasts
+from .models import (Driver, FuelLog, MaintenanceForecast, MaintenanceLog, Route, RouteStop, StudentTransport,
+                     TransportAttendance, Vehicle)
+from .planner import plan_routes, write_plan
+from .stops import route_manifest, sync_stop_text
+
+AS_OF = datetime.date(2026, 6, 1)
+
+
+def make_student(number):
+    user = User.objects.create_user(f'student{number}', password='x', role=User.Role.STUDENT,
+                                    first_name=f'Student{number}', last_name='Test')
+    return Student.objects.create(user=user, admission_number=f'ADM{number:04d}',
+                                  date_of_birth=datetime.date(2015, 1, 1), address='Somewhere')
+
+
+class RoutePlannerTests(TestCase):
+    COORDINATES = {
+        'school': ('School', 12.97, 77.59),
+        'north gate': ('North Gate', 13.01, 77.59),
+        'lake view': ('Lake View', 12.93, 77.62),
+        'old market': ('Old Market', 12.96, 77.55),
+    }
+
+    def setUp(self):
+        self.bus_a = Vehicle.objects.create(registration_number='A-1', capacity=10, model='Bus')
+        self.bus_b = Vehicle.objects.create(registration_number='B-1', capacity=10, model='Bus')
+        self.route_a = Route.objects.create(name='A', start_point='North Gate', end_point='School', vehicle=self.bus_a)
+        self.route_b = Route.objects.create(name='B', start_point='Lake View', end_point='School', vehicle=self.bus_b)
+        self.no_bus = Route.objects.create(name='Unassigned', start_point='Old Market', end_point='School')
+        self.riders = {}
+        for number, (route, point) in enumerate([(self.route_a, 'North Gate'), (self.route_a, 'North Gate'),
+                                                 (self.route_b, 'Lake View'), (self.route_b, 'Lake View'),
+                                                 (self.no_bus, 'Old Market')], start=1):
+            self.riders[number] = StudentTransport.objects.create(student=make_student(number), route=route,
+                                                                  pickup_point=point, drop_point='School',
+                                                                  bus_fees=100)
+
+    def test_whole_fleet(self):
+        result = plan_routes(self.COORDINATES)
+        self.assertEqual((result['errors'], result['unplaced'], result['rider_count']), ([], [], 5))
+
+    def test_partial_replan_leaves_other_vehicles_alone(self):
+        result = plan_routes(self.COORDINATES, vehicle_ids=[self.bus_a.pk])
+        self.assertEqual(result['rider_count'], 3)
+        planned = {student_id for route in result['routes']
+                   for _name, riders in route['stops'] for student_id in riders}
+        self.assertEqual(planned, {self.riders[n].student_id for n in (1, 2, 5)})
+
+        write_plan(result)
+        routes = dict(StudentTransport.objects.values_list('student_id', 'route__vehicle_id'))
+        self.assertEqual({routes[self.riders[n].student_id] for n in (1, 2, 5)}, {self.bus_a.pk})
+        self.assertEqual({routes[self.riders[n].student_id] for n in (3, 4)}, {self.bus_b.pk})
+        self.assertEqual(Route.objects.get(pk=self.route_b.pk).start_point, 'Lake View')
+
+
+    def _add_unplaced_rider(self):
+        return StudentTransport.objects.create(student=make_student(6), route=self.route_a, pickup_point='Nowhere',
+                                               drop_point='School', bus_fees=100)
+
+    def test_unplaced_riders_keep_their_seats(self):
+        self._add_unplaced_rider()
+        Vehicle.objects.filter(pk=self.bus_a.pk).update(capacity=3)
+        result = plan_routes(self.COORDINATES, vehicle_ids=[self.bus_a.pk])
+        # Three riders to place, but the rider without coordinates holds one of the three seats.
+        self.assertEqual(result['errors'], ["3 riders need seats but the vehicles only have 2"])
+
+        Vehicle.objects.filter(pk=self.bus_a.pk).update(capacity=4)
+        result = plan_routes(self.COORDINATES, vehicle_ids=[self.bus_a.pk])
+        self.assertEqual(result['errors'], [])
+        self.assertEqual((result['routes'][0]['load'], result['routes'][0]['kept']), (3, 1))
+
+    def test_write_keeps_unplaced_riders_without_a_stop(self):
+        unplaced = self._add_unplaced_rider()
+        write_plan(plan_routes(self.COORDINATES, vehicle_ids=[self.bus_a.pk]))
+        unplaced.refresh_from_db()
+        self.assertEqual(unplaced.route_id, self.route_a.pk)
+        self.assertIsNone(unplaced.pickup_stop)
+        self.assertEqual(unplaced.pickup_point, 'Nowhere')
+        self.assertEqual(unplaced.drop_stop, RouteStop.objects.filter(route=self.route_a).order_by('sequence').last())
+        self.assertEqual(StudentTransport.objects.filter(route__vehicle=self.bus_a).count(), 4)
+        manifest = route_manifest(self.route_a.pk)
+        self.assertEqual([rider['student_id'] for rider in manifest['unassigned']], [unplaced.student_id])
+
+
+class TripAttendanceTests(TestCase):
+    DATE = datetime.date(2026, 3, 2)
+
+    def setUp(self):
+        self.driver = Driver.objects.create(user=User.objects.create_user('driver', password='x', role=User.Role.STAFF),
+                                            license_number='DL-1', phone_number='1')
+        other_driver = Driver.objects.create(user=User.objects.create_user('other', password='x',
+                                                                           role=User.Role.STAFF),
+                                             license_number='DL-2', phone_number='2')
+        bus = Vehicle.objects.create(registration_number='A-1', capacity=10, model='Bus', driver=self.driver)
+        Vehicle.objects.create(registration_number='B-1', capacity=10, model='Bus', driver=other_driver)
+        self.other_driver = other_driver.user
+        self.route = Route.objects.create(name='A', start_point='North Gate', end_point='School', vehicle=bus)
+        self.riders = [make_student(number) for number in range(1, 4)]
+        for student in self.riders:
+            StudentTransport.objects.create(student=student, route=self.route, bus_fees=100)
+        self.stranger = make_student(4)
+
+    def _row(self, student):
+        row = TransportAttendance.objects.get(student=student, route=self.route, date=self.DATE)
+        return row.is_present_pickup, row.is_present_drop
+
+    def test_create_then_update(self):
+        first, second, third = self.riders
+        self.assertEqual(record_trip(self.route.pk, self.DATE, {first.pk: (True, None), second.pk: (False, None)}),
+                         (2, 0))
+        self.assertEqual(self._row(first), (True, False))
+        # The afternoon half: None keeps the pickups already recorded.
+        created, updated = record_trip(self.route.pk, self.DATE, {first.pk: (None, True), second.pk: (None, False),
+                                                                  third.pk: (None, True)})
+        self.assertEqual((created, updated), (1, 1))
+        self.assertEqual([self._row(student) for student in self.riders],
+                         [(True, True), (False, False), (False, True)])
+        self.assertEqual(record_trip(self.route.pk, self.DATE, {first.pk: (True, True)}), (0, 0))
+
+    def test_rejects_students_off_the_route(self):
+        with self.assertRaisesMessage(ValueError, f"Students {self.stranger.pk} are not allocated"):
+            record_trip(self.route.pk, self.DATE, {self.riders[0].pk: (True, True), self.stranger.pk: (True, True)})
+        self.assertFalse(TransportAttendance.objects.exists())
+
+    def _post(self, user, body):
+        self.client.force_login(user)
+        return self.client.post(reverse('transport:trip_roll_call', args=[self.route.pk]), body,
+                                 content_type='application/json')
+
+    def test_roll_call_endpoint(self):
+        body = json.dumps({'date': self.DATE.isoformat(),
+                           'records': [{'student_id': self.riders[0].pk, 'pickup': True}]})
+        response = self._post(self.driver.user, body)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((response.json()['created'], response.json()['updated']), (1, 0))
+        self.assertEqual(self._row(self.riders[0]), (True, False))
+
+    def test_roll_call_errors(self):
+        self.assertEqual(self._post(self.driver.user, '{"date": ').status_code, 400)
+        self.assertEqual(self._post(self.driver.user, json.dumps({'date': self.DATE.isoformat()})).status_code, 400)
+        stranger = json.dumps({'date': self.DATE.isoformat(), 'records': [{'student_id': self.stranger.pk}]})
+        self.assertEqual(self._post(self.driver.user, stranger).status_code, 400)
+        valid = json.dumps({'date': self.DATE.isoformat(), 'records': [{'student_id': self.riders[0].pk}]})
+        self.assertEqual(self._post(self.other_driver, valid).status_code, 403)
+        self.assertFalse(TransportAttendance.objects.exists())
+
+class RouteStopTests(TestCase):
+    def setUp(self):
+        self.route = Route.objects.create(name='A', start_point='North Gate', end_point='School')
+        self.other = Route.objects.create(name='B', start_point='Lake View', end_point='School')
+        self.gate, self.market, self.school = [
+            RouteStop.objects.create(route=self.route, name=name, sequence=sequence)
+            for sequence, name in enumerate(['North Gate', 'Old Market', 'School'], start=1)]
+        self.lake = RouteStop.objects.create(route=self.other, name='Lake View', sequence=1)
+        self.first, self.second, self.third = [make_student(number) for number in range(1, 4)]
+        StudentTransport.objects.create(student=self.first, route=self.route, pickup_stop=self.gate,
+                                        drop_stop=self.school, bus_fees=100)
+        StudentTransport.objects.create(student=self.second, route=self.route, pickup_stop=self.market,
+                                        drop_stop=self.school, bus_fees=100)
+        StudentTransport.objects.create(student=self.third, route=self.route, bus_fees=100)
+
+    @staticmethod
+    def _riders(manifest, stop_name, half='pickups'):
+        stop = next(stop for stop in manifest['stops'] if stop['name'] == stop_name)
+        return [rider['student_id'] for rider in stop[half]]
+
+    def test_manifest(self):
+        manifest = route_manifest(self.route.pk)
+        self.assertEqual([(stop['name'], stop['sequence']) for stop in manifest['stops']],
+                         [('North Gate', 1), ('Old Market', 2), ('School', 3)])
+        self.assertEqual(self._riders(manifest, 'North Gate'), [self.first.pk])
+        self.assertEqual(self._riders(manifest, 'Old Market'), [self.second.pk])
+        self.assertEqual(self._riders(manifest, 'School', 'drops'), [self.first.pk, self.second.pk])
+        self.assertEqual([rider['student_id'] for rider in manifest['unassigned']], [self.third.pk])
+        self.assertEqual(manifest['riders'], 3)
+        self.assertEqual(manifest['stops'][0]['pickups'][0]['name'], 'Student1 Test')
+        with self.assertNumQueries(0):
+            route_manifest(self.route.pk)
+
+    def test_stop_writes_invalidate_the_manifest(self):
+        route_manifest(self.route.pk)
+        self.market.name = 'New Market'
+        self.market.save()
+        self.assertEqual(self._riders(route_manifest(self.route.pk), 'New Market'), [self.second.pk])
+        self.route.refresh_from_db()
+        self.assertEqual(self.route.stops, 'North Gate, New Market, School')
+
+        self.market.delete()
+        manifest = route_manifest(self.route.pk)
+        self.assertEqual([stop['name'] for stop in manifest['stops']], ['North Gate', 'School'])
+        self.assertEqual([rider['student_id'] for rider in manifest['unassigned']], [self.second.pk, self.third.pk])
+        self.route.refresh_from_db()
+        self.assertEqual(self.route.stops, 'North Gate, School')
+
+    def test_moving_a_student_updates_both_routes(self):
+        self.assertEqual(route_manifest(self.other.pk)['riders'], 0)
+        route_manifest(self.route.pk)
+        allocation = StudentTransport.objects.get(student=self.first)
+        allocation.route, allocation.pickup_stop, allocation.drop_stop = self.other, self.lake, None
+        allocation.save()
+        self.assertEqual(self._riders(route_manifest(self.route.pk), 'North Gate'), [])
+        self.assertEqual(route_manifest(self.route.pk)['riders'], 2)
+        self.assertEqual(self._riders(route_manifest(self.other.pk), 'Lake View'), [self.first.pk])
+
+    def test_sync_stop_text(self):
+        Route.objects.update(stops='stale')
+        RouteStop.objects.filter(pk=self.lake.pk).delete()
+        Route.objects.filter(pk=self.other.pk).update(stops='stale')
+        sync_stop_text([self.route.pk, self.other.pk])
+        self.assertEqual(dict(Route.objects.values_list('name', 'stops')), {'A': 'North Gate, Old Market, School',
+                                                                            'B': ''})
+
+    def test_migration_parses_stop_text(self):
+        RouteStop.objects.all().delete()
+        Route.objects.filter(pk=self.route.pk).update(stops=' Old  Market , north gate,, Lake View ')
+        StudentTransport.objects.filter(student=self.first).update(pickup_point='old market ', drop_point='SCHOOL')
+        StudentTransport.objects.filter(student=self.second).update(pickup_point='Elsewhere', drop_point='Elsewhere')
+        migration = importlib.import_module('transport.migrations.0004_route_stops')
+        migration.create_route_stops(apps, None)
+
+        self.assertEqual(list(RouteStop.objects.filter(route=self.route).values_list('sequence', 'name')),
+                         [(1, 'North Gate'), (2, 'Old Market'), (3, 'Lake View'), (4, 'School')])
+        self.assertEqual(list(RouteStop.objects.filter(route=self.other).values_list('name', flat=True)),
+                         ['Lake View', 'School'])
+        first = StudentTransport.objects.get(student=self.first)
+        self.assertEqual((first.pickup_stop.name, first.drop_stop.name), ('Old Market', 'School'))
+        second = StudentTransport.objects.get(student=self.second)
+        self.assertEqual((second.pickup_stop, second.drop_stop), (None, None))
+
+class FleetAnalyticsTests(TestCase):
+    # (date, odometer, litres, cost): 400, 420, 380 and 400 km on 40 l, then
+    # a fill that only covered 100 km and one where the odometer stood still.
+    FILLS = [
+        (datetime.date(2026, 1, 5), 10000, 40, 100),
+        (datetime.date(2026, 1, 12), 10400, 40, 100),
+        (datetime.date(2026, 1, 19), 10820, 40, 100),
+        (datetime.date(2026, 1, 26), 11200, 40, 100),
+        (datetime.date(2026, 2, 2), 11600, 40, 100),
+        (datetime.date(2026, 2, 9), 11700, 40, 100),
+        (datetime.date(2026, 2, 16), 11700, 10, 25),
+    ]
+
+    def setUp(self):
+        self.bus = Vehicle.objects.create(registration_number='A-1', capacity=40, model='Bus')
+        Vehicle.objects.create(registration_number='B-1', capacity=40, model='Bus')
+        for date, odometer, liters, cost in self.FILLS:
+            FuelLog.objects.create(vehicle=self.bus, date=date, odometer_reading=odometer, liters=liters, cost=cost)
+        MaintenanceLog.objects.create(vehicle=self.bus, date=datetime.date(2026, 2, 20), description='Service',
+                                      cost=300, serviced_by='Garage')
+
+    def test_vehicle_totals(self):
+        bus, idle = fleet_analytics()['vehicles']
+        self.assertEqual((bus['fills'], bus['liters'], bus['fuel_cost'], bus['maintenance_cost'], bus['total_cost']),
+                         (7, Decimal('250.00'), Decimal('625.00'), Decimal('300.00'), Decimal('925.00')))
+        # 1700 km over the 200 l of the fills that moved the odometer.
+        self.assertEqual((bus['distance'], bus['km_per_litre'], bus['cost_per_km']),
+                         (1700, Decimal('8.50'), Decimal('0.544')))
+        self.assertEqual(bus['anomalies'], 2)
+        self.assertEqual((idle['vehicle'], idle['fills'], idle['km_per_litre'], idle['cost_per_km']),
+                         ('B-1', 0, None, None))
+
+    def test_outliers(self):
+        anomalies = fleet_analytics()['anomalies']
+        self.assertEqual([(fill['date'], fill['reason']) for fill in anomalies],
+                         [(datetime.date(2026, 2, 16), 'Odometer did not advance since the previous fill'),
+                          (datetime.date(2026, 2, 9), 'Unusually low km/l')])
+        self.assertEqual((anomalies[1]['km_per_litre'], anomalies[1]['expected']), (Decimal('2.50'), Decimal('10.00')))
+
+    def test_monthly_spend(self):
+        self.assertEqual([(row['month'], row['fuel_cost'], row['liters'], row['maintenance_cost'], row['total_cost'])
+                          for row in fleet_analytics()['monthly']],
+                         [(datetime.date(2026, 2, 1), Decimal('225.00'), Decimal('90.00'), Decimal('300.00'),
+                           Decimal('525.00')),
+                          (datetime.date(2026, 1, 1), Decimal('400.00'), Decimal('160.00'), ZERO, Decimal('400.00'))])
+
+    def test_fuel_logs_invalidate_the_cache(self):
+        fleet_analytics()
+        with self.assertNumQueries(0):
+            fleet_analytics()
+        FuelLog.objects.create(vehicle=self.bus, date=datetime.date(2026, 2, 23), odometer_reading=12100, liters=40,
+                               cost=100)
+        self.assertEqual(fleet_analytics()['vehicles'][0]['fills'], 8)
+
+    def test_csv_export(self):
+        self.client.force_login(User.objects.create_user('manager', password='x', role=User.Role.TRANSPORT_MANAGER))
+        url = reverse('transport:fleet_analytics_export')
+        response = self.client.get(url, {'report': 'anomalies'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Disposition'], 'attachment; filename="fleet-anomalies.csv"')
+        rows = list(csv.reader(io.StringIO(response.content.decode())))
+        self.assertEqual(rows[0], ['date', 'vehicle', 'liters', 'cost', 'odometer_reading', 'distance',
+                                   'km_per_litre', 'expected', 'reason'])
+        self.assertEqual(rows[1:], [
+            ['2026-02-16', 'A-1', '10.00', '25.00', '11700', '0', '', '10.00',
+             'Odometer did not advance since the previous fill'],
+            ['2026-02-09', 'A-1', '40.00', '100.00', '11700', '100', '2.50', '10.00', 'Unusually low km/l'],
+        ])
+        vehicles = list(csv.reader(io.StringIO(self.client.get(url).content.decode())))
+        self.assertEqual([row[0] for row in vehicles], ['vehicle', 'A-1', 'B-1'])
+        self.assertEqual(self.client.get(url, {'report': 'drivers'}).status_code, 400)
+
+@override_settings(MAINTENANCE_INTERVAL_DAYS=180, MAINTENANCE_INTERVAL_KM=10000, MAINTENANCE_RATE_WINDOW_DAYS=90,
+                   MAINTENANCE_ALERT_DAYS=14)
+class MaintenanceForecastTests(TestCase):
+    def setUp(self):
+        self.vehicle = Vehicle.objects.create(registration_number='KA-01-1234', capacity=40, model='Bus')
+        self.manager = User.objects.create_user('manager', password='x', role=User.Role.TRANSPORT_MANAGER)
+
+    def _fill_weekly(self, vehicle, start, weeks, km_per_week, odometer=10000):
+        for week in range(weeks + 1):
+            FuelLog.objects.create(vehicle=vehicle, date=start + datetime.timedelta(weeks=week), liters=50, cost=100,
+                                   odometer_reading=odometer + week * km_per_week)
+
+    def _service(self, vehicle, date):
+        return MaintenanceLog.objects.create(vehicle=vehicle, date=date, description='Service', cost=200,
+                                             serviced_by='Garage')
+
+    def test_forecast_from_service_history(self):
+        # 70 km a day, serviced every 91 days (6370 km apart).
+        self._fill_weekly(self.vehicle, datetime.date(2025, 7, 7), 52, 490)
+        for date in (datetime.date(2025, 7, 7), datetime.date(2025, 10, 6), datetime.date(2026, 1, 5)):
+            self._service(self.vehicle, date)
+
+        refresh_forecasts(as_of=AS_OF)
+        forecast = MaintenanceForecast.objects.get(vehicle=self.vehicle)
+        self.assertEqual(forecast.interval_days, 91)
+        self.assertEqual(forecast.interval_km, 6370)
+        self.assertEqual(forecast.km_per_day, 70)
+        self.assertEqual(forecast.due_date, datetime.date(2026, 4, 6))
+        self.assertEqual(forecast.due_odometer, forecast.last_service_odometer + 6370)
+
+    def test_mileage_brings_service_forward(self):
+        # One service and 500 km a day: 10000 km arrive long before 180 days.
+        self._fill_weekly(self.vehicle, datetime.date(2026, 5, 1), 4, 3500)
+        self._service(self.vehicle, datetime.date(2026, 5, 1))
+        refresh_forecasts(as_of=AS_OF)
+        forecast = MaintenanceForecast.objects.get(vehicle=self.vehicle)
+        self.assertEqual(forecast.due_odometer, 20000)
+        self.assertEqual(forecast.due_date, datetime.date(2026, 5, 21))
+
+    def test_vehicle_without_logs_has_no_forecast(self):
+        refresh_forecasts(as_of=AS_OF)
+        self.assertFalse(MaintenanceForecast.objects.exists())
+
+    def test_managers_are_notified_once_per_due_date(self):
+        self._fill_weekly(self.vehicle, datetime.date(2025, 12, 1), 20, 100)
+        self._service(self.vehicle, datetime.date(2025, 12, 1))
+        result = refresh_forecasts(as_of=AS_OF)
+        self.assertEqual((len(result['due']), result['notifications']), (1, 1))
+        self.assertEqual(Notification.objects.filter(recipient=self.manager).count(), 1)
+
+        self.assertEqual(refresh_forecasts(as_of=AS_OF)['notifications'], 0)
+        self.assertEqual(refresh_forecasts(as_of=AS_OF, dry_run=True)['notifications'], 0)
+        self.assertEqual(Notification.objects.count(), 1)
+
+    def test_logging_a_service_moves_the_forecast(self):
+        self._fill_weekly(self.vehicle, datetime.date(2025, 12, 1), 20, 100)
+        self._service(self.vehicle, datetime.date(2025, 12, 1))
+        refresh_forecasts(as_of=AS_OF)
+        service = self._service(self.vehicle, datetime.date(2026, 5, 25))
+        forecast = MaintenanceForecast.objects.get(vehicle=self.vehicle)
+        self.assertEqual(forecast.last_service_date, datetime.date(2026, 5, 25))
+        self.assertEqual(Notification.objects.count(), 1)
+
+        service.delete()
+        forecast.refresh_from_db()
+        self.assertEqual(forecast.last_service_date, datetime.date(2025, 12, 1))
+
+    def test_delete_vehicle_with_logs(self):
+        FuelLog.objects.create(vehicle=self.vehicle, date=datetime.date(2026, 5, 1), liters=50, cost=100,
+                               odometer_reading=10000)
+        self._service(self.vehicle, datetime.date(2026, 5, 1))
+        self.assertTrue(MaintenanceForecast.objects.filter(vehicle=self.vehicle).exists())
+
+        self.vehicle.delete()
+        connection.check_constraints()
+        self.assertFalse(MaintenanceForecast.objects.exists())
+
+    def test_delete_vehicle_queryset(self):
+        self._service(self.vehicle, datetime.date(2026, 5, 1))
+        Vehicle.objects.filter(pk=self.vehicle.pk).delete()
+        connection.check_constraints()
+        self.assertFalse(MaintenanceForecast.objects.exists())
@@ -5,8 +5,10 @@ app_name = 'transport'
 
 urlpatterns = [
     path('dashboard/', views.transport_dashboard, name='dashboard'),
+    path('analytics/export/', views.fleet_analytics_export, name='fleet_analytics_export'),
     path('driver-dashboard/', views.driver_dashboard, name='driver_dashboard'),
     path('attendance/<int:route_id>/', views.manage_attendance, name='attendance'),
+    path('attendance/<int:route_id>/trip/', views.trip_roll_call, name='trip_roll_call'),
     path('logs/fuel/', views.log_fuel, name='log_fuel'),
     path('logs/maintenance/', views.log_maintenance, name='log_maintenance'),
     path('driver-profile/', views.driver_profile, name='driver_profile'),
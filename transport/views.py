@@ -1,7 +1,20 @@
+import csv
+import datetime
+import json
+import time
+from django.conf import settings
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from .models import Driver, Vehicle, Route, StudentTransport, TransportAttendance, MaintenanceLog, FuelLog
+from django.http import HttpResponse, JsonResponse
+from django.utils import timezone
+from django.views.decorators.http import require_POST
+from academics.attendance import parse_attendance_date
+from .analytics import fleet_analytics
+from .attendance import record_trip
+from .stops import route_manifest, route_manifests
+from .models import (Driver, Vehicle, Route, StudentTransport, TransportAttendance, MaintenanceLog, FuelLog,
+                     MaintenanceForecast)
 from core.models import User, Announcement
 from students.models import Student
 
@@ -16,8 +29,12 @@ def transport_dashboard(request):
     total_routes = Route.objects.count()
     total_transport_students = StudentTransport.objects.count()
 
-    maintenance_alerts = MaintenanceLog.objects.order_by('-date')[:5]
-    fuel_logs = FuelLog.objects.order_by('-date')[:5]
+    today = timezone.localdate()
+    maintenance_alerts = (MaintenanceForecast.objects.select_related('vehicle')
+                          .filter(due_date__lte=today + datetime.timedelta(days=settings.MAINTENANCE_ALERT_DAYS))
+                          .order_by('due_date')[:5])
+    fuel_logs = FuelLog.objects.select_related('vehicle').order_by('-date')[:5]
+    analytics = fleet_analytics()
     announcements = Announcement.objects.filter(target_role=User.Role.TRANSPORT_MANAGER).order_by('-date_posted')[:5]
 
     context = {
@@ -26,11 +43,40 @@ def transport_dashboard(request):
         'total_routes': total_routes,
         'total_transport_students': total_transport_students,
         'maintenance_alerts': maintenance_alerts,
+        'today': today,
         'fuel_logs': fuel_logs,
         'announcements': announcements,
+        'fleet': analytics['vehicles'],
+        'fleet_totals': analytics['totals'],
+        'fuel_anomalies': analytics['anomalies'][:5],
     }
     return render(request, 'transport/dashboard.html', context)
 
+FLEET_REPORTS = {
+    'vehicles': ['vehicle', 'model', 'fills', 'liters', 'fuel_cost', 'services', 'maintenance_cost', 'total_cost',
+                 'distance', 'km_per_litre', 'cost_per_km', 'anomalies'],
+    'monthly': ['month', 'vehicle', 'liters', 'fuel_cost', 'maintenance_cost', 'total_cost'],
+    'anomalies': ['date', 'vehicle', 'liters', 'cost', 'odometer_reading', 'distance', 'km_per_litre', 'expected',
+                  'reason'],
+}
+
+@login_required
+def fleet_analytics_export(request):
+    """CSV of the fleet analytics: ?report=vehicles (default), monthly or anomalies."""
+    if request.user.role not in [User.Role.TRANSPORT_MANAGER, User.Role.ADMIN]:
+        return render(request, 'core/access_denied.html')
+    report = request.GET.get('report', 'vehicles')
+    if report not in FLEET_REPORTS:
+        return HttpResponse(f"Unknown report {report!r}; choose one of {', '.join(FLEET_REPORTS)}.", status=400)
+
+    response = HttpResponse(content_type='text/csv')
+    response['Content-Disposition'] = f'attachment; filename="fleet-{report}.csv"'
+    writer = csv.writer(response)
+    writer.writerow(FLEET_REPORTS[report])
+    for row in fleet_analytics()[report]:
+        writer.writerow(['' if row[field] is None else row[field] for field in FLEET_REPORTS[report]])
+    return response
+
 @login_required
 def driver_dashboard(request):
     try:
@@ -48,7 +94,10 @@ def driver_dashboard(request):
     # Get routes for vehicle
     routes = []
     if vehicle:
-        routes = vehicle.routes.all()
+        routes = list(vehicle.routes.all())
+        manifests = route_manifests([route.pk for route in routes])
+        for route in routes:
+            route.manifest = manifests[route.pk]
     
     context = {
         'driver': driver,
@@ -57,27 +106,78 @@ def driver_dashboard(request):
     }
     return render(request, 'transport/driver_dashboard.html', context)
 
+def _takes_attendance(user, route):
+    """Transport managers, admins and the driver of the route's vehicle take its roll call."""
+    if user.role in [User.Role.TRANSPORT_MANAGER, User.Role.ADMIN]:
+        return True
+    driver_id = route.vehicle.driver_id if route.vehicle else None
+    return driver_id is not None and Driver.objects.filter(pk=driver_id, user=user).exists()
+
 @login_required
 def manage_attendance(request, route_id):
-    route = get_object_or_404(Route, id=route_id)
-    allocations = StudentTransport.objects.filter(route=route)
-    
+    route = get_object_or_404(Route.objects.select_related('vehicle'), id=route_id)
+    if not _takes_attendance(request.user, route):
+        return render(request, 'core/access_denied.html')
+    is_driver = hasattr(request.user, 'driver_profile')
+    done = 'transport:driver_dashboard' if is_driver else 'transport:dashboard'
+
     if request.method == 'POST':
-        date = request.POST.get('date')
-        for alloc in allocations:
-            pickup = request.POST.get(f'pickup_{alloc.student.id}') == 'on'
-            drop = request.POST.get(f'drop_{alloc.student.id}') == 'on'
-            
-            TransportAttendance.objects.update_or_create(
-                student=alloc.student,
-                route=route,
-                date=date,
-                defaults={'is_present_pickup': pickup, 'is_present_drop': drop}
-            )
-        messages.success(request, f"Attendance updated for route {route.name}")
-        return redirect('transport:dashboard')
+        student_ids = StudentTransport.objects.filter(route=route).values_list('student_id', flat=True)
+        records = {
+            student_id: (request.POST.get(f'pickup_{student_id}') == 'on', request.POST.get(f'drop_{student_id}') == 'on')
+            for student_id in student_ids
+        }
+        try:
+            created, updated = record_trip(route.id, request.POST.get('date'), records)
+        except ValueError as e:
+            messages.error(request, str(e))
+            return redirect('transport:attendance', route_id=route.id)
+        messages.success(request, f"Attendance updated for route {route.name} ({created} new, {updated} updated)")
+        return redirect(done)
 
-    return render(request, 'transport/manage_attendance.html', {'route': route, 'allocations': allocations})
+    try:
+        date = parse_attendance_date(request.GET.get('date') or timezone.localdate())
+    except ValueError:
+        date = timezone.localdate()
+    # Riders in boarding order, from the cached route manifest.
+    manifest = route_manifest(route.id)
+    recorded = {row.student_id: row for row in TransportAttendance.objects.filter(route=route, date=date)}
+    riders = [dict(rider, attendance=recorded.get(rider['student_id']))
+              for stop in manifest['stops'] for rider in stop['pickups']]
+    riders += [dict(rider, attendance=recorded.get(rider['student_id'])) for rider in manifest['unassigned']]
+    context = {'route': route, 'riders': riders, 'date': date, 'is_driver': is_driver, 'done': done}
+    return render(request, 'transport/manage_attendance.html', context)
+
+@login_required
+@require_POST
+def trip_roll_call(request, route_id):
+    """
+    JSON roll call of one route, e.g. from the driver's tablet:
+    {"date": "YYYY-MM-DD", "records": [{"student_id": 5, "pickup": true, "drop": false}]}
+    Leave out "pickup" or "drop" to keep what is already recorded for that half of the trip.
+    """
+    route = get_object_or_404(Route.objects.select_related('vehicle'), id=route_id)
+    if not _takes_attendance(request.user, route):
+        return JsonResponse({'error': 'Permission denied.'}, status=403)
+    try:
+        payload = json.loads(request.body)
+        date = parse_attendance_date(payload.get('date'))
+        records = {int(entry['student_id']): (entry.get('pickup'), entry.get('drop')) for entry in payload['records']}
+    except (ValueError, KeyError, TypeError, AttributeError) as e:
+        return JsonResponse({'error': f"Malformed roll call: {e}"}, status=400)
+
+    started = time.perf_counter()
+    try:
+        created, updated = record_trip(route.id, date, records)
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    return JsonResponse({
+        'route_id': route.id,
+        'date': date.isoformat(),
+        'created': created,
+        'updated': updated,
+        'elapsed_ms': round((time.perf_counter() - started) * 1000, 2),
+    })
 
 @login_required
 def log_fuel(request):